@@ -1,65 +1,83 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
-import mysql.connector
+from flask import render_template, jsonify, request, redirect, url_for, flash, Response, stream_with_context
 from datetime import datetime
 import json
+import os
+import urllib.request
 
-app = Flask(__name__)
-app.secret_key = 'admin_secret_key_2024'
+import config  # first: reads .env before the modules below look at the environment
+import export
+import httpcache
+import jobs
+import repository
+import rollup
+import stats
+from catalog import invalidate_catalog
+from identity import invalidate_identities
+from db import get_cursor, get_db
+from events import BUSY_RETRY_MS, OrderFeed, StreamsFull
+from factory import Connector, create_app, on_warm_up, warm_up
+from metrics import normalize_rule
+from stats import StatsProvider
 
-# MySQL Connection
-conn = mysql.connector.connect(
-    host='localhost',
-    user='root',
-    password='',  # No password for XAMPP
-    database='shop_db'
-)
-cursor = conn.cursor(dictionary=True)
+# MySQL connection settings: ADMIN_DB_* or DB_* from the environment or .env (see config.py).
+# Defaults match a local XAMPP install (root, no password).
+DB_CONFIG = config.database('ADMIN_')
+
+# Pool, read replicas (DB_REPLICAS=127.0.0.1:3307 for a second local instance) and metrics
+app = create_app(__name__, DB_CONFIG, secret_key=config.secret_key('ADMIN_SECRET_KEY', 'admin_secret_key_2024'),
+                 metrics_name='admin')
+pool = app.extensions['db_pool']
+metrics = app.extensions['metrics']
+
+ORDERS_PAGE_SIZE = 50
+
+platform_stats = StatsProvider(ttl=float(os.environ.get('STATS_CACHE_TTL', 5)),
+                               reconcile_every=float(os.environ.get('STATS_RECONCILE_SECONDS', 3600)))
+
+# Recent orders and the live feed come from one tailer thread, not a query per dashboard poll
+order_feed = OrderFeed(pool, size=int(os.environ.get('ORDER_FEED_BUFFER', 1000)),
+                       interval=float(os.environ.get('ORDER_FEED_INTERVAL', 1)),
+                       max_streams=int(os.environ.get('ORDER_FEED_MAX_STREAMS', 4)))
+
+# Heavy reports run in separate processes with their own connections (see jobs.py)
+report_jobs = jobs.JobRunner(pool, Connector(DB_CONFIG),
+                             workers=int(os.environ.get('REPORT_WORKERS', 1)),
+                             max_running=int(os.environ.get('REPORT_MAX_RUNNING', 2)),
+                             max_pending=int(os.environ.get('REPORT_MAX_PENDING', 20)),
+                             chunk_size=int(os.environ.get('REPORT_CHUNK_SIZE', jobs.DEFAULT_CHUNK_SIZE)),
+                             pause=float(os.environ.get('REPORT_CHUNK_PAUSE', jobs.DEFAULT_PAUSE)),
+                             nice=int(os.environ.get('REPORT_NICE', 10)))
+
+metrics.add_collector('order_feed', order_feed.stats)
+metrics.add_collector('report_jobs', report_jobs.stats)
+
+# Per process, after fork under gunicorn (see gunicorn.conf.py): nothing here connects at import
+on_warm_up(app, order_feed.start)
+on_warm_up(app, platform_stats.get)
+on_warm_up(app, report_jobs.start)
+
+# Where the /routes page fetches the main app's live timings from
+MAIN_APP_URL = os.environ.get('MAIN_APP_URL', 'http://localhost:5000')
 
 # Admin Dashboard Home
 @app.route('/')
 def admin_home():
     try:
         # Get real-time statistics
-        cursor.execute("SELECT COUNT(*) as total_sellers FROM sellers")
-        total_sellers = cursor.fetchone()['total_sellers']
-        
-        cursor.execute("SELECT COUNT(*) as total_buyers FROM buyers")
-        total_buyers = cursor.fetchone()['total_buyers']
-        
-        cursor.execute("SELECT COUNT(*) as total_products FROM products")
-        total_products = cursor.fetchone()['total_products']
-        
-        cursor.execute("SELECT COUNT(*) as total_orders FROM orders")
-        total_orders = cursor.fetchone()['total_orders']
+        counters = platform_stats.get()
         
         # Get recent orders
-        cursor.execute("""
-            SELECT orders.*, products.name as product_name, 
-                   buyers.name as buyer_name, sellers.name as seller_name
-            FROM orders 
-            JOIN products ON orders.product_id = products.id
-            JOIN buyers ON orders.buyer_id = buyers.id
-            JOIN sellers ON products.seller_id = sellers.id
-            ORDER BY orders.id DESC LIMIT 10
-        """)
-        recent_orders = cursor.fetchall()
+        recent_orders = repository.fetch_all(repository.RECENT_ORDERS, (10,))
         
-        # Get top sellers
-        cursor.execute("""
-            SELECT sellers.name, COUNT(orders.id) as order_count, SUM(products.price) as revenue
-            FROM sellers
-            LEFT JOIN products ON sellers.id = products.seller_id
-            LEFT JOIN orders ON products.id = orders.product_id
-            GROUP BY sellers.id, sellers.name
-            ORDER BY revenue DESC
-            LIMIT 5""")
-        top_sellers = cursor.fetchall()
+        # Get top sellers, from the rollup so archived orders count too
+        top_sellers = repository.fetch_all(repository.TOP_SELLERS, (5,))
         
         return render_template('admin_home.html', 
-                             total_sellers=total_sellers,
-                             total_buyers=total_buyers,
-                             total_products=total_products,
-                             total_orders=total_orders,
+                             total_sellers=counters['total_sellers'],
+                             total_buyers=counters['total_buyers'],
+                             total_products=counters['total_products'],
+                             total_orders=counters['total_orders'],
+                             stats_age=counters['age_seconds'],
                              recent_orders=recent_orders,
                              top_sellers=top_sellers)
     except Exception as e:
@@ -74,8 +92,10 @@ def admin_routes():
             'category': '📊 Dashboard',
             'routes': [
                 {'path': '/', 'method': 'GET', 'description': 'Main admin dashboard with real-time stats'},
-                {'path': '/api/stats', 'method': 'GET', 'description': 'JSON API for live statistics'},
-                {'path': '/api/recent-orders', 'method': 'GET', 'description': 'JSON API for recent orders'}
+                {'path': '/api/stats', 'method': 'GET', 'description': 'JSON API for live statistics (cached, includes age_seconds)'},
+                {'path': '/api/recent-orders', 'method': 'GET', 'description': 'JSON API for recent orders (served from the live order feed)'},
+                {'path': '/api/orders/stream', 'method': 'GET', 'description': 'Server-Sent Events: new orders and status changes (resumes from Last-Event-ID)'},
+                {'path': '/healthz', 'method': 'GET', 'description': 'Readiness: database reachable, worker boot and warm-up times'}
             ]
         },
         {
@@ -88,10 +108,19 @@ def admin_routes():
         {
             'category': '📦 Order Management',
             'routes': [
-                {'path': '/orders', 'method': 'GET', 'description': 'View all orders with details'},
+                {'path': '/orders', 'method': 'GET', 'description': 'View orders with details, newest first (?before=&limit=)'},
+                {'path': '/orders/export', 'method': 'GET', 'description': 'Stream orders as CSV or NDJSON (?format=&since=&status=&include_archive=1)'},
                 {'path': '/update-order-status/<order_id>', 'method': 'POST', 'description': 'Update order status'}
             ]
         },
+        {
+            'category': '📈 Reports',
+            'routes': [
+                {'path': '/reports', 'method': 'GET', 'description': 'Available reports and the latest report jobs'},
+                {'path': '/reports', 'method': 'POST', 'description': 'Queue a report (kind=daily_seller_revenue|weekly_product_trends|seller_totals, days=)'},
+                {'path': '/reports/<job_id>', 'method': 'GET', 'description': 'Report progress; the result once done (poll while Retry-After is set)'}
+            ]
+        },
         {
             'category': '🛍️ Product Management',
             'routes': [
@@ -102,7 +131,9 @@ def admin_routes():
         {
             'category': '🔗 System Info',
             'routes': [
-                {'path': '/routes', 'method': 'GET', 'description': 'This page - view all available routes'}
+                {'path': '/routes', 'method': 'GET', 'description': 'This page - view all available routes with live timings'},
+                {'path': '/metrics', 'method': 'GET', 'description': 'Prometheus metrics (latency per route, DB queries, pool)'},
+                {'path': '/metrics/routes', 'method': 'GET', 'description': 'Per-route p50/p95/p99 latency and query counts as JSON'}
             ]
         }
     ]
@@ -123,17 +154,25 @@ def admin_routes():
             'routes': [
                 {'path': '/seller/<seller_id>', 'method': 'GET', 'description': 'Seller dashboard with products and analytics'},
                 {'path': '/seller/<seller_id>/add', 'method': 'POST', 'description': 'Add new product'},
+                {'path': '/seller/<seller_id>/import', 'method': 'POST', 'description': 'Bulk import products from a CSV, JSON or NDJSON file'},
                 {'path': '/seller/<seller_id>/delete/<product_id>', 'method': 'GET', 'description': 'Delete product'},
-                {'path': '/seller/<seller_id>/orders', 'method': 'GET', 'description': 'View seller orders'},
-                {'path': '/seller/<seller_id>/orders/update/<order_id>', 'method': 'POST', 'description': 'Update order status'}
+                {'path': '/seller/<seller_id>/orders', 'method': 'GET', 'description': 'Seller order queue (?status=&before=&limit=)'},
+                {'path': '/seller/<seller_id>/orders/update/<order_id>', 'method': 'POST', 'description': 'Update order status'},
+                {'path': '/seller/<seller_id>/orders/bulk-update', 'method': 'POST', 'description': 'Move selected orders to a new status in one update'},
+                {'path': '/seller/<seller_id>/orders/stream', 'method': 'GET', 'description': "Server-Sent Events for the seller's new orders and status changes"}
             ]
         },
         {
             'category': '🛒 Buyer Features',
             'routes': [
-                {'path': '/buyer/<buyer_id>', 'method': 'GET', 'description': 'Buyer dashboard with available products'},
+                {'path': '/buyer/<buyer_id>', 'method': 'GET', 'description': 'Buyer dashboard with paginated products (?after=&limit=)'},
+                {'path': '/buyer/<buyer_id>/search', 'method': 'GET', 'description': 'Search products and sellers by name prefix (?q=&limit=), JSON'},
                 {'path': '/buyer/<buyer_id>/order/<product_id>', 'method': 'GET/POST', 'description': 'Place order for product'},
-                {'path': '/buyer/<buyer_id>/orders', 'method': 'GET', 'description': 'View buyer order history'}
+                {'path': '/buyer/<buyer_id>/cart', 'method': 'GET', 'description': 'View cart and checkout form'},
+                {'path': '/buyer/<buyer_id>/cart/add/<product_id>', 'method': 'POST', 'description': 'Add product to cart'},
+                {'path': '/buyer/<buyer_id>/cart/remove/<product_id>', 'method': 'POST', 'description': 'Remove product from cart'},
+                {'path': '/buyer/<buyer_id>/checkout', 'method': 'POST', 'description': 'Place one order for everything in the cart'},
+                {'path': '/buyer/<buyer_id>/orders', 'method': 'GET', 'description': 'View buyer order history (?history=all adds archived orders)'}
             ]
         },
         {
@@ -149,9 +188,27 @@ def admin_routes():
             'routes': [
                 {'path': '/logout', 'method': 'GET', 'description': 'Logout and clear session'}
             ]
+        },
+        {
+            'category': '⚙️ Diagnostics',
+            'routes': [
+                {'path': '/api/catalog/stats', 'method': 'GET', 'description': 'Catalog cache hit/miss counters'},
+                {'path': '/api/identity/stats', 'method': 'GET', 'description': 'Seller/buyer identity cache size and hit ratio'},
+                {'path': '/api/page-cache/stats', 'method': 'GET', 'description': 'Rendered-page cache hits and 304 responses'},
+                {'path': '/api/search/stats', 'method': 'GET', 'description': 'Search index size, rebuild time and age'},
+                {'path': '/api/order-feed/stats', 'method': 'GET', 'description': 'Order event buffer size, open streams and tailer polls'},
+                {'path': '/api/order-queue/stats', 'method': 'GET', 'description': 'Write-behind order queue depth and batch latency'},
+                {'path': '/healthz', 'method': 'GET', 'description': 'Readiness: database reachable, worker boot and warm-up times'},
+                {'path': '/metrics', 'method': 'GET', 'description': 'Prometheus metrics (latency per route, DB queries, pool, caches)'},
+                {'path': '/metrics/routes', 'method': 'GET', 'description': 'Per-route p50/p95/p99 latency and query counts as JSON'}
+            ]
         }
     ]
     
+    # Attach live timings to each listed route
+    attach_timings(admin_routes, metrics.route_summary())
+    attach_timings(main_app_routes, fetch_main_app_timings())
+
            # Calculate totals
     admin_total = sum(len(category['routes']) for category in admin_routes)
     main_total = sum(len(category['routes']) for category in main_app_routes)
@@ -165,52 +222,46 @@ def admin_routes():
                          total_routes=total_routes)
 
 
+def attach_timings(categories, timings):
+    for category in categories:
+        for route in category['routes']:
+            route['timing'] = timings.get(normalize_rule(route['path']))
+
+def fetch_main_app_timings():
+    try:
+        with urllib.request.urlopen(f"{MAIN_APP_URL}/metrics/routes", timeout=0.5) as response:
+            return json.load(response)
+    except Exception:
+        # Main app not reachable: show the routes without timings
+        return {}
+
+
 # API Endpoints for real-time data
 @app.route('/api/stats')
 def get_stats():
     try:
-        cursor.execute("SELECT COUNT(*) as total_sellers FROM sellers")
-        total_sellers = cursor.fetchone()['total_sellers']
-        
-        cursor.execute("SELECT COUNT(*) as total_buyers FROM buyers")
-        total_buyers = cursor.fetchone()['total_buyers']
-        
-        cursor.execute("SELECT COUNT(*) as total_products FROM products")
-        total_products = cursor.fetchone()['total_products']
-        
-        cursor.execute("SELECT COUNT(*) as total_orders FROM orders")
-        total_orders = cursor.fetchone()['total_orders']
-        
-        return jsonify({
-            'total_sellers': total_sellers,
-            'total_buyers': total_buyers,
-            'total_products': total_products,
-            'total_orders': total_orders,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+        counters = platform_stats.get()
+        counters['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return jsonify(counters)
     except Exception as e:
         return jsonify({'error': str(e)})
 
+@app.route('/api/orders/stream')
+def order_stream():
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        messages = order_feed.stream(last_event_id)
+    except StreamsFull:
+        # A 200 that ends at once: EventSource retries after the delay, where a 503 would stop it for good
+        return Response(f'retry: {BUSY_RETRY_MS}\n\n', mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    return Response(messages, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/recent-orders')
 def get_recent_orders():
     try:
-        cursor.execute("""
-            SELECT orders.*, products.name as product_name, 
-                   buyers.name as buyer_name, sellers.name as seller_name
-            FROM orders 
-            JOIN products ON orders.product_id = products.id
-            JOIN buyers ON orders.buyer_id = buyers.id
-            JOIN sellers ON products.seller_id = sellers.id
-            ORDER BY orders.id DESC LIMIT 10
-        """)
-        orders = cursor.fetchall()
-        
-        # Convert datetime objects to strings for JSON
-        for order in orders:
-            if 'created_at' in order and order['created_at']:
-                order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return jsonify(orders)
+        return jsonify(order_feed.recent(10))
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -218,46 +269,79 @@ def get_recent_orders():
 @app.route('/users')
 def admin_users():
     try:
-        cursor.execute("SELECT * FROM sellers")
-        sellers = cursor.fetchall()
-        
-        cursor.execute("SELECT * FROM buyers")
-        buyers = cursor.fetchall()
+        sellers = repository.fetch_all(repository.ALL_SELLERS)
+        buyers = repository.fetch_all(repository.ALL_BUYERS)
         
         return render_template('admin_users.html', sellers=sellers, buyers=buyers)
     except Exception as e:
         return f"Error: {str(e)}"
 
-# Orders Management
+# Orders Management (newest first, keyset paginated with ?before=<order id>)
 @app.route('/orders')
 def admin_orders():
     try:
-        cursor.execute("""
-            SELECT orders.*, products.name as product_name, 
-                   buyers.name as buyer_name, sellers.name as seller_name
-            FROM orders 
-            JOIN products ON orders.product_id = products.id
-            JOIN buyers ON orders.buyer_id = buyers.id
-            JOIN sellers ON products.seller_id = sellers.id
-            ORDER BY orders.id DESC
-        """)
-        orders = cursor.fetchall()
+        before = request.args.get('before', type=int)
+        limit = min(request.args.get('limit', ORDERS_PAGE_SIZE, type=int), 500)
+        orders = repository.fetch_all(repository.ORDERS_BEFORE, (before or 2**63 - 1, limit + 1))
+        next_before = orders[limit - 1]['id'] if len(orders) > limit else None
         
-        return render_template('admin_orders.html', orders=orders)
+        return render_template('admin_orders.html', orders=orders[:limit],
+                             next_before=next_before, limit=limit, statuses=rollup.ORDER_STATUSES)
     except Exception as e:
         return f"Error: {str(e)}"
 
+# Orders Export (streamed, constant memory)
+@app.route('/orders/export')
+def export_orders():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Unsupported format '{fmt}', use csv or ndjson"}), 400
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.strptime(since, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': "'since' must be a date in YYYY-MM-DD format"}), 400
+
+    filename = f"orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    include_archive = request.args.get('include_archive') in ('1', 'true', 'yes')
+    body = export.stream(fmt, since=since, status=request.args.get('status'), include_archive=include_archive)
+    return Response(stream_with_context(body), mimetype=export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# Reports (computed by background job processes, see jobs.py)
+@app.route('/reports', methods=['GET', 'POST'])
+def admin_reports():
+    report_jobs.start()
+    if request.method == 'GET':
+        kinds = {name: report.description for name, report in jobs.REPORTS.items()}
+        return jsonify({'reports': kinds, 'jobs': report_jobs.recent(20), 'runner': report_jobs.stats()})
+
+    values = request.get_json(silent=True) or request.form
+    try:
+        job_id, created = report_jobs.enqueue(values.get('kind'), values)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except jobs.JobsBusy as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '30'}
+    location = url_for('admin_report', job_id=job_id)
+    return jsonify({'id': job_id, 'created': created, 'status_url': location}), 202, {'Location': location}
+
+@app.route('/reports/<int:job_id>')
+def admin_report(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f"No report job {job_id}"}), 404
+    if job['status'] in (jobs.QUEUED, jobs.RUNNING):
+        return jsonify(job), 200, {'Retry-After': '2'}
+    return jsonify(job)
+
 # Products Management
 @app.route('/products')
 def admin_products():
     try:
-        cursor.execute("""
-            SELECT products.*, sellers.name as seller_name
-            FROM products
-            JOIN sellers ON products.seller_id = sellers.id
-            ORDER BY products.id DESC
-        """)
-        products = cursor.fetchall()
+        products = repository.fetch_all(repository.ALL_PRODUCTS)
         
         return render_template('admin_products.html', products=products)
     except Exception as e:
@@ -267,12 +351,21 @@ def admin_products():
 @app.route('/delete-user/<user_type>/<int:user_id>')
 def delete_user(user_type, user_id):
     try:
+        cursor = get_cursor()
         if user_type == 'seller':
             cursor.execute("DELETE FROM sellers WHERE id = %s", (user_id,))
+            stats.adjust(cursor, 'total_sellers', -cursor.rowcount)
         elif user_type == 'buyer':
             cursor.execute("DELETE FROM buyers WHERE id = %s", (user_id,))
+            stats.adjust(cursor, 'total_buyers', -cursor.rowcount)
         
-        conn.commit()
+        get_db().commit()
+        invalidate_identities()
+        if user_type == 'seller':
+            invalidate_catalog()
+            httpcache.touch(httpcache.seller_key(user_id), httpcache.DELETIONS)
+        elif user_type == 'buyer':
+            httpcache.touch(httpcache.buyer_key(user_id), httpcache.DELETIONS)
         flash(f"{user_type.title()} deleted successfully!")
         return redirect(url_for('admin_users'))
     except Exception as e:
@@ -284,9 +377,16 @@ def delete_user(user_type, user_id):
 def update_order_status(order_id):
     try:
         new_status = request.form['status']
-        cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (new_status, order_id))
-        conn.commit()
-        flash("Order status updated successfully!")
+        cursor = get_cursor()
+        order = rollup.change_order_status(cursor, order_id, new_status)
+        if order:
+            get_db().commit()
+            httpcache.touch(httpcache.seller_key(order['seller_id']), httpcache.buyer_key(order['buyer_id']))
+            if order['status'] != new_status:
+                order_feed.poll_now()
+            flash("Order status updated successfully!")
+        else:
+            flash("Order not found!")
         return redirect(url_for('admin_orders'))
     except Exception as e:
         flash(f"Error updating order: {str(e)}")
@@ -296,8 +396,16 @@ def update_order_status(order_id):
 @app.route('/delete-product/<int:product_id>')
 def delete_product(product_id):
     try:
+        cursor = get_cursor()
+        cursor.execute("SELECT seller_id FROM products WHERE id = %s", (product_id,))
+        product = cursor.fetchone()
         cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
-        conn.commit()
+        stats.adjust(cursor, 'total_products', -cursor.rowcount)
+        rollup.forget_product(cursor, product_id)
+        get_db().commit()
+        invalidate_catalog()
+        if product:
+            httpcache.touch(httpcache.seller_key(product['seller_id']), httpcache.DELETIONS)
         flash("Product deleted successfully!")
         return redirect(url_for('admin_products'))
     except Exception as e:
@@ -311,4 +419,5 @@ if __name__ == '__main__':
     print("📦 Orders: http://localhost:5001/orders")
     print("🛍️ Products: http://localhost:5001/products")
     print("🔗 Routes: http://localhost:5001/routes")
+    warm_up(app)
     app.run(port=5001, debug=True)
@@ -1,25 +1,80 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import mysql.connector
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response
 import os
-
-app = Flask(__name__)
-app.secret_key = 'your_secret_key'
-
-
-
-conn = mysql.connector.connect(
-    host='gateway01.ap-southeast-1.prod.aws.tidbcloud.com',           # PlanetScale host
-    user='4Fu6RXqNZAoLtZn.root',                                     # PlanetScale username
-    password='xgaprW1CjxNzgKBS',                                     # PlanetScale password
-    database='shop_db',                                              # Your database name
-    ssl_ca='C:\\Users\\omesh\\Desktop\\Desktop\\Onlline_food_ordering\\Onlline_food_ordering\\isrgrootx1.pem' # Path to CA cert
-    ) 
-cursor = conn.cursor(dictionary=True)
+import tempfile
+import time
+
+import config  # first: reads .env before the modules below look at the environment
+import archive
+import checkout
+import httpcache
+import importer
+import ingest
+import repository
+import rollup
+import stats
+from catalog import CatalogService, DEFAULT_PAGE_SIZE
+from db import get_cursor, get_db
+from events import BUSY_RETRY_MS, OrderFeed, StreamsFull
+from factory import create_app, on_warm_up, warm_up
+from identity import IdentityCache
+from search import SearchIndex
+
+
+
+# DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_SSL... from the environment or .env (see config.py)
+DB_CONFIG = config.database()
+
+# Pool, read replicas (DB_REPLICAS=replica1:3306,replica2:3306) and metrics, shared with the admin panel
+app = create_app(__name__, DB_CONFIG, secret_key=config.secret_key('SECRET_KEY', 'your_secret_key'),
+                 metrics_name='main')
+pool = app.extensions['db_pool']
+metrics = app.extensions['metrics']
+
+catalog = CatalogService(ttl=int(os.environ.get('CATALOG_CACHE_TTL', 30)))
+
+# Seller/buyer rows for logins and dashboards (see identity.py)
+identities = IdentityCache(ttl=int(os.environ.get('IDENTITY_CACHE_TTL', 60)))
+
+SELLER_ORDERS_PAGE_SIZE = 50
+MAX_BULK_ORDERS = 500
+
+# Rendered pages keyed by their ETag (see httpcache.py)
+pages = httpcache.PageCache(ttl=int(os.environ.get('PAGE_CACHE_TTL', 300)))
+# How long browsers may reuse pages that are the same for everyone before revalidating
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+# Buyer product search; rebuilt from the DB every SEARCH_REFRESH_INTERVAL seconds
+search_index = SearchIndex(pool, refresh_interval=float(os.environ.get('SEARCH_REFRESH_INTERVAL', 300)))
+
+# Live order events for the seller order queue (see events.py)
+# Each open stream holds a thread: cap them below GUNICORN_THREADS so pages still get served
+order_feed = OrderFeed(pool, size=int(os.environ.get('ORDER_FEED_BUFFER', 1000)),
+                       interval=float(os.environ.get('ORDER_FEED_INTERVAL', 1)),
+                       max_streams=int(os.environ.get('ORDER_FEED_MAX_STREAMS', 4)))
+
+# Optional write-behind ingestion: ORDER_INGEST=queue
+order_queue = None
+if os.environ.get('ORDER_INGEST') == 'queue':
+    order_queue = ingest.OrderQueue(
+        os.environ.get('ORDER_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'order_queue.db')),
+        pool,
+        maxsize=int(os.environ.get('ORDER_QUEUE_MAXSIZE', 10000)),
+        batch_size=int(os.environ.get('ORDER_QUEUE_BATCH', 200)),
+    )
+
+metrics.add_collector('catalog_cache', catalog.stats)
+metrics.add_collector('identity_cache', identities.stats)
+metrics.add_collector('search_index', search_index.stats)
+metrics.add_collector('page_cache', pages.stats)
+metrics.add_collector('order_feed', order_feed.stats)
+if order_queue is not None:
+    metrics.add_collector('order_queue', order_queue.stats)
 
 # Home
 @app.route('/')
 def home():
-    return render_template('home.html')
+    return pages.respond([], ('home',), lambda: render_template('home.html'),
+                         cache_control=f'public, max-age={STATIC_MAX_AGE}')
 
 # ---------------- SELLER ----------------
 @app.route('/seller_register', methods=['GET', 'POST'])
@@ -29,13 +84,14 @@ def seller_register():
         username = request.form['username']
         password = request.form['password']
 
-        cursor.execute("SELECT * FROM sellers WHERE username = %s", (username,))
-        if cursor.fetchone():
+        if repository.fetch_one(repository.SELLER_BY_USERNAME, (username,), readonly=False):
             flash("Username already exists!")
             return redirect(url_for('seller_register'))
 
+        cursor = get_cursor()
         cursor.execute("INSERT INTO sellers (name, username, password) VALUES (%s, %s, %s)", (name, username, password))
-        conn.commit()
+        stats.adjust(cursor, 'total_sellers', 1)
+        get_db().commit()
         flash("Seller registered successfully!")
         return redirect(url_for('seller_login'))
 
@@ -46,8 +102,7 @@ def seller_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        cursor.execute("SELECT * FROM sellers WHERE username = %s AND password = %s", (username, password))
-        seller = cursor.fetchone()
+        seller = identities.authenticate('seller', username, password)
         if seller:
             return redirect(url_for('seller_dashboard', seller_id=seller['id']))
         else:
@@ -57,69 +112,174 @@ def seller_login():
 
 @app.route('/seller/<int:seller_id>')
 def seller_dashboard(seller_id):
-    cursor.execute("SELECT * FROM sellers WHERE id = %s", (seller_id,))
-    seller = cursor.fetchone()
-    cursor.execute("SELECT * FROM products WHERE seller_id = %s", (seller_id,))
-    products = cursor.fetchall()
-
-    cursor.execute("""
-        SELECT products.name, COUNT(orders.id) AS order_count, SUM(products.price) AS total_revenue
-        FROM products
-        LEFT JOIN orders ON products.id = orders.product_id
-        WHERE products.seller_id = %s
-        GROUP BY products.name
-    """, (seller_id,))
-    chart_data = cursor.fetchall()
-
-    product_names = [p['name'] for p in chart_data]
-    order_counts = [p['order_count'] for p in chart_data]
-    revenues = [p['total_revenue'] for p in chart_data]
-
-    return render_template('seller_dashboard.html', seller_name=seller['name'],
-                           products=products, seller_id=seller_id,
-                           product_names=product_names,
-                           order_counts=order_counts,
-                           revenues=revenues)
+    def render():
+        seller = identities.seller(seller_id)
+        # Chart figures come from the incrementally maintained rollup, not from the orders table
+        products = repository.fetch_all(repository.SELLER_PRODUCTS, (seller_id,))
+
+        product_names = [p['name'] for p in products]
+        order_counts = [p['order_count'] for p in products]
+        revenues = [float(p['total_revenue']) for p in products]
+
+        return render_template('seller_dashboard.html', seller_name=seller['name'],
+                               products=products, seller_id=seller_id,
+                               product_names=product_names,
+                               order_counts=order_counts,
+                               revenues=revenues)
+
+    return pages.respond([httpcache.seller_key(seller_id)], (seller_id,), render)
 
 @app.route('/seller/<int:seller_id>/add', methods=['POST'])
 def add_product(seller_id):
     name = request.form['name']
     price = float(request.form['price'])
+    cursor = get_cursor()
     cursor.execute("INSERT INTO products (name, price, seller_id) VALUES (%s, %s, %s)", (name, price, seller_id))
-    conn.commit()
+    product_id = cursor.lastrowid
+    stats.adjust(cursor, 'total_products', 1)
+    get_db().commit()
+    catalog.invalidate()
+    httpcache.touch(httpcache.seller_key(seller_id))
+    seller = identities.seller(seller_id)
+    search_index.add_product(product_id, name, price, seller_id, seller['name'] if seller else '')
     return redirect(url_for('seller_dashboard', seller_id=seller_id))
 
+@app.route('/seller/<int:seller_id>/import', methods=['POST'])
+def import_products(seller_id):
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = request.form.get('format') or upload.filename.rsplit('.', 1)[-1].lower()
+        fmt = 'ndjson' if fmt == 'jsonl' else fmt
+    elif request.is_json:
+        stream = request.stream
+        fmt = 'json'
+    elif request.mimetype == 'application/x-ndjson':
+        stream = request.stream
+        fmt = 'ndjson'
+    else:
+        return jsonify({'error': "Upload a CSV, JSON or NDJSON file in the 'file' field"}), 400
+    if fmt not in importer.FORMATS:
+        return jsonify({'error': f"Unsupported format '{fmt}', use csv, json or ndjson"}), 400
+
+    batch_size = request.values.get('batch_size', importer.DEFAULT_BATCH_SIZE, type=int)
+    batch_size = max(1, min(batch_size, importer.MAX_BATCH_SIZE))
+
+    if not identities.seller(seller_id):
+        return jsonify({'error': "Seller not found"}), 404
+
+    def on_batch(batch_cursor, batch):
+        stats.adjust(batch_cursor, 'total_products', len(batch))
+
+    report = importer.import_products(get_db(), seller_id, importer.read_rows(stream, fmt),
+                                      batch_size=batch_size, on_batch=on_batch)
+
+    if report['inserted']:
+        catalog.invalidate()
+        httpcache.touch(httpcache.seller_key(seller_id))
+        search_index.refresh_soon()
+    # A malformed file is still a 400, with the rows committed before it in the report
+    return jsonify(report), 400 if 'error' in report else 200
+
 @app.route('/seller/<int:seller_id>/delete/<int:product_id>')
 def delete_product(seller_id, product_id):
+    cursor = get_cursor()
     cursor.execute("DELETE FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
-    conn.commit()
+    deleted = cursor.rowcount
+    if deleted:
+        stats.adjust(cursor, 'total_products', -1)
+        rollup.forget_product(cursor, product_id)
+    get_db().commit()
+    catalog.invalidate()
+    if deleted:
+        httpcache.touch(httpcache.seller_key(seller_id), httpcache.DELETIONS)
+        search_index.remove_product(product_id)
     return redirect(url_for('seller_dashboard', seller_id=seller_id))
 
+# Order queue, newest first: ?status= filters, ?before=<order id> pages (keyset on idx_orders_status_id)
 @app.route('/seller/<int:seller_id>/orders')
 def view_orders(seller_id):
-    cursor.execute("""
-        SELECT orders.*, products.name AS product_name, buyers.name AS buyer_name
-        FROM orders
-        JOIN products ON orders.product_id = products.id
-        JOIN buyers ON orders.buyer_id = buyers.id
-        WHERE products.seller_id = %s
-    """, (seller_id,))
-    orders = cursor.fetchall()
-
-    cursor.execute("SELECT * FROM sellers WHERE id = %s", (seller_id,))
-    seller = cursor.fetchone()
+    status = request.args.get('status')
+    if status not in rollup.ORDER_STATUSES:
+        status = None
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', SELLER_ORDERS_PAGE_SIZE, type=int), 200))
+
+    # Two fixed statements rather than one built per request, so each stays prepared
+    if status:
+        rows = repository.fetch_all(repository.SELLER_ORDERS_BY_STATUS,
+                                    (seller_id, status, before or 2**63 - 1, limit + 1))
+    else:
+        rows = repository.fetch_all(repository.SELLER_ORDERS, (seller_id, before or 2**63 - 1, limit + 1))
+    next_before = rows[limit - 1]['id'] if len(rows) > limit else None
+    orders = checkout.group_orders(rows[:limit])
+
+    seller = identities.seller(seller_id)
     session['seller_id'] = seller_id
     session['seller_name'] = seller['name']
-    return render_template('seller_orders.html', orders=orders, seller_name=seller['name'])
+    return render_template('seller_orders.html', orders=orders, seller_name=seller['name'], seller_id=seller_id,
+                           status=status, statuses=rollup.ORDER_STATUSES, next_before=next_before, limit=limit)
 
 @app.route('/seller/<int:seller_id>/orders/update/<int:order_id>', methods=['POST'])
 def update_order_status(seller_id, order_id):
     new_status = request.form['status']
-    cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (new_status, order_id))
-    conn.commit()
-    flash("Order status updated!")
+    if new_status not in rollup.ORDER_STATUSES:
+        flash(f"Unknown status '{new_status}'")
+        return redirect(url_for('view_orders', seller_id=seller_id))
+    cursor = get_cursor()
+    order = rollup.change_order_status(cursor, order_id, new_status, seller_id=seller_id)
+    if order:
+        get_db().commit()
+        httpcache.touch(httpcache.seller_key(seller_id), httpcache.buyer_key(order['buyer_id']))
+        if order['status'] != new_status:
+            order_feed.poll_now()
+        flash("Order status updated!")
+    else:
+        flash("Order not found!")
     return redirect(url_for('view_orders', seller_id=seller_id))
 
+@app.route('/seller/<int:seller_id>/orders/bulk-update', methods=['POST'])
+def bulk_update_order_status(seller_id):
+    new_status = request.form['status']
+    order_ids = list(dict.fromkeys(request.form.getlist('order_ids', type=int)))
+    back = request.referrer or url_for('view_orders', seller_id=seller_id)
+    if new_status not in rollup.ORDER_STATUSES:
+        flash(f"Unknown status '{new_status}'")
+        return redirect(back)
+    if not order_ids:
+        flash("Select at least one order")
+        return redirect(back)
+    if len(order_ids) > MAX_BULK_ORDERS:
+        flash(f"Update at most {MAX_BULK_ORDERS} orders at a time")
+        return redirect(back)
+
+    cursor = get_cursor()
+    orders = rollup.change_orders_status(cursor, order_ids, new_status, seller_id)
+    get_db().commit()
+
+    changed = [o for o in orders if o['status'] != new_status]
+    if changed:
+        httpcache.touch(httpcache.seller_key(seller_id), *[httpcache.buyer_key(o['buyer_id']) for o in changed])
+        order_feed.poll_now()
+    message = f"✅ {len(changed)} order(s) moved to {new_status}"
+    if len(orders) < len(order_ids):
+        message += f"; {len(order_ids) - len(orders)} not found among your orders"
+    flash(message)
+    return redirect(back)
+
+# New orders and status changes for one seller as Server-Sent Events; resumes from Last-Event-ID
+@app.route('/seller/<int:seller_id>/orders/stream')
+def seller_order_stream(seller_id):
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        messages = order_feed.stream(last_event_id, seller_id=seller_id)
+    except StreamsFull:
+        # A 200 that ends at once: EventSource retries after the delay, where a 503 would stop it for good
+        return Response(f'retry: {BUSY_RETRY_MS}\n\n', mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    return Response(messages, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ---------------- BUYER ----------------
 @app.route('/buyer_register', methods=['GET', 'POST'])
 def buyer_register():
@@ -128,13 +288,14 @@ def buyer_register():
         username = request.form['username']
         password = request.form['password']
 
-        cursor.execute("SELECT * FROM buyers WHERE username = %s", (username,))
-        if cursor.fetchone():
+        if repository.fetch_one(repository.BUYER_BY_USERNAME, (username,), readonly=False):
             flash("Username already exists!")
             return redirect(url_for('buyer_register'))
 
+        cursor = get_cursor()
         cursor.execute("INSERT INTO buyers (name, username, password) VALUES (%s, %s, %s)", (name, username, password))
-        conn.commit()
+        stats.adjust(cursor, 'total_buyers', 1)
+        get_db().commit()
         flash("Buyer registered successfully!")
         return redirect(url_for('buyer_login'))
 
@@ -145,8 +306,7 @@ def buyer_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        cursor.execute("SELECT * FROM buyers WHERE username = %s AND password = %s", (username, password))
-        buyer = cursor.fetchone()
+        buyer = identities.authenticate('buyer', username, password)
         if buyer:
             session['buyer_id'] = buyer['id']
             session['buyer_name'] = buyer['name']
@@ -163,14 +323,28 @@ def buyer_dashboard(buyer_id):
         return redirect(url_for('buyer_login'))
 
     buyer_name = session['buyer_name']
-    cursor.execute("""
-        SELECT products.*, sellers.name AS seller_name
-        FROM products
-        JOIN sellers ON products.seller_id = sellers.id
-    """)
-    products = cursor.fetchall()
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+
+    def render():
+        products, next_after = catalog.page(after=after, limit=limit)
+        return render_template('buyer_dashboard.html', products=products, buyer_name=buyer_name, buyer_id=buyer_id,
+                               next_after=next_after, limit=limit)
 
-    return render_template('buyer_dashboard.html', products=products, buyer_name=buyer_name, buyer_id=buyer_id)
+    variant = (buyer_id, buyer_name, after, limit, len(checkout.get_cart(session)))
+    return pages.respond([httpcache.CATALOG], variant, render)
+
+@app.route('/buyer/<int:buyer_id>/search')
+def search_products(buyer_id):
+    if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
+        return jsonify({'error': "Please login first!"}), 401
+
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 20, type=int)
+    started = time.perf_counter()
+    results = search_index.search(query, limit=limit)
+    return jsonify({'query': query, 'results': results,
+                    'took_ms': round((time.perf_counter() - started) * 1000, 3)})
 
 @app.route('/buyer/<int:buyer_id>/order/<int:product_id>', methods=['GET', 'POST'])
 def place_order(buyer_id, product_id):
@@ -179,32 +353,156 @@ def place_order(buyer_id, product_id):
         mobile = request.form['mobile']
         payment_method = request.form['payment_method']
 
+        product = repository.fetch_one(repository.PRODUCT_FOR_ORDER, (product_id,), readonly=False)
+        if not product:
+            flash("Product is no longer available!")
+            return redirect(url_for('buyer_dashboard', buyer_id=buyer_id))
+
+        if order_queue is not None:
+            try:
+                reference = order_queue.submit(buyer_id, product_id, product['price'], address, mobile, payment_method)
+            except ingest.QueueFull:
+                # Backpressure: fall through to a synchronous write while the queue drains
+                pass
+            else:
+                flash(f"✅ Order received! Reference {reference}")
+                return redirect(url_for('buyer_dashboard', buyer_id=buyer_id))
+
+        cursor = get_cursor()
         cursor.execute("""
             INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method)
             VALUES (%s, %s, 'Placed', %s, %s, %s)
         """, (buyer_id, product_id, address, mobile, payment_method))
-        conn.commit()
+        rollup.record_order(cursor, product_id, product['price'])
+        stats.adjust(cursor, 'total_orders', 1)
+        get_db().commit()
+        httpcache.touch(httpcache.buyer_key(buyer_id), httpcache.seller_key(product['seller_id']))
+        order_feed.poll_now()
 
         flash("✅ Order placed successfully!")
         return redirect(url_for('buyer_dashboard', buyer_id=buyer_id))
     return render_template('order_form.html', buyer_id=buyer_id)
 
+# ---------------- CART ----------------
+@app.route('/buyer/<int:buyer_id>/cart')
+def view_cart(buyer_id):
+    if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
+        flash("Please login first!")
+        return redirect(url_for('buyer_login'))
+
+    items = checkout.load_products(get_cursor(readonly=True), checkout.get_cart(session))
+    total = sum(item['price'] for item in items)
+    return render_template('cart.html', items=items, total=total, buyer_id=buyer_id)
+
+@app.route('/buyer/<int:buyer_id>/cart/add/<int:product_id>', methods=['POST'])
+def add_to_cart(buyer_id, product_id):
+    if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
+        flash("Please login first!")
+        return redirect(url_for('buyer_login'))
+
+    result = checkout.add_to_cart(session, product_id)
+    if result == checkout.ADDED:
+        flash("🛒 Added to cart!")
+    elif result == checkout.ALREADY_IN_CART:
+        flash("🛒 Already in your cart")
+    else:
+        flash(f"Your cart is full ({checkout.MAX_CART_ITEMS} items max)")
+    return redirect(request.referrer or url_for('buyer_dashboard', buyer_id=buyer_id))
+
+@app.route('/buyer/<int:buyer_id>/cart/remove/<int:product_id>', methods=['POST'])
+def remove_from_cart(buyer_id, product_id):
+    if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
+        flash("Please login first!")
+        return redirect(url_for('buyer_login'))
+
+    checkout.remove_from_cart(session, product_id)
+    return redirect(url_for('view_cart', buyer_id=buyer_id))
+
+@app.route('/buyer/<int:buyer_id>/checkout', methods=['POST'])
+def checkout_cart(buyer_id):
+    if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
+        flash("Please login first!")
+        return redirect(url_for('buyer_login'))
+
+    address = request.form['address']
+    mobile = request.form['mobile']
+    payment_method = request.form['payment_method']
+
+    cursor = get_cursor()
+    cart = checkout.get_cart(session)
+    products = checkout.load_products(cursor, cart)
+    if not products:
+        flash("Your cart is empty!")
+        return redirect(url_for('view_cart', buyer_id=buyer_id))
+    if len(products) < len(cart):
+        # Some products were deleted since they were added; let the buyer review the cart
+        session['cart'] = [p['id'] for p in products]
+        flash("Some items are no longer available and were removed from your cart.")
+        return redirect(url_for('view_cart', buyer_id=buyer_id))
+
+    checkout.place_checkout(cursor, buyer_id, products, address, mobile, payment_method)
+    get_db().commit()
+    httpcache.touch(httpcache.buyer_key(buyer_id), *[httpcache.seller_key(p['seller_id']) for p in products])
+    order_feed.poll_now()
+    checkout.clear_cart(session)
+
+    flash(f"✅ Order placed successfully for {len(products)} items!")
+    return redirect(url_for('buyer_orders', buyer_id=buyer_id))
+
 @app.route('/buyer/<int:buyer_id>/orders')
 def buyer_orders(buyer_id):
     if 'buyer_id' not in session or session['buyer_id'] != buyer_id:
         flash("Please login first!")
         return redirect(url_for('buyer_login'))
 
-    cursor.execute("""
-        SELECT orders.*, products.name AS product_name, sellers.name AS seller_name
-        FROM orders
-        JOIN products ON orders.product_id = products.id
-        JOIN sellers ON products.seller_id = sellers.id
-        WHERE orders.buyer_id = %s
-    """, (buyer_id,))
-    orders = cursor.fetchall()
+    buyer_name = session['buyer_name']
+    # Archived orders only when asked for: ?history=all
+    history = request.args.get('history') == 'all'
+
+    def render():
+        if history:
+            cursor = get_cursor(readonly=True)
+            cursor.execute(f"""
+                SELECT orders.*, products.name AS product_name, products.price, sellers.name AS seller_name
+                FROM {archive.order_source('buyer_id = %s')}
+                JOIN products ON orders.product_id = products.id
+                JOIN sellers ON products.seller_id = sellers.id
+                ORDER BY orders.id DESC
+            """, (buyer_id, buyer_id))
+            rows = cursor.fetchall()
+        else:
+            rows = repository.fetch_all(repository.BUYER_ORDERS, (buyer_id,))
+        orders = checkout.group_orders(rows)
+        return render_template('buyer_orders.html', orders=orders, buyer_name=buyer_name, buyer_id=buyer_id,
+                               history=history)
+
+    return pages.respond([httpcache.buyer_key(buyer_id), httpcache.DELETIONS], (buyer_id, buyer_name, history), render)
+
+@app.route('/api/catalog/stats')
+def catalog_stats():
+    return jsonify(catalog.stats())
 
-    return render_template('buyer_orders.html', orders=orders, buyer_name=session['buyer_name'], buyer_id=buyer_id)
+@app.route('/api/identity/stats')
+def identity_stats():
+    return jsonify(identities.stats())
+
+@app.route('/api/page-cache/stats')
+def page_cache_stats():
+    return jsonify(pages.stats())
+
+@app.route('/api/search/stats')
+def search_stats():
+    return jsonify(search_index.stats())
+
+@app.route('/api/order-feed/stats')
+def order_feed_stats():
+    return jsonify(order_feed.stats())
+
+@app.route('/api/order-queue/stats')
+def order_queue_stats():
+    if order_queue is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(order_queue.stats(), enabled=True))
 
 # ---------------- LOGOUT ----------------
 @app.route('/logout')
@@ -213,6 +511,16 @@ def logout():
     flash("Logged out successfully!")
     return redirect(url_for('home'))
 
+# ---------------- WARM-UP ----------------
+# Per process, after fork under gunicorn (see gunicorn.conf.py): nothing above connects at import
+on_warm_up(app, search_index.start)
+on_warm_up(app, order_feed.start)
+on_warm_up(app, catalog.page)  # first catalog page, and its prepared statement
+if order_queue is not None:
+    # Drain orders left in the queue file by a crash or restart without waiting for a new one
+    on_warm_up(app, order_queue.start)
+
 # ---------------- RUN ----------------
 if __name__ == '__main__':
+    warm_up(app)
     app.run(debug=True)
@@ -0,0 +1,173 @@
+"""Move old, finished orders out of the live ``orders`` table.
+
+Orders that reached a terminal status (``Delivered`` or ``Cancelled``)
+more than ``--retention-days`` ago are copied into ``orders_archive`` (same
+columns and ids, created by ``migrations.py``) and deleted from
+``orders``, so the queries serving today's orders stay small::
+
+    python archive.py run --retention-days 90 --batch-size 500 --sleep 0.2
+    python archive.py status
+
+Each batch walks ``orders`` by primary key, locks only the rows it moves
+and commits, then sleeps ``--sleep`` seconds to leave the database room
+for live traffic.  Ids need not follow ``created_at`` (TiDB allocates
+them per node, imports keep their own dates), so every run walks the
+whole table and checks the cutoff order by order.  Progress is saved in
+``archive_checkpoints`` in the same transaction as the move, so an
+interrupted run resumes where it stopped; a run that reaches the end of
+the table resets the checkpoint, and the next run starts over to pick up
+orders that have finished since.
+
+The rollup and platform counters already include archived orders; buyers
+see them with ``?history=all`` and the admin export with
+``include_archive=1``.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+TERMINAL_STATUSES = ('Delivered', 'Cancelled')
+CHECKPOINT = 'orders'
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+ORDER_COLUMNS = ('id', 'buyer_id', 'product_id', 'status', 'address', 'mobile',
+                 'payment_method', 'created_at', 'checkout_id')
+
+
+def order_source(condition=None):
+    """A FROM-clause source named ``orders`` covering live and archived orders.
+
+    ``condition`` (a WHERE fragment on unqualified order columns) is applied
+    to each half, so both use their own indexes; pass its parameters twice.
+    """
+    columns = ', '.join(ORDER_COLUMNS)
+    where = f" WHERE {condition}" if condition else ""
+    return f"(SELECT {columns} FROM orders{where} UNION ALL SELECT {columns} FROM orders_archive{where}) AS orders"
+
+
+def load_checkpoint(cursor):
+    cursor.execute("SELECT last_id, cutoff, moved FROM archive_checkpoints WHERE name = %s", (CHECKPOINT,))
+    return cursor.fetchone()
+
+
+def save_checkpoint(cursor, last_id, cutoff, moved):
+    cursor.execute("UPDATE archive_checkpoints SET last_id = %s, cutoff = %s, moved = %s WHERE name = %s",
+                   (last_id, cutoff, moved, CHECKPOINT))
+    if not cursor.rowcount:
+        cursor.execute("INSERT INTO archive_checkpoints (name, last_id, cutoff, moved) VALUES (%s, %s, %s, %s)",
+                       (CHECKPOINT, last_id, cutoff, moved))
+
+
+def move_batch(cursor, ids):
+    """Copy the orders ``ids`` into the archive and delete them; the caller commits."""
+    placeholders = ', '.join(['%s'] * len(ids))
+    statuses = ', '.join(['%s'] * len(TERMINAL_STATUSES))
+    columns = ', '.join(ORDER_COLUMNS)
+    # Lock just these rows, re-checking the status in case a seller changed it since the scan
+    cursor.execute(f"""
+        SELECT id FROM orders WHERE id IN ({placeholders}) AND status IN ({statuses}) FOR UPDATE
+    """, (*ids, *TERMINAL_STATUSES))
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"INSERT INTO orders_archive ({columns}) SELECT {columns} FROM orders WHERE id IN ({placeholders})",
+                   ids)
+    cursor.execute(f"DELETE FROM orders WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+
+def run(conn, retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE, sleep=0.0,
+        max_batches=None, log=print):
+    """Archive eligible orders batch by batch; returns how many were moved by this call."""
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    checkpoint = load_checkpoint(cursor)
+    if checkpoint and checkpoint['cutoff']:
+        # Resume the interrupted run with its original cutoff
+        last_id, cutoff, moved = checkpoint['last_id'], str(checkpoint['cutoff']), checkpoint['moved']
+        log(f"Resuming after order {last_id} (cutoff {cutoff}, {moved} moved so far)")
+    else:
+        last_id, moved = 0, 0
+        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.commit()
+
+    moved_now = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        cursor.execute("""
+            SELECT id, status, created_at < %s AS expired
+            FROM orders
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (cutoff, last_id, batch_size))
+        rows = cursor.fetchall()
+        # Newer orders can sit between old ones, so only the end of the table ends the run
+        done = len(rows) < batch_size
+        ids = [row['id'] for row in rows if row['expired'] and row['status'] in TERMINAL_STATUSES]
+
+        count = move_batch(cursor, ids) if ids else 0
+        if rows:
+            last_id = rows[-1]['id']
+        moved += count
+        moved_now += count
+        if done:
+            save_checkpoint(cursor, 0, None, 0)
+        else:
+            save_checkpoint(cursor, last_id, cutoff, moved)
+        conn.commit()
+        batches += 1
+        if count:
+            log(f"Archived {count} orders up to id {last_id} ({moved} this run)")
+        if done:
+            log(f"✅ Reached the end of orders; all finished before {cutoff} are archived")
+            break
+        if sleep:
+            time.sleep(sleep)
+    return moved_now
+
+
+def status(conn):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute("SELECT COUNT(*) AS n FROM orders")
+    live = cursor.fetchone()['n']
+    cursor.execute("SELECT COUNT(*) AS n FROM orders_archive")
+    archived = cursor.fetchone()['n']
+    checkpoint = load_checkpoint(cursor)
+    conn.commit()
+    return {
+        'live_orders': int(live),
+        'archived_orders': int(archived),
+        'resume_after_id': checkpoint['last_id'] if checkpoint and checkpoint['cutoff'] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive finished orders older than the retention period")
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--sleep', type=float, default=0.1, help="Seconds to pause between batches")
+    parser.add_argument('--max-batches', type=int, help="Stop after this many batches (resume with another run)")
+    parser.add_argument('--sqlite', metavar='PATH', help="Run against a local SQLite database instead of MySQL")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+    else:
+        from app import pool
+
+    with pool.connection() as conn:
+        if args.command == 'status':
+            for name, value in status(conn).items():
+                print(f"  {name}: {value}")
+            return
+        moved = run(conn, retention_days=args.retention_days, batch_size=args.batch_size,
+                    sleep=args.sleep, max_batches=args.max_batches)
+    print(f"✅ Archived {moved} orders")
+
+
+if __name__ == '__main__':
+    main()
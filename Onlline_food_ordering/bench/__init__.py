@@ -0,0 +1,13 @@
+"""Load-test and benchmark suite for app.py and admin_panel.py.
+
+Run from the ``Onlline_food_ordering`` directory::
+
+    python -m bench.seed --sqlite /tmp/bench.db --sellers 200 --products 20000 --orders 500000
+    python -m bench.run --sqlite /tmp/bench.db --threads 8 --duration 30 --out results.json
+    python -m bench.statements --sqlite /tmp/bench.db --iterations 500
+    python -m bench.boot --runs 5
+
+Omit ``--sqlite`` to use the apps' configured MySQL databases.  Results
+are JSON (throughput and p50/p99 per route, or per query for
+``bench.statements``) so runs can be compared across commits.
+"""
@@ -0,0 +1,107 @@
+"""Measure how quickly the apps start, with no database to talk to.
+
+Three figures per app, as JSON:
+
+* ``import_ms``: a cold ``import app`` in a fresh interpreter, which is
+  what a worker without ``preload_app`` pays.
+* ``fork_to_first_response_ms``: fork an already imported app, run the
+  post-fork warm-up (``factory.warm_up``) and serve a first request, as a
+  gunicorn worker does with ``preload_app``.
+* ``healthz``: the status and time of ``/healthz`` while the database is
+  down, i.e. how quickly a worker reports it is not ready.
+
+The database settings point at a closed local port, so none of this
+waits on a network::
+
+    python -m bench.boot --runs 5 --out boot.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .run import git_commit
+
+# Connection refused straight away: no database, and no network timeout either
+NO_DATABASE = {'DB_HOST': '127.0.0.1', 'DB_PORT': '1', 'ADMIN_DB_HOST': '127.0.0.1', 'ADMIN_DB_PORT': '1'}
+
+# A first request that needs no database on each app
+APPS = {'main': ('app', '/'), 'admin': ('admin_panel', '/metrics')}
+
+
+def import_ms(module, runs):
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             env=dict(os.environ, **NO_DATABASE), cwd=os.getcwd())
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(samples), 1)
+
+
+def fork_to_first_response_ms(app, path, runs):
+    from factory import warm_up
+
+    samples = []
+    for _ in range(runs):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                warm_up(app, after_fork=True)
+                status = app.test_client().get(path).status_code
+                os.write(write_fd, f"{(time.perf_counter() - started) * 1000} {status}".encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            elapsed, status = f.read().split()
+        os.waitpid(pid, 0)
+        if int(status) >= 500:
+            raise SystemExit(f"{path} answered {status} in the forked worker")
+        samples.append(float(elapsed))
+    return round(statistics.median(samples), 1)
+
+
+def healthz(app):
+    started = time.perf_counter()
+    response = app.test_client().get('/healthz')
+    return {'status': response.status_code, 'ms': round((time.perf_counter() - started) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import, post-fork and readiness times without a database")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--out', metavar='FILE', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ.update(NO_DATABASE)
+    # Background threads failing to reach the missing database are expected here
+    logging.getLogger().setLevel(logging.CRITICAL)
+    apps = {}
+    for name, (module, path) in APPS.items():
+        imported = __import__(module)
+        apps[name] = {
+            'import_ms': import_ms(module, args.runs),
+            'fork_to_first_response_ms': fork_to_first_response_ms(imported.app, path, args.runs),
+            'healthz': healthz(imported.app),
+        }
+    report = {'config': {'runs': args.runs}, 'commit': git_commit(), 'apps': apps}
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Drive the apps concurrently and report per-route throughput and latency.
+
+Each worker thread is one simulated user with its own test client.  It
+picks scenarios by weight from ``--mix`` until ``--duration`` seconds have
+passed (after ``--warmup`` seconds that are not recorded).  The report is
+written as JSON::
+
+    {"config": {...}, "commit": "...", "elapsed_seconds": ...,
+     "total": {"requests": ..., "errors": ..., "throughput_rps": ...},
+     "routes": {"/buyer/<buyer_id>": {"count": ..., "errors": ...,
+                "throughput_rps": ..., "p50_ms": ..., "p99_ms": ..., "max_ms": ...}}}
+
+Keep the JSON from runs on different commits to compare them.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from .scenarios import DEFAULT_MIX, SCENARIOS, Context, Session
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}', choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Module-level objects of app.py and admin_panel.py that hold on to the pool they were built with
+POOL_USERS = ('order_queue', 'order_feed', 'search_index', 'report_jobs')
+
+
+def use_pool(module, pool, connect=None):
+    # Point an app module (its Flask app and background workers) at another pool, e.g. the SQLite stand-in
+    from cache import versions
+
+    module.pool = pool
+    module.app.extensions['db_pool'] = pool
+    module.app.extensions['metrics'].add_collector('db_pool', pool.stats)
+    versions.pool = pool
+    for name in POOL_USERS:
+        if getattr(module, name, None) is not None:
+            getattr(module, name).pool = pool
+    if connect is not None and getattr(module, 'report_jobs', None) is not None:
+        # Job processes open their own connection rather than use the pool
+        module.report_jobs.connect = connect
+
+
+def _is_error(response):
+    # Views report failures as a 200 "Error: ..." body or {"error": ...} JSON, so look at those too
+    if response.status_code >= 400 or response.get_data()[:6] == b'Error:':
+        return True
+    if response.is_json:
+        body = response.get_json(silent=True)
+        return isinstance(body, dict) and bool(body.get('error'))
+    return False
+
+
+def run(main_app, admin_app, ctx, threads=8, duration=10.0, warmup=1.0, mix=DEFAULT_MIX, seed=42):
+    weights = parse_mix(mix)
+    names, cum_weights = list(weights), list(itertools.accumulate(weights.values()))
+
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = Session(main_app, admin_app, ctx, rng)
+        local_samples, local_errors = {}, {}
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, cum_weights=cum_weights)[0]
+            started = time.perf_counter()
+            results = SCENARIOS[name](session)
+            for route, response in results:
+                failed = _is_error(response)
+                elapsed = time.perf_counter() - started
+                started = time.perf_counter()
+                response.close()
+                if now < start_at:
+                    continue
+                local_samples.setdefault(route, []).append(elapsed)
+                local_errors[route] = local_errors.get(route, 0) + failed
+        with lock:
+            for route, values in local_samples.items():
+                samples.setdefault(route, []).extend(values)
+                errors[route] = errors.get(route, 0) + local_errors[route]
+
+    workers = [threading.Thread(target=worker, args=(i,), name=f'bench-{i}') for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    routes = {}
+    for route in sorted(samples):
+        values = sorted(samples[route])
+        routes[route] = {
+            'count': len(values),
+            'errors': errors[route],
+            'throughput_rps': round(len(values) / duration, 2),
+            'p50_ms': round(percentile(values, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    requests_total = sum(r['count'] for r in routes.values())
+    return {
+        'total': {
+            'requests': requests_total,
+            'errors': sum(r['errors'] for r in routes.values()),
+            'throughput_rps': round(requests_total / duration, 2),
+        },
+        'routes': routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the load-test scenarios against app.py and admin_panel.py")
+    parser.add_argument('--sqlite', metavar='PATH', help="Use a local SQLite database (see bench.seed) for both apps")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=1.0, help="Unrecorded seconds before measuring")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Scenario weights, e.g. browse=50,order=50")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', help="Free-form label stored with the results")
+    parser.add_argument('--out', metavar='FILE', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    import admin_panel
+    import app as main_module
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        # One pool for both apps: SQLite serializes writers anyway
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=args.threads, dialect='sqlite')
+        use_pool(main_module, pool, sqlite_connect(args.sqlite))
+        use_pool(admin_panel, pool, sqlite_connect(args.sqlite))
+    pool = main_module.app.extensions['db_pool']
+
+    with pool.connection() as conn:
+        ctx = Context(conn)
+
+    started = time.perf_counter()
+    report = run(main_module.app, admin_panel.app, ctx, threads=args.threads, duration=args.duration,
+                 warmup=args.warmup, mix=args.mix, seed=args.seed)
+    report = {
+        'config': {
+            'label': args.label,
+            'database': f'sqlite:{args.sqlite}' if args.sqlite else 'mysql',
+            'threads': args.threads,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': parse_mix(args.mix),
+            'seed': args.seed,
+            'products': ctx.product_range[1] - ctx.product_range[0] + 1,
+        },
+        'commit': git_commit(),
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+        **report,
+        'pool': pool.stats(),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.out}: {report['total']['requests']} requests, "
+              f"{report['total']['throughput_rps']} req/s", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Scripted user sessions.
+
+Each scenario performs one user action through a Flask test client and
+returns the (route, response) pairs it issued; ``bench.run`` times every
+request.  Routes are labelled by their URL rule so numbers line up with
+``/metrics/routes``.
+"""
+from datetime import date
+
+from catalog import DEFAULT_PAGE_SIZE
+
+from .seed import BENCH_PASSWORD
+
+
+class Context:
+    """IDs the scenarios draw from, loaded once from the seeded database."""
+
+    def __init__(self, conn):
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("SELECT id, username FROM buyers WHERE username LIKE 'bench_buyer%' ORDER BY id LIMIT 5000")
+        self.buyers = [(row['id'], row['username']) for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM sellers WHERE username LIKE 'bench_seller%' ORDER BY id LIMIT 5000")
+        self.sellers = [row['id'] for row in cursor.fetchall()]
+        cursor.execute("SELECT MIN(id) AS lo, MAX(id) AS hi FROM products")
+        row = cursor.fetchone()
+        self.product_range = (row['lo'], row['hi'])
+        if not self.buyers or not self.sellers or row['lo'] is None:
+            raise RuntimeError("No benchmark data found; run `python -m bench.seed` first")
+
+
+class Session:
+    """One simulated user: a test client per app, logged in as a benchmark buyer."""
+
+    def __init__(self, main_app, admin_app, ctx, rng):
+        self.ctx = ctx
+        self.rng = rng
+        self.main = main_app.test_client()
+        self.admin = admin_app.test_client()
+        self.buyer_id, username = rng.choice(ctx.buyers)
+        self.main.post('/buyer_login', data={'username': username, 'password': BENCH_PASSWORD})
+        self.next_after = 0
+
+
+# ---------------- BUYER ----------------
+def browse_catalog(s):
+    # Mostly the first page, sometimes keep scrolling from where we left off
+    if s.rng.random() < 0.3 and s.next_after:
+        after = s.next_after
+    else:
+        after = 0
+    response = s.main.get(f'/buyer/{s.buyer_id}?after={after}&limit={DEFAULT_PAGE_SIZE}')
+    s.next_after = after + DEFAULT_PAGE_SIZE if after < s.ctx.product_range[1] else 0
+    return [('/buyer/<buyer_id>', response)]
+
+
+def place_order(s):
+    lo, hi = s.ctx.product_range
+    response = s.main.post(f'/buyer/{s.buyer_id}/order/{s.rng.randint(lo, hi)}', data={
+        'address': '1 Bench Street', 'mobile': '9000000000', 'payment_method': 'COD',
+    })
+    return [('/buyer/<buyer_id>/order/<product_id>', response)]
+
+
+def buyer_orders(s):
+    return [('/buyer/<buyer_id>/orders', s.main.get(f'/buyer/{s.buyer_id}/orders'))]
+
+
+# ---------------- SELLER ----------------
+def seller_dashboard(s):
+    seller_id = s.rng.choice(s.ctx.sellers)
+    return [('/seller/<seller_id>', s.main.get(f'/seller/{seller_id}'))]
+
+
+def seller_orders(s):
+    seller_id = s.rng.choice(s.ctx.sellers)
+    return [('/seller/<seller_id>/orders', s.main.get(f'/seller/{seller_id}/orders'))]
+
+
+# ---------------- ADMIN ----------------
+def admin_orders(s):
+    return [('/orders', s.admin.get('/orders'))]
+
+
+def admin_export(s):
+    since = date.today().isoformat()
+    return [('/orders/export', s.admin.get(f'/orders/export?format=ndjson&status=Placed&since={since}'))]
+
+
+def admin_stats(s):
+    return [('/api/stats', s.admin.get('/api/stats')),
+            ('/api/recent-orders', s.admin.get('/api/recent-orders'))]
+
+
+SCENARIOS = {
+    'browse': browse_catalog,
+    'order': place_order,
+    'history': buyer_orders,
+    'seller': seller_dashboard,
+    'seller_orders': seller_orders,
+    'admin_orders': admin_orders,
+    'admin_export': admin_export,
+    'admin_stats': admin_stats,
+}
+
+DEFAULT_MIX = 'browse=40,order=15,history=10,seller=15,seller_orders=10,admin_orders=4,admin_export=1,admin_stats=5'
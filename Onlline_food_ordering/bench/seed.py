@@ -0,0 +1,126 @@
+"""Deterministic synthetic data for benchmarks.
+
+Creates ``bench_seller<seed>_<n>`` / ``bench_buyer<seed>_<n>`` accounts
+(password ``BENCH_PASSWORD``), products spread over the sellers and orders
+spread over the ``--days`` days up to ``--until``, then rebuilds the sales
+rollup and the platform counters so derived tables match.  Every value
+comes from ``--seed``, so two runs with the same arguments write the same
+rows; seed a database again with another ``--seed``.  Inserts go through
+``executemany`` in batches, so millions of rows are practical.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import rollup
+import stats
+
+BENCH_PASSWORD = 'bench'
+BATCH_SIZE = 5000
+STATUSES = ('Placed', 'Cooking', 'Out for delivery', 'Delivered')
+DISHES = ('Pizza', 'Burger', 'Biryani', 'Dosa', 'Paneer Tikka', 'Noodles', 'Momos', 'Thali',
+          'Pasta', 'Sandwich', 'Samosa', 'Idli', 'Fried Rice', 'Shawarma', 'Kulfi', 'Lassi')
+ADJECTIVES = ('Spicy', 'Classic', 'Cheesy', 'Smoky', 'Crispy', 'Masala', 'Veg', 'Chicken', 'Tandoori', 'Special')
+
+
+def _insert(conn, statement, rows, log, label):
+    cursor = conn.cursor()
+    total = 0
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        cursor.executemany(statement, batch)
+        conn.commit()
+        total += len(batch)
+    log(f"  {label}: {total}")
+
+
+def _id_range(conn, table, first, last):
+    # Accounts are inserted in order, so the first and last usernames bound the ids
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute(f"SELECT MIN(id) AS lo, MAX(id) AS hi FROM {table} WHERE username IN (%s, %s)", (first, last))
+    row = cursor.fetchone()
+    return row['lo'], row['hi']
+
+
+def seed(conn, sellers=50, buyers=500, products=5000, orders=50000, days=180, seed=42, until=None, log=print):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    seller_name = f'bench_seller{seed}_{{}}'.format
+    buyer_name = f'bench_buyer{seed}_{{}}'.format
+
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute("SELECT id FROM sellers WHERE username = %s", (seller_name(0),))
+    if cursor.fetchone():
+        raise ValueError(f"This database is already seeded with --seed {seed}; use another seed")
+
+    _insert(conn, "INSERT INTO sellers (name, username, password) VALUES (%s, %s, %s)",
+            [(f'Kitchen {n}', seller_name(n), BENCH_PASSWORD) for n in range(sellers)], log, 'sellers')
+    _insert(conn, "INSERT INTO buyers (name, username, password) VALUES (%s, %s, %s)",
+            [(f'Buyer {n}', buyer_name(n), BENCH_PASSWORD) for n in range(buyers)], log, 'buyers')
+    seller_lo, seller_hi = _id_range(conn, 'sellers', seller_name(0), seller_name(sellers - 1))
+    buyer_lo, buyer_hi = _id_range(conn, 'buyers', buyer_name(0), buyer_name(buyers - 1))
+
+    _insert(conn, "INSERT INTO products (name, price, seller_id) VALUES (%s, %s, %s)",
+            [(f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}', round(rng.uniform(49, 899), 2),
+              rng.randint(seller_lo, seller_hi)) for _ in range(products)], log, 'products')
+    cursor.execute("SELECT id FROM products WHERE seller_id BETWEEN %s AND %s ORDER BY id", (seller_lo, seller_hi))
+    product_ids = [row['id'] for row in cursor.fetchall()]
+
+    # Order dates count back from midnight after ``until`` (default: today), not from the current second
+    end = datetime.combine((until or date.today()) + timedelta(days=1), datetime.min.time())
+    statement = """
+        INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    # Generated batch by batch so millions of orders never sit in memory at once
+    for start in range(0, orders, BATCH_SIZE):
+        batch = []
+        for _ in range(min(BATCH_SIZE, orders - start)):
+            age = timedelta(days=rng.random() ** 2 * days)
+            status = 'Delivered' if age > timedelta(days=1) else rng.choice(STATUSES)
+            batch.append((rng.randint(buyer_lo, buyer_hi), rng.choice(product_ids), status,
+                          f'{rng.randint(1, 999)} Bench Street', f'9{rng.randint(100000000, 999999999)}',
+                          rng.choice(('COD', 'UPI', 'Card')), (end - age).strftime('%Y-%m-%d %H:%M:%S')))
+        conn.cursor().executemany(statement, batch)
+        conn.commit()
+    log(f"  orders: {orders}")
+
+    rollup.rebuild(conn, log=lambda message: None)
+    stats.rebuild_counters(conn)
+    log(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data")
+    parser.add_argument('--sqlite', metavar='PATH', help="Seed a local SQLite database (schema is created)")
+    parser.add_argument('--sellers', type=int, default=50)
+    parser.add_argument('--buyers', type=int, default=500)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=180, help="Spread orders over this many days")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--until', type=date.fromisoformat, help="Last day with orders, YYYY-MM-DD (default: today)")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        import migrations
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+        with pool.connection() as conn:
+            migrations.upgrade(conn, dialect='sqlite')
+    else:
+        from app import pool
+
+    with pool.connection() as conn:
+        try:
+            seed(conn, sellers=args.sellers, buyers=args.buyers, products=args.products,
+                 orders=args.orders, days=args.days, seed=args.seed, until=args.until)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
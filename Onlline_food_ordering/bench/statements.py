@@ -0,0 +1,139 @@
+"""Compare repository queries with the plain dictionary cursor they replaced.
+
+For each query the same parameters run ``--iterations`` times two ways on
+one connection: ``cursor(dictionary=True, buffered=True)`` with
+``execute``/``fetchall`` (a fresh parse per call, one dict per row), and
+``repository.fetch_all`` (a reused prepared statement, one record per
+row).  The report is JSON::
+
+    {"config": {...}, "commit": "...",
+     "queries": {"catalog page": {"rows": ...,
+                 "dict": {"median_us": ..., "p99_us": ..., "bytes_per_row": ...},
+                 "prepared": {...}}}}
+
+``bytes_per_row`` is what the fetched rows hold on to, measured with
+``tracemalloc`` on one extra call.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import repository
+
+from .run import git_commit, percentile
+
+# (query, parameters) pairs; ids are filled in from the seeded database
+CASES = [
+    (repository.SELLER_BY_ID, lambda ids: (ids['seller'],)),
+    (repository.PRODUCTS_AFTER, lambda ids: (0, 48)),
+    (repository.SELLER_PRODUCTS, lambda ids: (ids['seller'],)),
+    (repository.SELLER_ORDERS, lambda ids: (ids['seller'], 2**63 - 1, 51)),
+    (repository.BUYER_ORDERS, lambda ids: (ids['buyer'],)),
+    (repository.RECENT_ORDERS, lambda ids: (10,)),
+]
+
+
+def _plain(conn, query, params):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute(query.sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _prepared(conn, query, params):
+    return repository.fetch_all(query, params, conn=conn)
+
+
+def _sample_ids(conn):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    # The busiest seller and buyer, so the order queries return real pages
+    cursor.execute("""
+        SELECT products.seller_id, COUNT(*) AS n FROM orders
+        JOIN products ON orders.product_id = products.id
+        GROUP BY products.seller_id ORDER BY n DESC LIMIT 1
+    """)
+    seller = cursor.fetchone()
+    cursor.execute("SELECT buyer_id, COUNT(*) AS n FROM orders GROUP BY buyer_id ORDER BY n DESC LIMIT 1")
+    buyer = cursor.fetchone()
+    conn.commit()
+    return {'seller': seller['seller_id'] if seller else 1, 'buyer': buyer['buyer_id'] if buyer else 1}
+
+
+def measure(conn, fn, query, params, iterations):
+    fn(conn, query, params)  # warm up: the prepared path prepares here
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        rows = fn(conn, query, params)
+        timings.append(time.perf_counter() - started)
+    conn.commit()
+    del rows
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rows = fn(conn, query, params)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+    timings.sort()
+    return len(rows), {
+        'median_us': round(statistics.median(timings) * 1e6, 1),
+        'p99_us': round(percentile(timings, 0.99) * 1e6, 1),
+        'bytes_per_row': round(held / len(rows)) if rows else None,
+    }
+
+
+def run(conn, iterations=500):
+    ids = _sample_ids(conn)
+    results = {}
+    for query, make_params in CASES:
+        params = make_params(ids)
+        count, plain = measure(conn, _plain, query, params, iterations)
+        _, prepared = measure(conn, _prepared, query, params, iterations)
+        results[query.name] = {'rows': count, 'dict': plain, 'prepared': prepared}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prepared repository queries against dictionary cursors")
+    parser.add_argument('--sqlite', metavar='PATH', help="Use a local SQLite database (see bench.seed)")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--label', help="Free-form label stored with the results")
+    parser.add_argument('--out', metavar='FILE', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+    else:
+        from app import pool
+
+    with pool.connection() as conn:
+        queries = run(conn, iterations=args.iterations)
+    report = {
+        'config': {
+            'label': args.label,
+            'database': f'sqlite:{args.sqlite}' if args.sqlite else 'mysql',
+            'iterations': args.iterations,
+        },
+        'commit': git_commit(),
+        'queries': queries,
+        'statements': repository.stats(),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote {args.out}: {len(queries)} queries", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Small in-process caches shared by app.py and admin_panel.py."""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import has_request_context
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Never moves a stamp backwards, whatever the clock of the host bumping it says
+BUMP_VERSION = """
+    UPDATE cache_versions
+    SET version = CASE WHEN version < %s THEN %s ELSE version + 1 END
+    WHERE name = %s
+"""
+
+
+class VersionStamps:
+    """Named version counters shared by every process and host on one database.
+
+    The customer app and the admin panel run as separate processes, often
+    on several hosts, so a write in one has to be able to invalidate caches
+    held by the others.  Each stamp is a row of ``cache_versions`` (see
+    migrations.py); bumping it updates the row and readers fold the current
+    value into their cache keys.  A value read from the database is reused
+    for ``max_age`` seconds, so other processes see a bump within that long
+    (this process sees its own straight away).
+
+    Inside a request the stamps are read on the request's own connection
+    (a replica when it reads from one), elsewhere on ``pool``, which
+    ``factory.create_app`` sets.  Without either they are only counted in
+    this process.  Stamps are nanosecond timestamps that only grow, even
+    across hosts whose clocks disagree.
+    """
+
+    def __init__(self, pool=None, max_age=1.0):
+        self.pool = pool
+        self.max_age = max_age
+        self._known = {}  # key -> (monotonic time read, version)
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.errors = 0
+
+    @contextmanager
+    def _connection(self, readonly):
+        if has_request_context():
+            # Never a second checkout per request: with the pool exhausted it would wait on itself
+            yield db.get_db(readonly)
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+
+    def _local_only(self):
+        return self.pool is None and not has_request_context()
+
+    def _read(self, conn, key):
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("SELECT version FROM cache_versions WHERE name = %s", (key,))
+        row = cursor.fetchone()
+        return row['version'] if row else 0
+
+    def current(self, key):
+        with self._lock:
+            known = self._known.get(key)
+        if known is not None and time.monotonic() - known[0] < self.max_age:
+            return known[1]
+        if self._local_only():
+            return known[1] if known else 0
+        try:
+            with self._connection(readonly=True) as conn:
+                version = self._read(conn, key)
+        except Exception:
+            # Keep serving on the last value we saw; caches still expire on their own TTL
+            logger.warning("Reading cache version %s failed", key, exc_info=True)
+            with self._lock:
+                self.errors += 1
+            return known[1] if known else 0
+        with self._lock:
+            self.reads += 1
+            self._known[key] = (time.monotonic(), version)
+        return version
+
+    def bump(self, key):
+        now = time.time_ns()
+        if self._local_only():
+            with self._lock:
+                known = self._known.get(key)
+                version = max(now, known[1] + 1 if known else 0)
+                self._known[key] = (time.monotonic(), version)
+            return version
+        try:
+            with self._connection(readonly=False) as conn:
+                cursor = conn.cursor()
+                cursor.execute(BUMP_VERSION, (now, now, key))
+                if not cursor.rowcount:
+                    try:
+                        cursor.execute("INSERT INTO cache_versions (name, version) VALUES (%s, %s)", (key, now))
+                    except Exception:
+                        # Another process created the stamp first
+                        cursor.execute(BUMP_VERSION, (now, now, key))
+                conn.commit()
+                version = self._read(conn, key)
+        except Exception:
+            # The write itself has committed; its pages go stale until their TTL instead
+            logger.warning("Bumping cache version %s failed", key, exc_info=True)
+            with self._lock:
+                self.errors += 1
+                self._known.pop(key, None)
+            return None
+        with self._lock:
+            self._known[key] = (time.monotonic(), version)
+        return version
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._known), 'reads': self.reads, 'errors': self.errors, 'max_age': self.max_age}
+
+
+versions = VersionStamps(max_age=float(os.environ.get('CACHE_VERSION_MAX_AGE', 1)))
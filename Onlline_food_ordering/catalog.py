@@ -0,0 +1,41 @@
+"""Keyset-paginated, cached product catalog for the buyer dashboard."""
+import repository
+from cache import TTLCache, versions
+
+DEFAULT_PAGE_SIZE = 48
+MAX_PAGE_SIZE = 200
+
+
+def invalidate_catalog():
+    # Bumping the shared stamp changes every cache key, in every process
+    versions.bump('catalog')
+
+
+class CatalogService:
+
+    def __init__(self, ttl=30, maxsize=256):
+        self.cache = TTLCache(ttl, maxsize=maxsize)
+
+    def page(self, after=0, limit=DEFAULT_PAGE_SIZE):
+        """Return ``(products, next_after)`` for the page following product id ``after``."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        key = (versions.current('catalog'), after, limit)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Fetch one extra row to know whether another page exists
+        rows = repository.fetch_all(repository.PRODUCTS_AFTER, (after, limit + 1))
+        products = rows[:limit]
+        next_after = products[-1]['id'] if len(rows) > limit else None
+
+        result = (products, next_after)
+        self.cache.set(key, result)
+        return result
+
+    def invalidate(self):
+        invalidate_catalog()
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,102 @@
+"""Session cart and single-transaction checkout.
+
+A checkout writes one ``checkouts`` header row and all of its line items
+into ``orders`` with a single batched insert.  Each line item is still an
+ordinary order row (with its own status, since a cart can span several
+sellers); ``orders.checkout_id`` ties the lines back to their header.
+Orders placed one product at a time keep ``checkout_id`` NULL.
+"""
+from decimal import Decimal
+
+import rollup
+import stats
+
+MAX_CART_ITEMS = 50
+
+# What add_to_cart did; a cart holds each product once (one order row per line item)
+ADDED = 'added'
+ALREADY_IN_CART = 'already in cart'
+CART_FULL = 'cart full'
+
+
+# ---------------- CART ----------------
+def get_cart(session):
+    return list(session.get('cart', []))
+
+
+def add_to_cart(session, product_id):
+    cart = get_cart(session)
+    if product_id in cart:
+        return ALREADY_IN_CART
+    if len(cart) >= MAX_CART_ITEMS:
+        return CART_FULL
+    cart.append(product_id)
+    session['cart'] = cart
+    return ADDED
+
+
+def remove_from_cart(session, product_id):
+    session['cart'] = [pid for pid in get_cart(session) if pid != product_id]
+
+
+def clear_cart(session):
+    session.pop('cart', None)
+
+
+def load_products(cursor, product_ids):
+    if not product_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(f"""
+        SELECT products.id, products.name, products.price, products.seller_id, sellers.name AS seller_name
+        FROM products
+        JOIN sellers ON products.seller_id = sellers.id
+        WHERE products.id IN ({placeholders})
+    """, tuple(product_ids))
+    by_id = {row['id']: row for row in cursor.fetchall()}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
+
+# ---------------- CHECKOUT ----------------
+def place_checkout(cursor, buyer_id, products, address, mobile, payment_method):
+    """Write the header and every line item; the caller commits."""
+    total = sum(Decimal(str(p['price'])) for p in products)
+    cursor.execute("""
+        INSERT INTO checkouts (buyer_id, address, mobile, payment_method, item_count, total)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (buyer_id, address, mobile, payment_method, len(products), total))
+    checkout_id = cursor.lastrowid
+
+    cursor.executemany("""
+        INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method, checkout_id)
+        VALUES (%s, %s, 'Placed', %s, %s, %s, %s)
+    """, [(buyer_id, p['id'], address, mobile, payment_method, checkout_id) for p in products])
+
+    for p in products:
+        rollup.record_order(cursor, p['id'], p['price'])
+    stats.adjust(cursor, 'total_orders', len(products))
+    return checkout_id
+
+
+def group_orders(rows):
+    """Group order rows into one entry per checkout (single orders stand alone), keeping row order."""
+    groups = {}
+    for row in rows:
+        checkout_id = row.get('checkout_id')
+        key = ('checkout', checkout_id) if checkout_id else ('order', row['id'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'checkout_id': checkout_id,
+                'order_id': row['id'],
+                'created_at': row.get('created_at'),
+                'buyer_name': row.get('buyer_name'),
+                'address': row['address'],
+                'mobile': row['mobile'],
+                'payment_method': row['payment_method'],
+                'items': [],
+                'total': Decimal('0'),
+            }
+        group['items'].append(row)
+        group['total'] += Decimal(str(row.get('price') or 0))
+    return list(groups.values())
@@ -0,0 +1,50 @@
+"""Settings from the environment, with an optional ``.env`` file for local runs.
+
+``.env`` is read from this directory, then from the working directory;
+variables already set in the environment win.  See ``.env.example``.
+Import this module before anything that reads ``os.environ`` at import
+time.  Nothing here connects to anything: pools open their first
+connection when it is first needed.
+
+Database settings, ``ADMIN_DB_*`` overriding ``DB_*`` for the admin panel:
+
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+    DB_SSL=1             verify the server against DB_SSL_CA
+    DB_SSL_CA            CA bundle (default: the bundled isrgrootx1.pem)
+    DB_CONNECT_TIMEOUT   seconds to wait for a new connection (default 5)
+"""
+import os
+
+from dotenv import find_dotenv, load_dotenv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_CA = os.path.join(HERE, 'isrgrootx1.pem')
+
+load_dotenv(os.path.join(HERE, '.env'))
+load_dotenv(find_dotenv(usecwd=True))
+
+
+def flag(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def database(prefix=''):
+    """mysql.connector arguments from ``{prefix}DB_*``, falling back to ``DB_*``."""
+    def get(name, default=None):
+        return os.environ.get(prefix + name, os.environ.get(name, default))
+
+    settings = dict(
+        host=get('DB_HOST', 'localhost'),
+        port=int(get('DB_PORT', 3306)),
+        user=get('DB_USER', 'root'),
+        password=get('DB_PASSWORD', ''),
+        database=get('DB_NAME', 'shop_db'),
+        connection_timeout=int(get('DB_CONNECT_TIMEOUT', 5)),
+    )
+    if get('DB_SSL_CA') or flag(get('DB_SSL')):
+        settings['ssl_ca'] = get('DB_SSL_CA') or BUNDLED_CA
+    return settings
+
+
+def secret_key(name, default):
+    return os.environ.get(name) or default
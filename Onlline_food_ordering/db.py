@@ -0,0 +1,484 @@
+"""Pooled database access shared by app.py and admin_panel.py.
+
+Each request checks a connection out of the pool the first time it touches
+the database and hands it back when the Flask app context is torn down, so
+concurrent requests never share a socket or a result set.
+
+Reads that can tolerate replication lag ask for ``get_cursor(readonly=True)``
+and go to a read replica when any are configured.  A request that commits
+on the primary stamps the user's session, and that user's reads stay on the
+primary for ``pin_seconds`` afterwards, so they always see their own writes.
+"""
+import itertools
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import partial
+
+from flask import current_app, g, has_request_context, session
+
+logger = logging.getLogger(__name__)
+
+# Session key holding the time of the user's last committed write
+WROTE_AT = '_db_wrote_at'
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Callables run as hook(statement, seconds) after every execute()/executemany();
+# the metrics module uses this to count and time queries per request.
+query_hooks = []
+
+# Prepared statements kept open per connection (see repository.py)
+STATEMENT_CACHE_SIZE = 64
+
+
+class TimedCursor:
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def _timed(self, method, operation, params):
+        started = time.perf_counter()
+        try:
+            return method(operation, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            for hook in query_hooks:
+                hook(operation, elapsed)
+
+    def execute(self, operation, params=()):
+        return self._timed(self._raw.execute, operation, params)
+
+    def executemany(self, operation, seq_of_params):
+        return self._timed(self._raw.executemany, operation, seq_of_params)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def _close_quietly(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+class PooledConnection:
+    """Thin wrapper that remembers when a raw connection was last used."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.committed = False
+        self.statements = OrderedDict()  # key -> prepared cursor, least recently used first
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.raw.cursor(*args, **kwargs)
+        return TimedCursor(cursor) if query_hooks else cursor
+
+    def prepared(self, key):
+        """Return ``(cursor, reused)``: the prepared-statement cursor kept under ``key``.
+
+        A prepared cursor re-executing the statement it last ran (the same
+        string object) only sends the new parameters; the server parsed it
+        the first time.
+        """
+        cursor = self.statements.pop(key, None)
+        reused = cursor is not None
+        if not reused:
+            cursor = self.raw.cursor(prepared=True)
+            if len(self.statements) >= STATEMENT_CACHE_SIZE:
+                _, oldest = self.statements.popitem(last=False)
+                _close_quietly(oldest)
+        self.statements[key] = cursor
+        return (TimedCursor(cursor) if query_hooks else cursor), reused
+
+    def forget_statements(self):
+        while self.statements:
+            _, cursor = self.statements.popitem(last=False)
+            _close_quietly(cursor)
+
+    def commit(self):
+        self.raw.commit()
+        self.committed = True
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+
+    Connections are opened lazily, up to ``size`` at a time.  A connection
+    that sat idle for longer than ``ping_after`` seconds is pinged before it
+    is handed out and transparently replaced if the server dropped it.
+    """
+
+    def __init__(self, connect, size=5, timeout=10.0, ping_after=30.0, dialect='mysql'):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.dialect = dialect
+        # LIFO keeps the most recently used (and therefore warm) connections in rotation
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.opened = 0
+        self.checkouts = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _open(self):
+        conn = PooledConnection(self._connect())
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _healthy(self, conn):
+        session = getattr(conn.raw, 'connection_id', None)
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+        except Exception:
+            return False
+        if getattr(conn.raw, 'connection_id', None) != session:
+            # Reconnected: the new session has none of the old prepared statements
+            conn.forget_statements()
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        waited = time.perf_counter() - started
+
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            else:
+                if time.monotonic() - conn.last_used > self.ping_after and not self._healthy(conn):
+                    self._discard(conn)
+                    conn = self._open()
+                    with self._lock:
+                        self.reconnects += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # Never hand an open transaction to the next request
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._discard(conn)
+        else:
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        # For work outside a request (CLI commands, background threads)
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def warm(self, count):
+        """Open up to ``count`` connections now rather than on first use."""
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def after_fork(self):
+        # In a forked child: forget the parent's connections without closing the sockets it still uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'opened': self.opened,
+                'checkouts': self.checkouts,
+                'reconnects': self.reconnects,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+# ---------------- READ REPLICAS ----------------
+def parse_hosts(value):
+    """``'db2:3307, db3'`` -> ``[{'host': 'db2', 'port': 3307}, {'host': 'db3'}]``"""
+    hosts = []
+    for spec in value.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        host, _, port = spec.partition(':')
+        hosts.append({'host': host, 'port': int(port)} if port else {'host': host})
+    return hosts
+
+
+class ReadRouter:
+    """Spreads read-only work over replica pools, round robin."""
+
+    def __init__(self, replicas, pin_seconds=5.0):
+        self.replicas = list(replicas)
+        self.pin_seconds = pin_seconds
+        self._turn = itertools.count()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.fallbacks = 0
+
+    def pick(self):
+        return self.replicas[next(self._turn) % len(self.replicas)]
+
+    def stats(self):
+        return {
+            'replicas': len(self.replicas),
+            'pin_seconds': self.pin_seconds,
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'pinned_reads': self.pinned_reads,
+            'fallbacks': self.fallbacks,
+        }
+
+
+# ---------------- FLASK INTEGRATION ----------------
+def init_app(app, pool, replicas=(), pin_seconds=5.0):
+    app.extensions['db_pool'] = pool
+    app.extensions['db_router'] = ReadRouter(replicas, pin_seconds)
+    app.after_request(_remember_write)
+    app.teardown_appcontext(_release_connection)
+
+
+def get_pool():
+    return current_app.extensions['db_pool']
+
+
+def get_router():
+    return current_app.extensions['db_router']
+
+
+def use_primary():
+    """Send the rest of this request's reads to the primary, e.g. before caching what they return."""
+    g.db_use_primary = True
+
+
+def _pinned(router):
+    if g.get('db_use_primary'):
+        return True
+    if has_request_context() and session.get(WROTE_AT, 0) > time.time() - router.pin_seconds:
+        return True
+    return False
+
+
+def _replica():
+    # Once a request holds the primary it keeps reading there: it may have written already
+    if 'db_conn' in g:
+        return None
+    if 'db_replica' in g:
+        return g.db_replica[1]
+
+    router = get_router()
+    if not router.replicas:
+        return None
+    if _pinned(router):
+        router.pinned_reads += 1
+        return None
+    pool = router.pick()
+    try:
+        conn = pool.acquire()
+    except Exception:
+        logger.warning("Read replica unavailable, reading from the primary", exc_info=True)
+        router.fallbacks += 1
+        return None
+    router.replica_reads += 1
+    g.db_replica = (pool, conn)
+    return conn
+
+
+def get_db(readonly=False):
+    if readonly:
+        conn = _replica()
+        if conn is not None:
+            return conn
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().acquire()
+        g.db_conn.committed = False
+        if readonly:
+            get_router().primary_reads += 1
+    return g.db_conn
+
+
+def get_cursor(dictionary=True, buffered=True, readonly=False):
+    # Buffered so an unread result set can never leak into the next request
+    return get_db(readonly).cursor(dictionary=dictionary, buffered=buffered)
+
+
+def _remember_write(response):
+    conn = g.get('db_conn')
+    if conn is not None and conn.committed and get_router().replicas:
+        session[WROTE_AT] = time.time()
+    return response
+
+
+def _release_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().release(conn)
+    replica = g.pop('db_replica', None)
+    if replica is not None:
+        replica[0].release(replica[1])
+
+
+# ---------------- SQLITE STAND-IN ----------------
+# Lets both apps (and their tests) run against a local SQLite file using the
+# same ``%s`` placeholders and dictionary rows as mysql-connector.
+_PLACEHOLDER = re.compile(r'%s')
+# SQLite has no row locks (writers are serialized anyway), so FOR UPDATE is dropped
+_FOR_UPDATE = re.compile(r'\s+FOR UPDATE\s*$', re.IGNORECASE)
+sqlite3.register_adapter(Decimal, float)
+
+
+class SQLiteCursor:
+
+    def __init__(self, raw, dictionary=False):
+        self._raw = raw
+        self._dictionary = dictionary
+
+    @property
+    def column_names(self):
+        return tuple(col[0] for col in self._raw.description or ())
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((col[0] for col in self._raw.description), row))
+
+    def execute(self, operation, params=()):
+        self._raw.execute(_PLACEHOLDER.sub('?', _FOR_UPDATE.sub('', operation)), tuple(params or ()))
+
+    def executemany(self, operation, seq_of_params):
+        self._raw.executemany(_PLACEHOLDER.sub('?', operation), [tuple(p) for p in seq_of_params])
+
+    def fetchone(self):
+        return self._row(self._raw.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._raw.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._raw.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._raw)
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    def close(self):
+        self._raw.close()
+
+
+class SQLiteConnection:
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+
+    def cursor(self, dictionary=False, buffered=True, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._conn.execute('SELECT 1')
+
+    def close(self):
+        self._conn.close()
+
+
+def sqlite_connect(path):
+    # A partial rather than a lambda so it pickles (job processes open their own connections)
+    return partial(SQLiteConnection, path)
@@ -0,0 +1,358 @@
+"""Live order events for dashboards, over Server-Sent Events.
+
+Each process keeps its most recent order events in a bounded ring buffer
+(``OrderFeed``).  One background thread per process tails the ``orders``
+and ``order_status_events`` tables by primary key, so a new order or a
+status change shows up however it was written (this worker, another
+worker or the admin panel, the order queue, a cart checkout);
+``poll_now()`` wakes the thread straight after a local write.  Status
+changes are recorded with ``record_status`` in the transaction that
+makes them (see ``rollup.change_order_status``).
+
+Every open stream reads from the buffer, so the database sees two small
+queries per ``ORDER_FEED_INTERVAL`` however many dashboards are connected.
+Each stream does hold a server thread, so at most ``max_streams`` are
+open per process; past that ``stream()`` raises ``StreamsFull`` and the
+route sends an empty stream with a long ``retry:`` (a non-200 answer
+would make the browser give up for good), leaving threads for pages.
+
+An event's id is its position in the two tables, ``<order id>-<status
+event id>``, the same in every process.  A client reconnecting with
+``Last-Event-ID``, to this worker or another, is sent what it missed from
+the buffer, or read back from the database when it is older than the
+buffer, and a ``reset`` event when even that would be too much.  An order
+committed after a higher id was already announced is still sent live,
+but is not replayed to a client that resumes past it.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime
+from decimal import Decimal
+
+import repository
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 1000
+RECENT_ORDERS = 50
+TAIL_BATCH = 200
+# Ids allocated by transactions that had not committed at the last poll are picked up on the next
+LOOKBACK_IDS = 100
+HEARTBEAT_SECONDS = 15
+# Streams end after this long; browsers reconnect with Last-Event-ID and the worker thread is freed
+STREAM_SECONDS = 300
+RETRY_MS = 3000
+# How long a client turned away by the stream cap should wait before trying again
+BUSY_RETRY_MS = 30000
+# Status events kept in the table once every feed has read them; older ones are pruned now and then
+KEEP_STATUS_EVENTS = 10000
+PRUNE_EVERY = 600
+
+
+class StreamsFull(Exception):
+    pass
+
+
+def event_id(position):
+    return f'{position[0]}-{position[1]}'
+
+
+def parse_event_id(value):
+    """The position in a ``Last-Event-ID`` header, or None if it is missing or not one of ours."""
+    try:
+        order_id, status_id = (int(part) for part in (value or '').split('-'))
+    except ValueError:
+        return None
+    return order_id, status_id
+
+
+def _after(position, cursor):
+    return position[0] > cursor[0] or position[1] > cursor[1]
+
+
+def record_status(cursor, order_id, status, seller_id, buyer_id):
+    """Record a status change for the feeds to pick up; call it in the transaction that makes it."""
+    cursor.execute("""
+        INSERT INTO order_status_events (order_id, status, seller_id, buyer_id)
+        VALUES (%s, %s, %s, %s)
+    """, (order_id, status, seller_id, buyer_id))
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _status_payload(event):
+    return {'id': event['order_id'], 'status': event['status'],
+            'seller_id': event['seller_id'], 'buyer_id': event['buyer_id']}
+
+
+def _message(position, kind, payload):
+    return f'id: {event_id(position)}\nevent: {kind}\ndata: {payload}\n\n'
+
+
+def _resume(first, messages):
+    try:
+        yield first
+        yield from messages
+    finally:
+        messages.close()
+
+
+class OrderFeed:
+
+    def __init__(self, pool, size=DEFAULT_BUFFER_SIZE, interval=1.0, max_streams=None):
+        self.pool = pool
+        self.interval = interval
+        self.max_streams = max_streams  # None: no cap
+        self._events = deque(maxlen=size)  # (position, kind, seller id, JSON payload)
+        self._recent = OrderedDict()        # order id -> row, oldest first
+        self._position = None               # (order id, status event id) of the latest event
+        self._floor = None                  # position before the oldest buffered event
+        self._last_order_id = None
+        self._seen = set()                  # order ids announced within the lookback window
+        self._last_status_id = None
+        self._seen_status = set()           # status event ids announced within the lookback window
+        self._cond = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.published = 0
+        self.open_streams = 0
+        self.rejected_streams = 0
+
+    # ---------------- PUBLISHING ----------------
+    def _publish(self, kind, data, seller_id, order_id=0, status_id=0):
+        # Caller holds self._cond
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0][0]
+        self._position = (max(self._position[0], order_id), max(self._position[1], status_id))
+        self._events.append((self._position, kind, seller_id, json.dumps(data)))
+        self.published += 1
+        self._cond.notify_all()
+
+    def _remember(self, row):
+        self._recent[row['id']] = row
+        self._recent.move_to_end(row['id'])
+        while len(self._recent) > RECENT_ORDERS:
+            self._recent.popitem(last=False)
+
+    def _order_added(self, row):
+        # Caller holds self._cond
+        self._remember(row)
+        self._publish('order', row, row['seller_id'], order_id=row['id'])
+
+    def _status_changed(self, event):
+        # Caller holds self._cond
+        row = self._recent.get(event['order_id'])
+        if row is not None:
+            row['status'] = event['status']
+        self._publish('status', _status_payload(event), event['seller_id'], status_id=event['id'])
+
+    # ---------------- TAILING ----------------
+    def _tail(self, conn, query, last_id, seen, announce):
+        """Announce rows of ``query`` after ``last_id``; returns the new last id and prunes ``seen``."""
+        while True:
+            rows = repository.fetch_all(query, (last_id - LOOKBACK_IDS, TAIL_BATCH + LOOKBACK_IDS), conn=conn)
+            with self._cond:
+                for row in rows:
+                    if row['id'] in seen:
+                        continue
+                    seen.add(row['id'])
+                    announce({k: _json_value(v) for k, v in row.items()})
+                if rows:
+                    last_id = max(last_id, rows[-1]['id'])
+                floor = last_id - LOOKBACK_IDS
+                seen.difference_update([seen_id for seen_id in seen if seen_id <= floor])
+            if len(rows) < TAIL_BATCH + LOOKBACK_IDS:
+                return last_id
+
+    def _prune(self, conn):
+        # Any feed may prune: the kept events are far more than one lookback window
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM order_status_events WHERE id < %s", (self._last_status_id - KEEP_STATUS_EVENTS,))
+        conn.commit()
+
+    def poll(self):
+        """Read orders and status changes added since the last poll into the buffer."""
+        with self._poll_lock:
+            with self.pool.connection() as conn:
+                if self._last_order_id is None:
+                    # First poll: remember the latest orders and status events without announcing them
+                    rows = repository.fetch_all(repository.RECENT_ORDERS, (RECENT_ORDERS,), conn=conn)
+                    rows = [{k: _json_value(v) for k, v in row.items()} for row in reversed(rows)]
+                    events = repository.fetch_all(repository.RECENT_STATUS_EVENTS, (LOOKBACK_IDS,), conn=conn)
+                    with self._cond:
+                        for row in rows:
+                            self._remember(row)
+                        self._seen = {row['id'] for row in rows}
+                        self._last_order_id = rows[-1]['id'] if rows else 0
+                        self._seen_status = {event['id'] for event in events}
+                        self._last_status_id = events[0]['id'] if events else 0
+                        self._position = self._floor = (self._last_order_id, self._last_status_id)
+                        self.polls += 1
+                    return
+
+                last_order_id = self._tail(conn, repository.ORDERS_AFTER, self._last_order_id,
+                                           self._seen, self._order_added)
+                last_status_id = self._tail(conn, repository.STATUS_EVENTS_AFTER, self._last_status_id,
+                                            self._seen_status, self._status_changed)
+                with self._cond:
+                    self._last_order_id = last_order_id
+                    self._last_status_id = last_status_id
+                    self.polls += 1
+                    prune = self.polls % PRUNE_EVERY == 0 and self._last_status_id > KEEP_STATUS_EVENTS
+                if prune:
+                    self._prune(conn)
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Order feed poll failed")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Tail the orders table every ``interval`` seconds in the background."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='order-feed', daemon=True)
+            self._thread.start()
+
+    def poll_now(self):
+        # After a local write, so its own dashboards see it without waiting a full interval
+        self._wakeup.set()
+
+    # ---------------- READING ----------------
+    def recent(self, limit=10):
+        """The latest ``limit`` orders, newest first, with their current status."""
+        if self._last_order_id is None:
+            self.poll()
+        self.start()
+        with self._cond:
+            return [dict(row) for row in reversed(list(self._recent.values())[-limit:])]
+
+    def stream(self, last_event_id=None, seller_id=None, heartbeat=HEARTBEAT_SECONDS, max_seconds=STREAM_SECONDS):
+        """SSE messages for events after ``last_event_id`` (all orders, or one seller's).
+
+        ``last_event_id`` is the ``Last-Event-ID`` header as sent; None or an
+        id this feed did not issue starts from the latest event.
+
+        Raises ``StreamsFull`` when ``max_streams`` streams are already open
+        in this process.
+        """
+        with self._cond:
+            if self.max_streams is not None and self.open_streams >= self.max_streams:
+                self.rejected_streams += 1
+                raise StreamsFull(f"{self.open_streams} order streams are already open")
+            self.open_streams += 1
+        messages = self._stream(last_event_id, seller_id, heartbeat, max_seconds)
+        # Started here, so the slot is given back even if the response is closed before it is read
+        return _resume(next(messages), messages)
+
+    def _catch_up(self, cursor, until, seller_id):
+        """Messages for the events between ``cursor`` and ``until`` read back from the tables, or None if too many."""
+        limit = self._events.maxlen
+        with self.pool.connection() as conn:
+            orders = repository.fetch_all(repository.ORDERS_AFTER, (cursor[0], limit + 1), conn=conn)
+            statuses = repository.fetch_all(repository.STATUS_EVENTS_AFTER, (cursor[1], limit + 1), conn=conn)
+        if len(orders) > limit or len(statuses) > limit:
+            return None
+        # Orders first, then status changes: positions only grow, so a reconnect mid-way resumes correctly
+        messages = []
+        order_id = cursor[0]
+        for row in orders:
+            if row['id'] > until[0]:
+                break
+            order_id = row['id']
+            if seller_id is None or row['seller_id'] == seller_id:
+                payload = json.dumps({k: _json_value(v) for k, v in row.items()})
+                messages.append(_message((order_id, cursor[1]), 'order', payload))
+        for event in statuses:
+            if event['id'] > until[1]:
+                break
+            if seller_id is None or event['seller_id'] == seller_id:
+                messages.append(_message((order_id, event['id']), 'status', json.dumps(_status_payload(event))))
+        return messages
+
+    def _stream(self, last_event_id, seller_id, heartbeat, max_seconds):
+        try:
+            self.start()
+            if self._last_order_id is None:
+                try:
+                    self.poll()
+                except Exception:
+                    # Nothing to resume from yet; the browser comes back after the retry delay
+                    logger.exception("Order feed unavailable")
+                    yield f'retry: {RETRY_MS}\n\n'
+                    return
+            deadline = time.monotonic() + max_seconds
+            resume = parse_event_id(last_event_id)
+            with self._cond:
+                cursor = self._position
+                published = self.published
+            yield f'retry: {RETRY_MS}\n\n'
+            if resume is not None and resume != cursor:
+                # Older than this worker's buffer (or issued by another worker): read it back from the tables
+                with self._cond:
+                    behind = resume[0] < self._floor[0] or resume[1] < self._floor[1]
+                if not behind:
+                    cursor = resume
+                else:
+                    try:
+                        messages = self._catch_up(resume, cursor, seller_id)
+                    except Exception:
+                        logger.exception("Order feed catch-up failed")
+                        messages = None
+                    if messages is None:
+                        yield _message(cursor, 'reset', '{}')
+                    else:
+                        yield from messages
+                # Send what the buffer holds after ``cursor`` straight away
+                published = None
+            while time.monotonic() < deadline:
+                with self._cond:
+                    if published is not None and not self._cond.wait_for(
+                            lambda: self.published > published,
+                            timeout=min(heartbeat, max(0, deadline - time.monotonic()))):
+                        pending = None
+                    elif cursor[0] < self._floor[0] or cursor[1] < self._floor[1]:
+                        pending = [(self._position, 'reset', None, '{}')]
+                    else:
+                        pending = [event for event in self._events if _after(event[0], cursor)
+                                   and (seller_id is None or event[2] == seller_id)]
+                    cursor = self._position
+                    published = self.published
+                if pending is None:
+                    yield ': keepalive\n\n'
+                    continue
+                for position, kind, _, payload in pending:
+                    yield _message(position, kind, payload)
+        finally:
+            with self._cond:
+                self.open_streams -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'buffered': len(self._events),
+                'capacity': self._events.maxlen,
+                'published': self.published,
+                'polls': self.polls,
+                'open_streams': self.open_streams,
+                'max_streams': self.max_streams,
+                'rejected_streams': self.rejected_streams,
+                'last_order_id': self._last_order_id or 0,
+                'last_status_id': self._last_status_id or 0,
+            }
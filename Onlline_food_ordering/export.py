@@ -0,0 +1,100 @@
+"""Streaming order export for the admin panel.
+
+Rows are read with an unbuffered cursor in ``fetchmany`` batches and
+encoded batch by batch, so memory use stays flat however many orders the
+export covers.  Archived orders (see ``archive.py``) are included only
+when asked for.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from archive import order_source
+from db import get_db
+
+BATCH_SIZE = 1000
+
+EXPORT_FIELDS = ('id', 'created_at', 'status', 'buyer_id', 'buyer_name', 'product_id',
+                 'product_name', 'price', 'seller_id', 'seller_name', 'address', 'mobile', 'payment_method')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_orders(since=None, status=None, include_archive=False, batch_size=BATCH_SIZE):
+    """Yield lists of order rows, oldest first; archived orders too with ``include_archive``."""
+    conditions, params = [], []
+    if since:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if status:
+        conditions.append("status = %s")
+        params.append(status)
+    condition = " AND ".join(conditions)
+
+    if include_archive:
+        # Both halves filter on their own indexes, then the union is joined and sorted
+        source, where = order_source(condition), ""
+        params += params
+    else:
+        source, where = "orders", (f"WHERE {condition}" if condition else "")
+    query = f"""
+        SELECT orders.id, orders.created_at, orders.status, orders.buyer_id, buyers.name AS buyer_name,
+               orders.product_id, products.name AS product_name, products.price,
+               products.seller_id, sellers.name AS seller_name,
+               orders.address, orders.mobile, orders.payment_method
+        FROM {source}
+        JOIN products ON orders.product_id = products.id
+        JOIN buyers ON orders.buyer_id = buyers.id
+        JOIN sellers ON products.seller_id = sellers.id
+        {where}
+        ORDER BY orders.id
+    """
+
+    # Unbuffered: rows stay on the server until fetchmany() asks for them
+    cursor = get_db(readonly=True).cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows([_value(row[field]) for field in EXPORT_FIELDS] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(batches):
+    for rows in batches:
+        yield ''.join(json.dumps({field: _value(row[field]) for field in EXPORT_FIELDS}) + '\n' for row in rows)
+
+
+def stream(fmt, since=None, status=None, include_archive=False, batch_size=BATCH_SIZE):
+    batches = iter_orders(since=since, status=status, include_archive=include_archive, batch_size=batch_size)
+    if fmt == 'csv':
+        return stream_csv(batches)
+    return stream_ndjson(batches)
@@ -0,0 +1,141 @@
+"""Builds the Flask apps with the plumbing app.py and admin_panel.py share.
+
+``create_app`` wires up the primary connection pool, optional read
+replicas (``DB_REPLICAS``), request-scoped connections (``db.init_app``),
+the shared cache version stamps (``cache.versions``), metrics with the
+standard collectors, the shared query layer in ``repository.py`` and a
+``/healthz`` readiness check.  Each app then adds
+its own routes and caches.  The pool and metrics are kept in
+``app.extensions`` as ``db_pool`` and ``metrics``.
+
+Building an app never touches the database, so importing it is quick and
+works with the database down.  Per-process work (opening connections,
+starting background threads, priming caches) is registered with
+``on_warm_up`` and run by ``warm_up`` once the process will serve: after
+fork under gunicorn (see ``gunicorn.conf.py``), before ``app.run``
+otherwise.
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import Flask, jsonify
+
+import db
+import repository
+from cache import versions
+from db import ConnectionPool
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Connector:
+    """Opens a MySQL connection; picklable, so job processes (see jobs.py) can use it too."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def __call__(self):
+        # Imported on first connection: the driver is a good share of a cold import
+        import mysql.connector
+        return mysql.connector.connect(**self.settings)
+
+
+def create_app(import_name, db_config, secret_key, metrics_name):
+    app = Flask(import_name)
+    app.secret_key = secret_key
+
+    pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+    pool = ConnectionPool(Connector(db_config), size=pool_size)
+    # Read replicas (same credentials), e.g. DB_REPLICAS=replica1:3306,replica2:3306
+    replicas = [
+        ConnectionPool(Connector(dict(db_config, **host)), size=pool_size)
+        for host in db.parse_hosts(os.environ.get('DB_REPLICAS', ''))
+    ]
+    db.init_app(app, pool, replicas=replicas, pin_seconds=float(os.environ.get('DB_PIN_SECONDS', 5)))
+    # Outside requests (background threads, warm-up) the stamps are read on this pool
+    versions.pool = pool
+
+    metrics = Metrics(metrics_name, slow_ms=float(os.environ.get('SLOW_REQUEST_MS', 500)))
+    metrics.init_app(app)
+    metrics.add_collector('db_pool', pool.stats)
+    metrics.add_collector('db_routing', app.extensions['db_router'].stats)
+    for i, replica in enumerate(replicas):
+        metrics.add_collector(f'db_replica{i}', replica.stats)
+    metrics.add_collector('statements', repository.stats)
+    metrics.add_collector('cache_versions', versions.stats)
+    app.extensions['metrics'] = metrics
+
+    app.extensions['warm_up'] = []
+    app.extensions['boot'] = {'pid': os.getpid(), 'worker_boot_ms': None, 'warm_up_ms': None,
+                              'warmed_up': False, 'warm_up_errors': []}
+
+    @app.route('/healthz')
+    def healthz():
+        # Ready when the primary answers; the boot figures show how long this worker took to get here
+        boot = app.extensions['boot']
+        try:
+            with app.extensions['db_pool'].connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+        except Exception as e:
+            return jsonify(status='unavailable', error=str(e), boot=boot), 503
+        return jsonify(status='ok', boot=boot)
+
+    return app
+
+
+def on_warm_up(app, fn):
+    """Run ``fn()`` (inside an app context) when this process warms up."""
+    app.extensions['warm_up'].append(fn)
+    return fn
+
+
+def _pools(app):
+    return [app.extensions['db_pool']] + app.extensions['db_router'].replicas
+
+
+def _warm_up(app, connections):
+    boot = app.extensions['boot']
+    started = time.perf_counter()
+    errors = []
+    try:
+        app.extensions['db_pool'].warm(connections)
+    except Exception as e:
+        errors.append(f"db_pool: {e}")
+    with app.app_context():
+        for fn in app.extensions['warm_up']:
+            try:
+                fn()
+            except Exception as e:
+                errors.append(f"{getattr(fn, '__qualname__', fn)}: {e}")
+    boot['warm_up_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    boot['warm_up_errors'] = errors
+    boot['warmed_up'] = not errors
+    if errors:
+        # Not fatal: whatever failed connects on first use instead
+        logger.warning("Warm-up of pid %s finished with errors: %s", boot['pid'], '; '.join(errors))
+    else:
+        logger.info("Warm-up of pid %s took %.0f ms", boot['pid'], boot['warm_up_ms'])
+
+
+def warm_up(app, connections=None, after_fork=False):
+    """Open pool connections and run the ``on_warm_up`` hooks in the background.
+
+    The process serves requests straight away; a database that is down
+    shows in ``/healthz`` rather than holding up the boot.  Pass
+    ``after_fork=True`` in a forked worker so it drops anything inherited
+    from the parent first.
+    """
+    if after_fork:
+        for pool in _pools(app):
+            pool.after_fork()
+    app.extensions['boot']['pid'] = os.getpid()
+    if connections is None:
+        connections = int(os.environ.get('DB_WARM_CONNECTIONS', 2))
+    thread = threading.Thread(target=_warm_up, args=(app, connections), name='warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,43 @@
+"""Gunicorn settings for app.py and admin_panel.py (see the Procfile).
+
+The app is imported once in the master (``preload_app``).  That import
+only builds Python objects, since the pools connect on first use, so it
+works with the database down.  Forked workers share the imported code and
+templates, and each one warms up in the background after fork (pool
+connections, search index, order feed, first catalog page; see
+``factory.warm_up``).  A new worker therefore serves almost as soon as it
+is forked, which is what matters when scaling out under load.
+
+Each worker logs how long it took from fork to ready, and ``/healthz``
+reports it as ``boot.worker_boot_ms`` next to ``warm_up_ms``.
+
+    WEB_CONCURRENCY     worker processes (default 2)
+    GUNICORN_THREADS    threads per worker (default 8); order streams hold one each, at most
+                        ORDER_FEED_MAX_STREAMS (default 4) per worker
+    PORT                port to bind (default 8000)
+"""
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 10
+# Server-Sent Event streams reconnect on their own; don't let one idle connection hold a thread forever
+keepalive = 5
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from factory import warm_up
+
+    app = worker.wsgi
+    warm_up(app, after_fork=True)
+    boot_ms = round((time.perf_counter() - worker.forked_at) * 1000, 1)
+    app.extensions['boot']['worker_boot_ms'] = boot_ms
+    worker.log.info("Worker %s ready %.1f ms after fork", worker.pid, boot_ms)
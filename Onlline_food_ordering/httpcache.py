@@ -0,0 +1,85 @@
+"""Conditional GET and rendered-page caching for read-heavy pages.
+
+A page is tagged with the version stamps it depends on (``catalog``,
+``seller-<id>``, ``buyer-<id>``, see ``cache.VersionStamps``) plus the
+request details that change its output.  The ETag is a hash of both, so
+it costs a primary-key read per stamp at most, and usually none:
+
+* a request whose ``If-None-Match`` matches gets a 304 straight away;
+* otherwise the rendered HTML is cached under the same tag, so the next
+  request for that variant skips the database and Jinja too.
+
+Writers call ``touch()`` with the stamps they affect, in whichever
+process or host they run; others see it within ``CACHE_VERSION_MAX_AGE``.
+ETags also roll over every ``ttl`` seconds, so a write that forgets to
+touch a stamp is never served from a 304 or the page cache for longer.
+Pages that never change per request (``home.html``) take the same path
+with no stamps and a public ``max-age``, so browsers revalidate them at
+most that often and a template change is picked up on the next epoch.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import make_response, request
+
+import db
+from cache import TTLCache, versions
+
+CATALOG = 'catalog'
+# Bumped when products or users are deleted: their orders drop out of every order list
+DELETIONS = 'deletions'
+
+
+def seller_key(seller_id):
+    return f'seller-{seller_id}'
+
+
+def buyer_key(buyer_id):
+    return f'buyer-{buyer_id}'
+
+
+def touch(*keys):
+    for key in set(keys):
+        versions.bump(key)
+
+
+class PageCache:
+
+    def __init__(self, ttl=300, maxsize=512):
+        self.cache = TTLCache(ttl, maxsize=maxsize)
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def respond(self, keys, variant, render, cache_control='private, no-cache'):
+        """Return a 304, a cached render or a fresh ``render()`` for the page tagged by ``keys`` and ``variant``."""
+        stamps = [versions.current(key) for key in keys]
+        # Bounds how long a validator stays good even if no stamp moves
+        epoch = int(time.time() // self.cache.ttl)
+        etag = hashlib.sha1(repr((keys, stamps, variant, epoch)).encode()).hexdigest()[:24]
+
+        if request.if_none_match.contains_weak(etag):
+            with self._lock:
+                self.not_modified += 1
+            response = make_response('', 304)
+        else:
+            html = self.cache.get(etag)
+            if html is None:
+                if time.time_ns() - max(stamps, default=0) < db.get_router().pin_seconds * 1e9:
+                    # Changed moments ago: a replica may not have it yet, and we are about to cache the result
+                    db.use_primary()
+                html = render()
+                self.cache.set(etag, html)
+            response = make_response(html)
+
+        response.set_etag(etag, weak=True)
+        if any(stamps):
+            # Informational only: freshness is decided on the ETag, which also covers the variant
+            response.last_modified = datetime.fromtimestamp(max(stamps) / 1e9, tz=timezone.utc)
+        # By default per-user pages: browsers may keep them but must revalidate every time
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    def stats(self):
+        return dict(self.cache.stats(), not_modified=self.not_modified)
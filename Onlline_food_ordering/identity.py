@@ -0,0 +1,63 @@
+"""Cached seller and buyer profile rows.
+
+Dashboards and logins look the same few users up over and over, so rows
+are kept in a bounded LRU (see ``cache.TTLCache``) keyed by id and by
+username.  Entries expire after ``IDENTITY_CACHE_TTL`` seconds and every
+key includes the shared ``identities`` version stamp, which
+``invalidate_identities()`` bumps when a user is deleted or a profile
+changes, in either process.  Lookups that find nothing are not cached, so
+a user who has just registered can log in straight away.
+"""
+import hmac
+
+import repository
+from cache import TTLCache, versions
+
+IDENTITIES = 'identities'
+
+_QUERIES = {
+    ('seller', 'id'): repository.SELLER_BY_ID,
+    ('seller', 'username'): repository.SELLER_BY_USERNAME,
+    ('buyer', 'id'): repository.BUYER_BY_ID,
+    ('buyer', 'username'): repository.BUYER_BY_USERNAME,
+}
+
+
+def invalidate_identities():
+    versions.bump(IDENTITIES)
+
+
+class IdentityCache:
+
+    def __init__(self, ttl=60, maxsize=4096):
+        self.cache = TTLCache(ttl, maxsize=maxsize)
+
+    def _lookup(self, kind, field, value):
+        version = versions.current(IDENTITIES)
+        key = (version, kind, field, value)
+        row = self.cache.get(key)
+        if row is not None:
+            return row
+
+        row = repository.fetch_one(_QUERIES[kind, field], (value,))
+        if row is not None:
+            # Cache under both keys so a login warms the dashboard and vice versa
+            self.cache.set((version, kind, 'id', row['id']), row)
+            self.cache.set((version, kind, 'username', row['username']), row)
+        return row
+
+    def seller(self, seller_id):
+        return self._lookup('seller', 'id', seller_id)
+
+    def buyer(self, buyer_id):
+        return self._lookup('buyer', 'id', buyer_id)
+
+    def authenticate(self, kind, username, password):
+        """Return the ``kind`` user with these credentials, or None."""
+        row = self._lookup(kind, 'username', username)
+        if row is None or not hmac.compare_digest(str(row['password']).encode(), password.encode()):
+            return None
+        return row
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,178 @@
+"""Bulk product import for sellers.
+
+Uploaded rows are validated one at a time as they are read and inserted
+with ``executemany`` in fixed-size batches, one transaction per batch, so a
+10k-item menu costs a few dozen round trips instead of ten thousand.
+
+CSV and NDJSON (one JSON product per line) uploads are read as a stream,
+so their size doesn't matter.  A JSON document has to be parsed whole, so
+it is limited to ``MAX_JSON_BYTES``; larger menus should be sent as NDJSON.
+A file that turns out to be malformed partway through stops the import at
+that row; the batches before it stay committed and the report says so.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+MAX_NAME_LENGTH = 255
+MAX_PRICE = Decimal('99999999.99')  # DECIMAL(10,2)
+# Only the first errors are reported in full; the rest are just counted
+MAX_REPORTED_ERRORS = 500
+MAX_JSON_BYTES = 8 * 1024 * 1024
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+class ImportFormatError(Exception):
+
+    def __init__(self, message, row=None):
+        super().__init__(message if row is None else f"Row {row}: {message}")
+        self.row = row
+
+
+def _lines(stream):
+    # Decoded line by line, so a bad byte is reported on its own line
+    for number, line in enumerate(stream, start=1):
+        try:
+            line = line.decode('utf-8-sig' if number == 1 else 'utf-8')
+        except UnicodeDecodeError as e:
+            raise ImportFormatError(f"not UTF-8: {e}", row=number)
+        yield line
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(_lines(stream))
+    try:
+        if not reader.fieldnames or 'name' not in reader.fieldnames or 'price' not in reader.fieldnames:
+            raise ImportFormatError("CSV needs a header row with 'name' and 'price' columns")
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        raise ImportFormatError(f"malformed CSV: {e}", row=reader.line_num + 1)
+
+
+def _read_json(stream):
+    data = stream.read(MAX_JSON_BYTES + 1)
+    if len(data) > MAX_JSON_BYTES:
+        raise ImportFormatError(f"JSON uploads are limited to {MAX_JSON_BYTES // (1024 * 1024)} MB; "
+                                "send larger menus as NDJSON, one product per line")
+    try:
+        data = json.loads(data)
+    except ValueError as e:  # UnicodeDecodeError included
+        raise ImportFormatError(f"Invalid JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get('products')
+    if not isinstance(data, list):
+        raise ImportFormatError("JSON must be a list of products or {\"products\": [...]}")
+    yield from enumerate(data, start=1)
+
+
+def _read_ndjson(stream):
+    for number, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f"invalid JSON: {e}", row=number)
+        yield number, row
+
+
+def read_rows(stream, fmt):
+    """Yield ``(row_number, row_dict)`` pairs from a CSV, JSON or NDJSON upload.
+
+    Raises ``ImportFormatError`` (with the row it stopped at, when there is
+    one) as soon as the upload turns out to be malformed.
+    """
+    if fmt == 'csv':
+        return _read_csv(stream)
+    if fmt == 'json':
+        return _read_json(stream)
+    if fmt == 'ndjson':
+        return _read_ndjson(stream)
+    raise ImportFormatError(f"Unsupported format '{fmt}', use csv, json or ndjson")
+
+
+def validate(row):
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object with 'name' and 'price'")
+
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f"name is longer than {MAX_NAME_LENGTH} characters")
+
+    try:
+        price = Decimal(str(row.get('price')).strip())
+    except InvalidOperation:
+        raise ValueError(f"price '{row.get('price')}' is not a number")
+    if not price.is_finite() or price <= 0 or price > MAX_PRICE:
+        raise ValueError(f"price must be between 0.01 and {MAX_PRICE}")
+
+    return name, price.quantize(Decimal('0.01'))
+
+
+def import_products(conn, seller_id, rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Insert validated ``rows`` for ``seller_id`` and return a report dict.
+
+    ``on_batch(cursor, inserted_rows)`` runs inside each batch's transaction,
+    letting callers keep counters and caches in step with the insert.
+
+    If reading ``rows`` raises ``ImportFormatError``, the rows already read
+    are still inserted and the report gets ``error`` and ``stopped_at_row``.
+    Either way ``committed_through_row`` is the last row of the last batch
+    committed: every row up to it was inserted unless listed in ``errors``.
+    """
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    report = {'received': 0, 'inserted': 0, 'rejected': 0, 'batches': 0, 'errors': [],
+              'committed_through_row': None}
+
+    def reject(number, message):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+
+    def flush(batch):
+        try:
+            cursor.executemany("INSERT INTO products (name, price, seller_id) VALUES (%s, %s, %s)",
+                               [(name, price, seller_id) for _, name, price in batch])
+            if on_batch:
+                on_batch(cursor, batch)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for number, _, _ in batch:
+                reject(number, f"database error: {e}")
+            return
+        report['inserted'] += len(batch)
+        report['batches'] += 1
+        report['committed_through_row'] = batch[-1][0]
+
+    batch = []
+    try:
+        for number, row in rows:
+            report['received'] += 1
+            try:
+                name, price = validate(row)
+            except ValueError as e:
+                reject(number, str(e))
+                continue
+            batch.append((number, name, price))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except ImportFormatError as e:
+        report['error'] = str(e)
+        report['stopped_at_row'] = e.row
+    if batch:
+        flush(batch)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_sec'] = round(report['inserted'] / elapsed, 1) if elapsed else 0.0
+    return report
@@ -0,0 +1,347 @@
+"""Write-behind order ingestion.
+
+With ``ORDER_INGEST=queue`` a placed order is appended to a local SQLite
+queue (WAL mode, fsync on every commit) and the request returns straight away with a provisional
+``Q<n>`` reference.  A background thread drains the queue and writes the
+orders to the main database in batches, one commit per batch, so the
+remote commit latency is paid once per batch instead of once per order.
+
+Delivery is at-least-once: an order is removed from the local queue only
+after its batch has committed remotely.  Several worker processes can
+share one queue file; each claims a batch before writing it, and claims
+held by a process that died are picked up again after ``CLAIM_TIMEOUT``.
+Every order is written with a ``queue_ref`` (the queue file's id plus the
+order's queue id; unique in ``orders``) in the same transaction, so an
+order delivered again after a crash or an expired claim is recognised and
+skipped instead of placed twice.
+
+A batch rejected by the database itself (an integrity or data error, e.g.
+the product was deleted after the order was queued) is retried one order
+at a time, and the orders that still fail are moved to ``dead_orders`` in
+the queue file, so one bad order never holds up the ones behind it.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpcache
+import rollup
+import stats
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = 60.0
+RETRY_DELAY = 1.0
+
+# Errors that retrying the same order can never fix (mysql.connector and sqlite3 use the same names)
+PERMANENT_ERRORS = ('IntegrityError', 'DataError')
+
+
+def _permanent(error):
+    return any(cls.__name__ in PERMANENT_ERRORS for cls in type(error).__mro__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class OrderQueue:
+
+    def __init__(self, path, pool, maxsize=10000, batch_size=200, flush_interval=0.05):
+        self.path = path
+        self.pool = pool
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._token = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = None
+        self._local_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._metrics_lock = threading.Lock()
+        self.enqueued = 0
+        self.committed = 0
+        self.batches = 0
+        self.errors = 0
+        self.dead_lettered = 0
+        self.duplicates = 0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+        self.total_batch_ms = 0.0
+        atexit.register(self.close)
+
+    # ---------------- LOCAL QUEUE ----------------
+    def _db(self):
+        if self._local is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # An acknowledged order must survive a power cut, not just a crash of this process
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_orders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    buyer_id INTEGER NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    address TEXT NOT NULL,
+                    mobile TEXT NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    queued_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_orders (
+                    id INTEGER PRIMARY KEY,
+                    buyer_id INTEGER NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    address TEXT NOT NULL,
+                    mobile TEXT NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    queued_at REAL NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS queue_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # Names this queue file in the refs it writes; shared by every process using the file
+            conn.execute("INSERT OR IGNORE INTO queue_meta (name, value) VALUES ('queue_id', ?)", (uuid.uuid4().hex,))
+            self._queue_id = conn.execute("SELECT value FROM queue_meta WHERE name = 'queue_id'").fetchone()[0]
+            self._local = conn
+        return self._local
+
+    def _ref(self, row):
+        return f'{self._queue_id}-{row[0]}'
+
+    def depth(self):
+        with self._local_lock:
+            return self._db().execute("SELECT COUNT(*) FROM pending_orders").fetchone()[0]
+
+    def submit(self, buyer_id, product_id, price, address, mobile, payment_method):
+        """Queue one order and return its provisional reference, or raise QueueFull."""
+        if self.depth() >= self.maxsize:
+            raise QueueFull(f"Order queue is full ({self.maxsize} pending)")
+        with self._local_lock:
+            cursor = self._db().execute("""
+                INSERT INTO pending_orders (buyer_id, product_id, price, address, mobile, payment_method, queued_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (buyer_id, product_id, float(price), address, mobile, payment_method, time.time()))
+            queued_id = cursor.lastrowid
+        with self._metrics_lock:
+            self.enqueued += 1
+        self.start()
+        return f'Q{queued_id}'
+
+    def _claim(self):
+        now = time.time()
+        with self._local_lock:
+            db = self._db()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                rows = db.execute("""
+                    SELECT id, buyer_id, product_id, price, address, mobile, payment_method
+                    FROM pending_orders
+                    WHERE claimed_by IS NULL OR claimed_at < ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (now - CLAIM_TIMEOUT, self.batch_size)).fetchall()
+                if rows:
+                    db.executemany("UPDATE pending_orders SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                                   [(self._token, now, row[0]) for row in rows])
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _settle(self, ids, delivered):
+        with self._local_lock:
+            db = self._db()
+            params = [(i, self._token) for i in ids]
+            if delivered:
+                db.executemany("DELETE FROM pending_orders WHERE id = ? AND claimed_by = ?", params)
+            else:
+                db.executemany("UPDATE pending_orders SET claimed_by = NULL, claimed_at = NULL "
+                               "WHERE id = ? AND claimed_by = ?", params)
+
+    def _dead_letter(self, row, error):
+        with self._local_lock:
+            db = self._db()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute("""
+                    INSERT INTO dead_orders (id, buyer_id, product_id, price, address, mobile, payment_method,
+                                             queued_at, error, failed_at)
+                    SELECT id, buyer_id, product_id, price, address, mobile, payment_method, queued_at, ?, ?
+                    FROM pending_orders WHERE id = ? AND claimed_by = ?
+                """, (f"{type(error).__name__}: {error}", time.time(), row[0], self._token))
+                db.execute("DELETE FROM pending_orders WHERE id = ? AND claimed_by = ?", (row[0], self._token))
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        with self._metrics_lock:
+            self.dead_lettered += 1
+        logger.error("Queued order Q%s moved to dead_orders in %s: %s", row[0], self.path, error)
+
+    # ---------------- GROUP COMMIT ----------------
+    def _applied_refs(self, cursor, rows):
+        refs = [self._ref(r) for r in rows]
+        cursor.execute(f"SELECT queue_ref FROM orders WHERE queue_ref IN ({', '.join(['%s'] * len(refs))})",
+                       tuple(refs))
+        return {row['queue_ref'] for row in cursor.fetchall()}
+
+    def _applied(self, rows):
+        with self.pool.connection() as conn:
+            return self._applied_refs(conn.cursor(dictionary=True, buffered=True), rows)
+
+    def _commit(self, rows):
+        """Insert ``rows`` in one transaction; returns the sellers whose orders changed."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            # Orders a previous delivery already wrote (it committed, but we never heard back)
+            applied = self._applied_refs(cursor, rows)
+            if applied:
+                rows = [r for r in rows if self._ref(r) not in applied]
+                with self._metrics_lock:
+                    self.duplicates += len(applied)
+                logger.warning("Skipped %d queued orders already in the database", len(applied))
+                if not rows:
+                    conn.commit()
+                    return []
+            cursor.executemany("""
+                INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method, queue_ref)
+                VALUES (%s, %s, 'Placed', %s, %s, %s, %s)
+            """, [(r[1], r[2], r[4], r[5], r[6], self._ref(r)) for r in rows])
+            for r in rows:
+                rollup.record_order(cursor, r[2], r[3])
+            stats.adjust(cursor, 'total_orders', len(rows))
+            # Sellers whose dashboards and order lists just changed
+            product_ids = sorted({r[2] for r in rows})
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f"SELECT DISTINCT seller_id FROM products WHERE id IN ({placeholders})", tuple(product_ids))
+            sellers = [row['seller_id'] for row in cursor.fetchall()]
+            conn.commit()
+        return sellers
+
+    def _commit_one_by_one(self, rows):
+        # The batch was rejected: find the orders at fault, deliver the rest
+        delivered, sellers = [], []
+        for i, row in enumerate(rows):
+            try:
+                sellers += self._commit([row])
+            except Exception as e:
+                if not _permanent(e):
+                    self._settle([r[0] for r in delivered], delivered=True)
+                    self._settle([r[0] for r in rows[i:]], delivered=False)
+                    raise
+                if self._applied([row]):
+                    # Another worker delivered it between our check and our insert
+                    delivered.append(row)
+                    continue
+                self._dead_letter(row, e)
+            else:
+                delivered.append(row)
+        return delivered, sellers
+
+    def flush_once(self):
+        """Write one batch to the main database; returns the number of orders taken off the queue."""
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            try:
+                delivered, sellers = rows, self._commit(rows)
+            except Exception as e:
+                if not _permanent(e):
+                    raise
+                delivered, sellers = self._commit_one_by_one(rows)
+        except Exception:
+            # Hand the batch back so it is retried (by us or another worker)
+            self._settle([r[0] for r in rows], delivered=False)
+            with self._metrics_lock:
+                self.errors += 1
+            raise
+
+        self._settle([r[0] for r in delivered], delivered=True)
+        if delivered:
+            httpcache.touch(*[httpcache.buyer_key(r[1]) for r in delivered], *map(httpcache.seller_key, sellers))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._metrics_lock:
+            self.committed += len(delivered)
+            self.batches += 1
+            self.last_batch_ms = elapsed_ms
+            self.total_batch_ms += elapsed_ms
+            self.max_batch_ms = max(self.max_batch_ms, elapsed_ms)
+        return len(rows)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                if not self.flush_once():
+                    continue
+                while not self._stopping and self.flush_once():
+                    pass
+            except Exception:
+                logger.exception("Failed to flush queued orders, retrying in %ss", RETRY_DELAY)
+                time.sleep(RETRY_DELAY)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._metrics_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='order-queue', daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=30.0):
+        """Stop the worker and flush whatever is still queued."""
+        if self._local is None and not os.path.exists(self.path):
+            return
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline and self.flush_once():
+                pass
+        except Exception:
+            logger.exception("Orders left in %s will be flushed on next start", self.path)
+
+    def dead_letters(self):
+        with self._local_lock:
+            return self._db().execute("SELECT COUNT(*) FROM dead_orders").fetchone()[0]
+
+    def stats(self):
+        depth = self.depth()
+        dead_letters = self.dead_letters()
+        with self._metrics_lock:
+            return {
+                'depth': depth,
+                'maxsize': self.maxsize,
+                'enqueued': self.enqueued,
+                'committed': self.committed,
+                'batches': self.batches,
+                'errors': self.errors,
+                'dead_lettered': self.dead_lettered,
+                'duplicates': self.duplicates,
+                'dead_letters': dead_letters,
+                'last_batch_ms': round(self.last_batch_ms, 3),
+                'avg_batch_ms': round(self.total_batch_ms / self.batches, 3) if self.batches else 0.0,
+                'max_batch_ms': round(self.max_batch_ms, 3),
+            }
@@ -0,0 +1,488 @@
+"""Background report jobs for the admin panel.
+
+Reports that aggregate every order (revenue per seller per day, weekly
+product trends, all-time seller totals) are too slow for a request.  The
+admin panel enqueues them into ``report_jobs`` (created by
+``migrations.py``) and polls ``/reports/<id>`` for progress and the result.
+
+A ``JobRunner`` thread in each admin process claims queued jobs and hands
+them to a small process pool.  Each job process opens its own database
+connection, never one from the request pool, and walks ``orders`` and
+``orders_archive`` by primary key in windows of ``chunk_size`` ids.  After
+each window it commits (no long-running snapshot), records its progress
+and a heartbeat, and pauses ``pause`` seconds.  The finished result is
+stored as JSON on the job row.
+
+Limits that keep reports from starving requests:
+
+* ``REPORT_WORKERS`` job processes per admin process, at a lower CPU
+  priority (``REPORT_NICE``)
+* ``REPORT_MAX_RUNNING`` jobs running at once across all processes
+* ``REPORT_MAX_PENDING`` queued or running jobs; further requests are
+  refused until some finish
+* the same report with the same parameters is only queued once
+
+A job whose heartbeat is older than ``JOB_TIMEOUT`` (its process died) is
+queued again.  Outside the web process::
+
+    python jobs.py enqueue daily_seller_revenue --days 30
+    python jobs.py run        # run queued jobs in this process until none are left
+    python jobs.py status
+"""
+import abc
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import rollup
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_PAUSE = 0.05
+# A running job that has not reported progress for this long is assumed dead and queued again
+JOB_TIMEOUT = 300.0
+MAX_DAYS = 3650
+
+
+class JobsBusy(Exception):
+    pass
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+# ---------------- REPORTS ----------------
+class Report(abc.ABC):
+    """One pass over every order; ``add`` sees each order row, ``rows`` gives the result."""
+    name = None
+    description = None
+    columns = ()
+
+    def __init__(self, days=None):
+        self.days = days
+        self.totals = {}
+
+    @classmethod
+    def params(cls, values):
+        # Validated parameters, in the canonical form jobs are stored and deduplicated by
+        days = values.get('days') or None
+        if days is not None:
+            days = int(days)
+            if not 0 < days <= MAX_DAYS:
+                raise ValueError(f"days must be between 1 and {MAX_DAYS}")
+        return {'days': days}
+
+    def since(self):
+        if not self.days:
+            return None
+        start = date.today() - timedelta(days=self.days - 1)
+        return start.strftime('%Y-%m-%d 00:00:00')
+
+    def _bump(self, key, row):
+        entry = self.totals.get(key)
+        if entry is None:
+            entry = self.totals[key] = [0, Decimal('0'), 0]
+        if rollup.counts(row['status']):
+            entry[0] += 1
+            entry[1] += Decimal(str(row['price']))
+        else:
+            entry[2] += 1
+
+    @abc.abstractmethod
+    def add(self, row):
+        pass
+
+    @abc.abstractmethod
+    def rows(self):
+        pass
+
+
+class DailySellerRevenue(Report):
+    name = 'daily_seller_revenue'
+    description = 'Orders and revenue per seller per day'
+    columns = ('day', 'seller_id', 'seller_name', 'orders', 'revenue', 'cancelled')
+
+    def add(self, row):
+        self._bump((str(row['created_at'])[:10], row['seller_id'], row['seller_name']), row)
+
+    def rows(self):
+        return [[day, seller_id, seller_name, orders, revenue, cancelled]
+                for (day, seller_id, seller_name), (orders, revenue, cancelled) in sorted(self.totals.items())]
+
+
+class WeeklyProductTrends(Report):
+    name = 'weekly_product_trends'
+    description = 'Orders and revenue per product per ISO week'
+    columns = ('week', 'product_id', 'product_name', 'seller_name', 'orders', 'revenue', 'cancelled')
+
+    def add(self, row):
+        year, week, _ = datetime.strptime(str(row['created_at'])[:10], '%Y-%m-%d').isocalendar()
+        self._bump((f'{year}-W{week:02d}', row['product_id'], row['product_name'], row['seller_name']), row)
+
+    def rows(self):
+        return [[week, product_id, product_name, seller_name, orders, revenue, cancelled]
+                for (week, product_id, product_name, seller_name), (orders, revenue, cancelled)
+                in sorted(self.totals.items())]
+
+
+class SellerTotals(Report):
+    name = 'seller_totals'
+    description = 'Orders and revenue per seller, best first'
+    columns = ('seller_id', 'seller_name', 'orders', 'revenue', 'cancelled')
+
+    def add(self, row):
+        self._bump((row['seller_id'], row['seller_name']), row)
+
+    def rows(self):
+        rows = [[seller_id, seller_name, orders, revenue, cancelled]
+                for (seller_id, seller_name), (orders, revenue, cancelled) in self.totals.items()]
+        rows.sort(key=lambda row: (-row[3], row[0]))
+        return rows
+
+
+REPORTS = {report.name: report for report in (DailySellerRevenue, WeeklyProductTrends, SellerTotals)}
+
+
+def parse_params(kind, values):
+    """Return the canonical parameters for a ``kind`` report, or raise ValueError."""
+    if kind not in REPORTS:
+        raise ValueError(f"Unknown report '{kind}', choose from {', '.join(REPORTS)}")
+    return REPORTS[kind].params(values)
+
+
+# ---------------- JOB PROCESS ----------------
+def chunk_query(table, since=False):
+    """Order rows with ids in ``(after, upto]`` from ``table``, plus what the reports group by."""
+    return f"""
+        SELECT orders.id, orders.created_at, orders.status, orders.product_id, products.name AS product_name,
+               products.price, products.seller_id, sellers.name AS seller_name
+        FROM {table} AS orders
+        JOIN products ON orders.product_id = products.id
+        JOIN sellers ON products.seller_id = sellers.id
+        WHERE orders.id > %s AND orders.id <= %s{" AND orders.created_at >= %s" if since else ""}
+    """
+
+
+def _lower_priority(nice):
+    # Job processes yield the CPU to request workers on the same machine
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+
+
+def run_job(job_id, token, connect, chunk_size=DEFAULT_CHUNK_SIZE, pause=DEFAULT_PAUSE):
+    """Compute job ``job_id`` (claimed under ``token``) on a connection of its own; returns its status."""
+    conn = connect()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT kind, params FROM report_jobs WHERE id = %s", (job_id,))
+        job = cursor.fetchone()
+        report = REPORTS[job['kind']](**json.loads(job['params']))
+        since = report.since()
+
+        # Fixed id ranges, so the job ends however many orders arrive meanwhile
+        spans = []
+        for table in rollup.ORDER_TABLES:
+            cursor.execute(f"SELECT MIN(id) AS low, MAX(id) AS high FROM {table}")
+            span = cursor.fetchone()
+            if span['high'] is not None:
+                spans.append((table, span['low'] - 1, span['high']))
+        conn.commit()
+        total = sum(high - low for _, low, high in spans) or 1
+        covered = 0
+
+        for table, after, high in spans:
+            query = chunk_query(table, since=since is not None)
+            while after < high:
+                upto = min(after + chunk_size, high)
+                cursor.execute(query, (after, upto, since) if since else (after, upto))
+                for row in cursor.fetchall():
+                    report.add(row)
+                covered += upto - after
+                after = upto
+                cursor.execute("""
+                    UPDATE report_jobs SET progress = %s, heartbeat_at = %s
+                    WHERE id = %s AND worker = %s AND status = %s
+                """, (round(covered / total, 4), _now(), job_id, token, RUNNING))
+                if not cursor.rowcount:
+                    # Requeued (we looked dead) and maybe claimed again elsewhere: leave it to them
+                    conn.rollback()
+                    return None
+                conn.commit()
+                if pause:
+                    time.sleep(pause)
+
+        result = json.dumps({'columns': report.columns, 'rows': report.rows()}, default=_json_value)
+        cursor.execute("""
+            UPDATE report_jobs SET status = %s, progress = 1, result = %s, finished_at = %s, heartbeat_at = %s
+            WHERE id = %s AND worker = %s AND status = %s
+        """, (DONE, result, _now(), _now(), job_id, token, RUNNING))
+        conn.commit()
+        return DONE
+    except Exception as e:
+        conn.rollback()
+        cursor.execute("""
+            UPDATE report_jobs SET status = %s, error = %s, finished_at = %s
+            WHERE id = %s AND worker = %s AND status = %s
+        """, (FAILED, f"{type(e).__name__}: {e}", _now(), job_id, token, RUNNING))
+        conn.commit()
+        return FAILED
+    finally:
+        conn.close()
+
+
+# ---------------- RUNNER ----------------
+# Every pending job, locked: claimers take turns, so the running count they see is the current one
+PENDING_JOBS = "SELECT id, status FROM report_jobs WHERE status IN (%s, %s) ORDER BY id FOR UPDATE"
+
+JOB_FIELDS = "id, kind, params, status, progress, error, created_at, started_at, finished_at"
+
+
+class JobRunner:
+
+    def __init__(self, pool, connect, workers=1, max_running=2, max_pending=20,
+                 chunk_size=DEFAULT_CHUNK_SIZE, pause=DEFAULT_PAUSE, nice=10, poll_interval=1.0):
+        self.pool = pool
+        self.connect = connect  # picklable; each job process opens its own connection with it
+        self.workers = workers
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.nice = nice
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._running = {}  # job id -> future
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+
+    # ---------------- QUEUE ----------------
+    def enqueue(self, kind, values):
+        """Queue a report and return ``(job id, created)``; an identical pending job is reused."""
+        params = json.dumps(parse_params(kind, values), sort_keys=True)
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            cursor.execute("""
+                SELECT id FROM report_jobs WHERE status IN (%s, %s) AND kind = %s AND params = %s
+                ORDER BY id LIMIT 1
+            """, (QUEUED, RUNNING, kind, params))
+            existing = cursor.fetchone()
+            if existing:
+                conn.commit()
+                with self._lock:
+                    self.deduplicated += 1
+                return existing['id'], False
+
+            cursor.execute("SELECT COUNT(*) AS n FROM report_jobs WHERE status IN (%s, %s)", (QUEUED, RUNNING))
+            if cursor.fetchone()['n'] >= self.max_pending:
+                conn.commit()
+                with self._lock:
+                    self.rejected += 1
+                raise JobsBusy(f"{self.max_pending} reports are already pending, try again later")
+
+            cursor.execute("INSERT INTO report_jobs (kind, params, status) VALUES (%s, %s, %s)",
+                           (kind, params, QUEUED))
+            job_id = cursor.lastrowid
+            conn.commit()
+        with self._lock:
+            self.enqueued += 1
+        self._wakeup.set()
+        return job_id, True
+
+    def get(self, job_id, with_result=True):
+        fields = JOB_FIELDS + (", result" if with_result else "")
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            cursor.execute(f"SELECT {fields} FROM report_jobs WHERE id = %s", (job_id,))
+            job = cursor.fetchone()
+            conn.commit()
+        return self._public(job) if job else None
+
+    def recent(self, limit=20):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            cursor.execute(f"SELECT {JOB_FIELDS} FROM report_jobs ORDER BY id DESC LIMIT %s", (limit,))
+            jobs = cursor.fetchall()
+            conn.commit()
+        return [self._public(job) for job in jobs]
+
+    @staticmethod
+    def _public(job):
+        job = dict(job)
+        job['params'] = json.loads(job['params'])
+        job['progress'] = float(job['progress'] or 0)
+        for field in ('created_at', 'started_at', 'finished_at'):
+            if isinstance(job[field], datetime):
+                job[field] = job[field].strftime('%Y-%m-%d %H:%M:%S')
+        if job.get('result') is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    # ---------------- DISPATCH ----------------
+    def _claim(self, cursor, max_running=None):
+        """Mark the oldest queued job running unless ``max_running`` are already; the caller commits."""
+        cursor.execute(PENDING_JOBS, (QUEUED, RUNNING))
+        jobs = cursor.fetchall()
+        job = next((job for job in jobs if job['status'] == QUEUED), None)
+        if not job:
+            return None, None
+        if max_running is not None and sum(job['status'] == RUNNING for job in jobs) >= max_running:
+            return None, None
+        token = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        cursor.execute("""
+            UPDATE report_jobs SET status = %s, worker = %s, started_at = %s, heartbeat_at = %s
+            WHERE id = %s AND status = %s
+        """, (RUNNING, token, _now(), _now(), job['id'], QUEUED))
+        # Zero rows: another process claimed it first (only possible where FOR UPDATE is a no-op, i.e. SQLite)
+        return (job['id'], token) if cursor.rowcount else (None, None)
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._running.pop(job_id, None)
+            try:
+                status = future.result()
+            except Exception:
+                logger.exception("Report job %s crashed", job_id)
+                status = None
+            if status == DONE:
+                self.completed += 1
+            elif status == FAILED:
+                self.failed += 1
+        self._wakeup.set()
+
+    def dispatch(self):
+        """Requeue dead jobs and start queued ones while the limits allow."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            stale = (datetime.now() - timedelta(seconds=JOB_TIMEOUT)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute("UPDATE report_jobs SET status = %s, worker = NULL WHERE status = %s AND heartbeat_at < %s",
+                           (QUEUED, RUNNING, stale))
+            if cursor.rowcount:
+                logger.warning("Requeued %d report jobs that stopped reporting progress", cursor.rowcount)
+                with self._lock:
+                    self.requeued += cursor.rowcount
+            conn.commit()
+
+            while True:
+                with self._lock:
+                    if len(self._running) >= self.workers:
+                        break
+                job_id, token = self._claim(cursor, self.max_running)
+                conn.commit()
+                if job_id is None:
+                    break
+                future = self._executor.submit(run_job, job_id, token, self.connect, self.chunk_size, self.pause)
+                with self._lock:
+                    self._running[job_id] = future
+                future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _run(self):
+        while True:
+            try:
+                self.dispatch()
+            except Exception:
+                logger.exception("Report job dispatch failed")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Dispatch queued jobs in the background; call after any fork."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Spawned, not forked: job processes must not inherit this process's sockets and threads
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_lower_priority, initargs=(self.nice,))
+            self._thread = threading.Thread(target=self._run, name='report-jobs', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running_here': len(self._running),
+                'enqueued': self.enqueued,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'requeued': self.requeued,
+            }
+
+
+def run_pending(pool, connect, chunk_size=DEFAULT_CHUNK_SIZE, pause=DEFAULT_PAUSE, log=print):
+    """Run queued jobs one by one in this process until none are left; returns how many ran."""
+    runner = JobRunner(pool, connect)
+    count = 0
+    while True:
+        with pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            job_id, token = runner._claim(cursor)
+            conn.commit()
+        if job_id is None:
+            return count
+        status = run_job(job_id, token, connect, chunk_size, pause)
+        log(f"Report job {job_id}: {status}")
+        count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue, run and inspect background report jobs")
+    parser.add_argument('command', choices=['enqueue', 'run', 'status'])
+    parser.add_argument('kind', nargs='?', choices=sorted(REPORTS), help="Report to queue (enqueue)")
+    parser.add_argument('--days', type=int, help="Only orders from the last N days")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--pause', type=float, default=DEFAULT_PAUSE, help="Seconds to pause between chunks")
+    parser.add_argument('--sqlite', metavar='PATH', help="Run against a local SQLite database instead of MySQL")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        connect = sqlite_connect(args.sqlite)
+        pool = ConnectionPool(connect, size=1, dialect='sqlite')
+    else:
+        from admin_panel import report_jobs
+        pool, connect = report_jobs.pool, report_jobs.connect
+
+    if args.command == 'enqueue':
+        if not args.kind:
+            parser.error("enqueue needs a report kind")
+        job_id, created = JobRunner(pool, connect, max_pending=10**6).enqueue(args.kind, {'days': args.days})
+        print(f"✅ Report job {job_id} {'queued' if created else 'already pending'}")
+    elif args.command == 'run':
+        count = run_pending(pool, connect, chunk_size=args.chunk_size, pause=args.pause)
+        print(f"✅ Ran {count} report jobs")
+    else:
+        for job in JobRunner(pool, connect).recent(20):
+            print(f"  {job['id']:>6}  {job['kind']:<22} {job['status']:<8} {job['progress']:>6.1%}  {job['params']}")
+
+
+if __name__ == '__main__':
+    main()
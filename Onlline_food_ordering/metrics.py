@@ -0,0 +1,176 @@
+"""Per-request latency and query instrumentation.
+
+Every request records its latency, how many queries it issued, the time
+spent in the database and its slowest statement.  Per-route summaries
+(p50/p95/p99 over a bounded window of recent requests) are served in
+Prometheus text format at ``/metrics`` and as JSON at ``/metrics/routes``.
+Requests slower than ``SLOW_REQUEST_MS`` are logged with their slowest
+statement.
+
+Recording a request is a handful of additions and one deque append, cheap
+enough to leave on in production.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from flask import Response, g, has_request_context, jsonify, request
+
+import db
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 2048
+
+_CONVERTER = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+
+
+def normalize_rule(rule):
+    # '/seller/<int:seller_id>' -> '/seller/<seller_id>'
+    return _CONVERTER.sub(r'<\1>', rule)
+
+
+def _record_query(statement, seconds):
+    if not has_request_context() or '_metrics_started' not in g:
+        return
+    g._metrics_queries += 1
+    g._metrics_db_time += seconds
+    if seconds > g._metrics_slowest[0]:
+        g._metrics_slowest = (seconds, statement)
+
+
+class RouteStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.window = deque(maxlen=WINDOW)
+
+    def quantiles(self):
+        samples = sorted(self.window)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class Metrics:
+
+    def __init__(self, app_name, slow_ms=500.0):
+        self.app_name = app_name
+        self.slow_ms = slow_ms
+        self.routes = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if _record_query not in db.query_hooks:
+            db.query_hooks.append(_record_query)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.prometheus)
+        app.add_url_rule('/metrics/routes', 'metrics_routes', lambda: jsonify(self.route_summary()))
+
+    def add_collector(self, name, collect):
+        """Export the numeric values of ``collect()`` (a dict) as gauges named ``<name>_<key>``.
+
+        Adding a collector under a name already in use replaces the old one.
+        """
+        self.collectors = [(n, c) for n, c in self.collectors if n != name] + [(name, collect)]
+
+    # ---------------- RECORDING ----------------
+    def _start(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_db_time = 0.0
+        g._metrics_slowest = (0.0, None)
+
+    def _finish(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        if route.startswith('/metrics'):
+            return response
+
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats()
+            stats.count += 1
+            stats.errors += response.status_code >= 500
+            stats.total_seconds += elapsed
+            stats.queries += g._metrics_queries
+            stats.db_seconds += g._metrics_db_time
+            stats.window.append(elapsed)
+
+        if elapsed * 1000 >= self.slow_ms:
+            slowest_seconds, slowest = g._metrics_slowest
+            logger.warning("Slow request %s %s: %.1f ms, %d queries, %.1f ms in DB, slowest %.1f ms: %s",
+                           request.method, route, elapsed * 1000, g._metrics_queries,
+                           g._metrics_db_time * 1000, slowest_seconds * 1000,
+                           ' '.join((slowest or '').split())[:300])
+        return response
+
+    # ---------------- EXPORT ----------------
+    def route_summary(self):
+        with self._lock:
+            summary = {}
+            for route, stats in self.routes.items():
+                quantiles = stats.quantiles()
+                summary[normalize_rule(route)] = {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'p50_ms': round(quantiles[0.5] * 1000, 2),
+                    'p95_ms': round(quantiles[0.95] * 1000, 2),
+                    'p99_ms': round(quantiles[0.99] * 1000, 2),
+                    'avg_queries': round(stats.queries / stats.count, 2),
+                    'avg_db_ms': round(stats.db_seconds / stats.count * 1000, 2),
+                }
+            return summary
+
+    def prometheus(self):
+        app_label = _escape(self.app_name)
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds summary',
+        ]
+        counters = {'http_request_errors_total': [], 'db_queries_total': [], 'db_time_seconds_total': []}
+        with self._lock:
+            for route, stats in sorted(self.routes.items()):
+                labels = f'app="{app_label}",route="{_escape(normalize_rule(route))}"'
+                for q, value in stats.quantiles().items():
+                    lines.append(f'http_request_duration_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.total_seconds:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+                counters['http_request_errors_total'].append(f'{{{labels}}} {stats.errors}')
+                counters['db_queries_total'].append(f'{{{labels}}} {stats.queries}')
+                counters['db_time_seconds_total'].append(f'{{{labels}}} {stats.db_seconds:.6f}')
+
+        for name, samples in counters.items():
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(name + sample for sample in samples)
+
+        for name, collect in self.collectors:
+            try:
+                values = collect()
+            except Exception:
+                logger.exception("Metrics collector %s failed", name)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f'# TYPE {name}_{key} gauge')
+                lines.append(f'{name}_{key}{{app="{app_label}"}} {value}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,385 @@
+"""Versioned schema migrations and an EXPLAIN-based query check.
+
+    python migrations.py status     # applied / pending migrations
+    python migrations.py upgrade    # apply pending migrations in order
+    python migrations.py check      # EXPLAIN every hot query, fail on full scans
+
+Add ``--sqlite PATH`` to run against a local SQLite stand-in, or
+``--app admin`` to use the admin panel's database settings.
+
+Migrations are append-only: never edit one that has shipped, add a new
+one instead.  Statements are written for MySQL/TiDB and translated for
+SQLite where the two disagree; a step that depends on the existing schema
+is a function of ``(cursor, dialect)`` instead of a string.
+"""
+import argparse
+import sys
+
+import jobs
+import repository
+import rollup
+import stats
+from archive import ORDER_COLUMNS, order_source
+
+
+def add_column(table, column, definition):
+    """A step adding ``column`` unless the table already has it (databases created from the README)."""
+    def step(cursor, dialect):
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        columns = [col[0] for col in cursor.description]
+        cursor.fetchall()
+        if column in columns:
+            return
+        if dialect == 'sqlite' and 'CURRENT_TIMESTAMP' in definition:
+            # SQLite only adds columns with a constant default: backfill, then stamp new rows
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition.split(' DEFAULT ')[0]}")
+            cursor.execute(f"UPDATE {table} SET {column} = CURRENT_TIMESTAMP")
+            cursor.execute(f"""
+                CREATE TRIGGER {table}_{column}_default AFTER INSERT ON {table}
+                WHEN NEW.{column} IS NULL
+                BEGIN UPDATE {table} SET {column} = CURRENT_TIMESTAMP WHERE id = NEW.id; END
+            """)
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+MIGRATIONS = [
+    (1, 'base tables', [
+        """
+        CREATE TABLE IF NOT EXISTS sellers (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS buyers (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            seller_id INT,
+            FOREIGN KEY (seller_id) REFERENCES sellers(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            buyer_id INT,
+            product_id INT,
+            status VARCHAR(50) DEFAULT 'Placed',
+            address TEXT NOT NULL,
+            mobile VARCHAR(20) NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (buyer_id) REFERENCES buyers(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+        """,
+    ]),
+    (2, 'indexes for hot lookups and joins', [
+        "CREATE INDEX idx_products_seller_id ON products (seller_id, id)",
+        "CREATE INDEX idx_orders_product_id ON orders (product_id, id)",
+        "CREATE INDEX idx_orders_buyer_id ON orders (buyer_id, id)",
+    ]),
+    (3, 'product sales rollup', [
+        """
+        CREATE TABLE IF NOT EXISTS product_sales_rollup (
+            product_id INT PRIMARY KEY,
+            order_count INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            last_order_at DATETIME NULL
+        )
+        """,
+    ]),
+    (4, 'platform counters', [
+        """
+        CREATE TABLE IF NOT EXISTS platform_counters (
+            name VARCHAR(64) PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    (5, 'checkouts', [
+        """
+        CREATE TABLE IF NOT EXISTS checkouts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            buyer_id INT NOT NULL,
+            address TEXT NOT NULL,
+            mobile VARCHAR(20) NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            item_count INT NOT NULL,
+            total DECIMAL(12,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (buyer_id) REFERENCES buyers(id)
+        )
+        """,
+        "ALTER TABLE orders ADD COLUMN checkout_id INT NULL",
+        "CREATE INDEX idx_orders_checkout_id ON orders (checkout_id)",
+    ]),
+    (6, 'order queue by status', [
+        "CREATE INDEX idx_orders_status_id ON orders (status, id)",
+    ]),
+    (7, 'order archive', [
+        """
+        CREATE TABLE IF NOT EXISTS orders_archive (
+            id INT PRIMARY KEY,
+            buyer_id INT,
+            product_id INT,
+            status VARCHAR(50),
+            address TEXT NOT NULL,
+            mobile VARCHAR(20) NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP NULL,
+            checkout_id INT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (buyer_id) REFERENCES buyers(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+        """,
+        "CREATE INDEX idx_orders_archive_buyer_id ON orders_archive (buyer_id, id)",
+        "CREATE INDEX idx_orders_archive_product_id ON orders_archive (product_id, id)",
+        "CREATE INDEX idx_orders_archive_created_at ON orders_archive (created_at)",
+        """
+        CREATE TABLE IF NOT EXISTS archive_checkpoints (
+            name VARCHAR(64) PRIMARY KEY,
+            last_id INT NOT NULL DEFAULT 0,
+            cutoff DATETIME NULL,
+            moved BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    (8, 'report jobs', [
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(64) NOT NULL,
+            params TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            progress FLOAT NOT NULL DEFAULT 0,
+            worker VARCHAR(64) NULL,
+            result MEDIUMTEXT NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME NULL,
+            heartbeat_at DATETIME NULL,
+            finished_at DATETIME NULL
+        )
+        """,
+        "CREATE INDEX idx_report_jobs_status_id ON report_jobs (status, id)",
+    ]),
+    (9, 'order status events', [
+        """
+        CREATE TABLE IF NOT EXISTS order_status_events (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            seller_id INT NULL,
+            buyer_id INT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (10, 'cache versions', [
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+        """,
+    ]),
+    (11, 'queued order references', [
+        "ALTER TABLE orders ADD COLUMN queue_ref VARCHAR(64) NULL",
+        "CREATE UNIQUE INDEX idx_orders_queue_ref ON orders (queue_ref)",
+    ]),
+    # Migration 1 skipped orders on databases created from the README schema, which has no created_at
+    (12, 'order timestamps on older schemas', [
+        add_column('orders', 'created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+    ]),
+    # Archived orders outlive their products and buyers; foreign keys would block deleting either
+    (13, 'order archive without foreign keys', [
+        """
+        CREATE TABLE orders_archive_new (
+            id INT PRIMARY KEY,
+            buyer_id INT,
+            product_id INT,
+            status VARCHAR(50),
+            address TEXT NOT NULL,
+            mobile VARCHAR(20) NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP NULL,
+            checkout_id INT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        f"""
+        INSERT INTO orders_archive_new ({', '.join(ORDER_COLUMNS)}, archived_at)
+        SELECT {', '.join(ORDER_COLUMNS)}, archived_at FROM orders_archive
+        """,
+        "DROP TABLE orders_archive",
+        "ALTER TABLE orders_archive_new RENAME TO orders_archive",
+        "CREATE INDEX idx_orders_archive_buyer_id ON orders_archive (buyer_id, id)",
+        "CREATE INDEX idx_orders_archive_product_id ON orders_archive (product_id, id)",
+        "CREATE INDEX idx_orders_archive_created_at ON orders_archive (created_at)",
+    ]),
+]
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def for_dialect(statement, dialect):
+    if dialect == 'sqlite':
+        statement = statement.replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+    return statement
+
+
+def applied_versions(cursor):
+    cursor.execute(CREATE_VERSION_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def upgrade(conn, dialect='mysql', log=print):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    done = applied_versions(cursor)
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if version in done:
+            continue
+        log(f"Applying {version}: {name}")
+        for statement in statements:
+            if callable(statement):
+                statement(cursor, dialect)
+            else:
+                cursor.execute(for_dialect(statement, dialect))
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+# ---------------- QUERY CHECK ----------------
+# Every statement app.py and admin_panel.py run on a hot path, with sample
+# parameters: all of repository.py plus the writes and one-off reads below.
+# ``scan_ok`` marks queries that read a whole table on purpose (counts,
+# bounded LIMIT scans, full listings and exports).
+CHECKED_QUERIES = [(query.name, query.sql, query.sample, query.scan_ok) for query in repository.QUERIES] + [
+    ('bulk status change', """
+        SELECT orders.id, orders.status, orders.product_id, orders.buyer_id, products.price
+        FROM orders
+        JOIN products ON orders.product_id = products.id
+        WHERE orders.id IN (%s, %s, %s) AND products.seller_id = %s
+    """, (1, 2, 3, 1), False),
+    ('buyer order history', f"""
+        SELECT orders.*, products.name AS product_name, products.price, sellers.name AS seller_name
+        FROM {order_source('buyer_id = %s')}
+        JOIN products ON orders.product_id = products.id
+        JOIN sellers ON products.seller_id = sellers.id
+        ORDER BY orders.id DESC
+    """, (1, 1), False),
+    ('archive scan', """
+        SELECT id, status, created_at < %s AS expired
+        FROM orders
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    """, ('2024-01-01 00:00:00', 0, 500), False),
+    ('order for status change', """
+        SELECT orders.status, orders.product_id, orders.buyer_id, products.seller_id, products.price
+        FROM orders
+        JOIN products ON orders.product_id = products.id
+        WHERE orders.id = %s AND products.seller_id = %s
+    """, (1, 1), False),
+    ('rollup update', rollup.ADD_ORDER, (1, '2024-01-01 00:00:00', 1), False),
+    ('pending report jobs', jobs.PENDING_JOBS, (jobs.QUEUED, jobs.RUNNING), False),
+    ('report chunk', jobs.chunk_query('orders', since=True), (0, 5000, '2024-01-01 00:00:00'), False),
+    ('delete seller product', "DELETE FROM products WHERE id = %s AND seller_id = %s", (1, 1), False),
+    ('platform counters', stats.COUNT_QUERY, (), True),
+]
+
+
+def full_scans(cursor, sql, params, dialect):
+    """Return a description of every full table scan in the query plan."""
+    if dialect == 'sqlite':
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        # "SCAN t" is a full scan; "SCAN t USING [COVERING] INDEX i" walks a whole index
+        return [row['detail'] for row in cursor.fetchall() if row['detail'].startswith('SCAN ')]
+
+    cursor.execute("EXPLAIN " + sql, params)
+    scans = []
+    for row in cursor.fetchall():
+        if 'type' in row:
+            # MySQL: access type ALL means the whole table is read
+            if row['type'] == 'ALL':
+                scans.append(f"{row['table']}: type=ALL rows={row.get('rows')}")
+        elif 'FullScan' in str(row.get('id', '')):
+            # TiDB: TableFullScan / IndexFullScan operators
+            scans.append(f"{row['id']} {row.get('access object', '')}".strip())
+    return scans
+
+
+def check(conn, dialect='mysql', log=print):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    problems = 0
+    for name, sql, params, scan_ok in CHECKED_QUERIES:
+        scans = full_scans(cursor, sql, params, dialect)
+        if not scans:
+            log(f"  ok    {name}")
+        elif scan_ok:
+            log(f"  scan  {name} (allowed): {'; '.join(scans)}")
+        else:
+            problems += 1
+            log(f"  FAIL  {name}: {'; '.join(scans)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema migrations and query plan checks")
+    parser.add_argument('command', choices=['status', 'upgrade', 'check'])
+    parser.add_argument('--sqlite', metavar='PATH', help="Run against a local SQLite database instead of MySQL")
+    parser.add_argument('--app', choices=['main', 'admin'], default='main',
+                        help="Whose database settings to use (default: main app)")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+    elif args.app == 'admin':
+        from admin_panel import pool
+    else:
+        from app import pool
+
+    with pool.connection() as conn:
+        if args.command == 'status':
+            done = applied_versions(conn.cursor(dictionary=True, buffered=True))
+            conn.commit()
+            for version, name, _ in MIGRATIONS:
+                print(f"  {'applied' if version in done else 'pending'}  {version}: {name}")
+        elif args.command == 'upgrade':
+            applied = upgrade(conn, dialect=pool.dialect)
+            print(f"✅ Applied {len(applied)} migration(s)" if applied else "✅ Schema is up to date")
+        else:
+            problems = check(conn, dialect=pool.dialect)
+            if problems:
+                print(f"❌ {problems} query(s) do full table scans")
+                sys.exit(1)
+            print("✅ No unexpected full table scans")
+
+
+if __name__ == '__main__':
+    main()
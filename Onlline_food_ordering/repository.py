@@ -0,0 +1,262 @@
+"""Named queries shared by app.py, admin_panel.py and the background jobs.
+
+Every statement that more than one place runs is defined here once, and
+``fetch_all``/``fetch_one`` run it as a server-side prepared statement:
+the first execution on a connection prepares it, later ones send only the
+parameters (binary protocol), so the server parses each statement once
+per connection instead of once per request.  On the SQLite stand-in the
+driver's own statement cache plays the same part.
+
+Rows come back as read-only records: tuples with ``__slots__ = ()`` and
+one class per column list, so a row costs one small tuple instead of a
+dict.  They read both as ``row.name`` and ``row['name']`` (plus ``get``,
+``keys`` and ``items``), which is all templates and callers written for
+dictionary rows use.  Mapping-style reads only see the columns, never
+tuple methods, and work for any column name (``row['COUNT(*)']``);
+attribute reads need a column name that is a valid identifier.  Convert with ``dict(row.items())`` before changing
+or JSON-encoding a row.
+
+``python migrations.py check`` EXPLAINs every query listed here, and
+``python -m bench.statements`` compares them with the plain dictionary
+cursor.
+"""
+import threading
+from collections import namedtuple
+
+from db import get_db
+
+
+class Query:
+    __slots__ = ('name', 'sql', 'sample', 'scan_ok')
+
+    def __init__(self, name, sql, sample=(), scan_ok=False):
+        self.name = name
+        self.sql = sql
+        self.sample = sample    # parameters for the EXPLAIN check
+        self.scan_ok = scan_ok  # reads a whole table on purpose
+
+    def __repr__(self):
+        return f'<Query {self.name!r}>'
+
+
+QUERIES = []
+
+
+def _query(name, sql, sample=(), scan_ok=False):
+    query = Query(name, sql, sample, scan_ok)
+    QUERIES.append(query)
+    return query
+
+
+# ---------------- USERS ----------------
+SELLER_BY_ID = _query('seller by id', "SELECT * FROM sellers WHERE id = %s", (1,))
+SELLER_BY_USERNAME = _query('seller by username', "SELECT * FROM sellers WHERE username = %s", ('x',))
+BUYER_BY_ID = _query('buyer by id', "SELECT * FROM buyers WHERE id = %s", (1,))
+BUYER_BY_USERNAME = _query('buyer by username', "SELECT * FROM buyers WHERE username = %s", ('x',))
+ALL_SELLERS = _query('admin users', "SELECT * FROM sellers", scan_ok=True)
+ALL_BUYERS = _query('admin buyers', "SELECT * FROM buyers", scan_ok=True)
+
+# ---------------- PRODUCTS ----------------
+PRODUCTS_AFTER = _query('catalog page', """
+    SELECT products.*, sellers.name AS seller_name
+    FROM products
+    JOIN sellers ON products.seller_id = sellers.id
+    WHERE products.id > %s
+    ORDER BY products.id
+    LIMIT %s
+""", (0, 48))
+
+SELLER_PRODUCTS = _query('seller dashboard', """
+    SELECT products.*, COALESCE(r.order_count, 0) AS order_count, COALESCE(r.revenue, 0) AS total_revenue
+    FROM products
+    LEFT JOIN product_sales_rollup r ON r.product_id = products.id
+    WHERE products.seller_id = %s
+    ORDER BY products.id
+""", (1,))
+
+PRODUCT_FOR_ORDER = _query('product for order', "SELECT id, price, seller_id FROM products WHERE id = %s", (1,))
+
+ALL_PRODUCTS = _query('admin products', """
+    SELECT products.*, sellers.name AS seller_name
+    FROM products
+    JOIN sellers ON products.seller_id = sellers.id
+    ORDER BY products.id DESC
+""", scan_ok=True)
+
+TOP_SELLERS = _query('admin top sellers', """
+    SELECT sellers.name, COALESCE(SUM(r.order_count), 0) AS order_count, SUM(r.revenue) AS revenue
+    FROM sellers
+    LEFT JOIN products ON sellers.id = products.seller_id
+    LEFT JOIN product_sales_rollup r ON products.id = r.product_id
+    GROUP BY sellers.id, sellers.name
+    ORDER BY revenue DESC
+    LIMIT %s
+""", (5,), scan_ok=True)
+
+# ---------------- ORDERS ----------------
+_ORDER_DETAILS = """
+    SELECT orders.*, products.name AS product_name, products.price, products.seller_id,
+           buyers.name AS buyer_name, sellers.name AS seller_name
+    FROM orders
+    JOIN products ON orders.product_id = products.id
+    JOIN buyers ON orders.buyer_id = buyers.id
+    JOIN sellers ON products.seller_id = sellers.id
+"""
+
+RECENT_ORDERS = _query('admin recent orders', _ORDER_DETAILS + """
+    ORDER BY orders.id DESC
+    LIMIT %s
+""", (10,), scan_ok=True)
+
+# Newest first; pass a huge id to start from the top
+ORDERS_BEFORE = _query('admin orders page', _ORDER_DETAILS + """
+    WHERE orders.id < %s
+    ORDER BY orders.id DESC
+    LIMIT %s
+""", (2**31, 50))
+
+ORDERS_AFTER = _query('order feed tail', _ORDER_DETAILS + """
+    WHERE orders.id > %s
+    ORDER BY orders.id
+    LIMIT %s
+""", (0, 300))
+
+_STATUS_EVENTS = "SELECT id, order_id, status, seller_id, buyer_id FROM order_status_events"
+
+RECENT_STATUS_EVENTS = _query('order feed status start', _STATUS_EVENTS + """
+    ORDER BY id DESC
+    LIMIT %s
+""", (100,), scan_ok=True)
+
+STATUS_EVENTS_AFTER = _query('order feed status tail', _STATUS_EVENTS + """
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+""", (0, 300))
+
+_SELLER_ORDERS = """
+    SELECT orders.*, products.name AS product_name, products.price, buyers.name AS buyer_name
+    FROM orders
+    JOIN products ON orders.product_id = products.id
+    JOIN buyers ON orders.buyer_id = buyers.id
+    WHERE products.seller_id = %s
+"""
+
+SELLER_ORDERS = _query('seller order queue', _SELLER_ORDERS + """
+    AND orders.id < %s
+    ORDER BY orders.id DESC
+    LIMIT %s
+""", (1, 2**31, 51))
+
+SELLER_ORDERS_BY_STATUS = _query('seller order queue by status', _SELLER_ORDERS + """
+    AND orders.status = %s AND orders.id < %s
+    ORDER BY orders.id DESC
+    LIMIT %s
+""", (1, 'Placed', 2**31, 51))
+
+BUYER_ORDERS = _query('buyer orders', """
+    SELECT orders.*, products.name AS product_name, products.price, sellers.name AS seller_name
+    FROM orders
+    JOIN products ON orders.product_id = products.id
+    JOIN sellers ON products.seller_id = sellers.id
+    WHERE orders.buyer_id = %s
+    ORDER BY orders.id DESC
+""", (1,))
+
+
+# ---------------- RECORDS ----------------
+class Record(tuple):
+    """A read-only row; subclasses made by ``record_type`` name the fields.
+
+    ``_columns`` holds the column names as the cursor gave them and
+    ``_positions`` maps each to its index (the last one wins on duplicates,
+    as in a dictionary cursor).  ``_fields`` comes from the namedtuple base,
+    which follows this class in the MRO, and may differ: it renames columns
+    that are not identifiers.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            try:
+                return tuple.__getitem__(self, self._positions[key])
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        i = self._positions.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._columns
+
+    def items(self):
+        return zip(self._columns, self)
+
+
+_record_types = {}
+
+
+def record_type(fields):
+    cls = _record_types.get(fields)
+    if cls is None:
+        # namedtuple gives C-level field accessors; Record adds the mapping-style reads
+        cls = type('Row', (Record, namedtuple('Row', fields, rename=True)), {
+            '__slots__': (),
+            '_columns': fields,
+            '_positions': {name: i for i, name in enumerate(fields)},
+        })
+        _record_types[fields] = cls
+    return cls
+
+
+# ---------------- EXECUTION ----------------
+prepares = 0
+reuses = 0
+_stats_lock = threading.Lock()
+
+
+def _execute(query, params, readonly, conn):
+    global prepares, reuses
+    conn = conn or get_db(readonly)
+    cursor, reused = conn.prepared(query.name)
+    with _stats_lock:
+        if reused:
+            reuses += 1
+        else:
+            prepares += 1
+    # Always the same string object: that is how the cursor knows the statement is already prepared
+    cursor.execute(query.sql, params)
+    rows = cursor.fetchall()
+    if not rows:
+        return rows
+    make = record_type(tuple(cursor.column_names))._make
+    return [make(row) for row in rows]
+
+
+def fetch_all(query, params=(), readonly=True, conn=None):
+    """Run ``query`` and return its rows as records.
+
+    Reads go to a replica when allowed (see ``db.get_db``); pass
+    ``readonly=False`` inside a write transaction, or ``conn`` outside a
+    request.
+    """
+    return _execute(query, params, readonly, conn)
+
+
+def fetch_one(query, params=(), readonly=True, conn=None):
+    rows = _execute(query, params, readonly, conn)
+    return rows[0] if rows else None
+
+
+def stats():
+    with _stats_lock:
+        done, reused = prepares, reuses
+    total = done + reused
+    return {
+        'queries': len(QUERIES),
+        'prepares': done,
+        'reuses': reused,
+        'reuse_ratio': round(reused / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,215 @@
+"""Incrementally maintained per-product sales totals.
+
+``product_sales_rollup`` holds one row per product with its order count,
+revenue and the time of its latest order.  Writers update it in the same
+transaction as the order itself, so the seller dashboard can read its
+charts straight from the rollup instead of aggregating the orders table.
+
+The table is created by ``migrations.py``.  Rebuild it from scratch with::
+
+    python rollup.py rebuild --batch-size 500
+"""
+import argparse
+from datetime import datetime
+
+import events
+
+# Every status an order can be moved to, in kitchen order
+ORDER_STATUSES = ('Placed', 'Cooking', 'Out for delivery', 'Delivered', 'Cancelled')
+
+# Orders in these statuses don't count towards a product's sales
+EXCLUDED_STATUSES = ('Cancelled',)
+
+# Live and archived orders (see archive.py) both count
+ORDER_TABLES = ('orders', 'orders_archive')
+
+
+def counts(status):
+    return status not in EXCLUDED_STATUSES
+
+
+ADD_ORDER = """
+    UPDATE product_sales_rollup
+    SET order_count = order_count + 1, revenue = revenue + %s, last_order_at = %s
+    WHERE product_id = %s
+"""
+
+
+def _add_order(cursor, product_id, price, placed_at):
+    cursor.execute(ADD_ORDER, (price, placed_at, product_id))
+    return cursor.rowcount > 0
+
+
+def record_order(cursor, product_id, price, placed_at=None):
+    placed_at = placed_at or datetime.now()
+    if _add_order(cursor, product_id, price, placed_at):
+        return
+    try:
+        cursor.execute("""
+            INSERT INTO product_sales_rollup (product_id, order_count, revenue, last_order_at)
+            VALUES (%s, 1, %s, %s)
+        """, (product_id, price, placed_at))
+    except Exception:
+        # A concurrent first order for this product may have created the row first
+        if not _add_order(cursor, product_id, price, placed_at):
+            raise
+
+
+def record_status_change(cursor, product_id, price, old_status, new_status):
+    if counts(old_status) == counts(new_status):
+        return
+    delta = 1 if counts(new_status) else -1
+    cursor.execute("""
+        UPDATE product_sales_rollup
+        SET order_count = order_count + %s, revenue = revenue + %s
+        WHERE product_id = %s
+    """, (delta, delta * price, product_id))
+
+
+def check_status(status):
+    if status not in ORDER_STATUSES:
+        raise ValueError(f"Unknown status '{status}'")
+
+
+def change_order_status(cursor, order_id, new_status, seller_id=None):
+    """Update one order's status and keep the rollup in step.
+
+    Uses a compare-and-set on the previous status so two concurrent updates
+    of the same order can't both apply their rollup delta.  The change is
+    also recorded for the live order feeds (see events.py).  Returns the order
+    (status before the change, product, buyer and seller ids) or False if it
+    doesn't exist (or doesn't belong to ``seller_id``).  Raises ValueError for
+    a status outside ``ORDER_STATUSES``.
+    """
+    check_status(new_status)
+    query = """
+        SELECT orders.status, orders.product_id, orders.buyer_id, products.seller_id, products.price
+        FROM orders
+        JOIN products ON orders.product_id = products.id
+        WHERE orders.id = %s
+    """
+    params = (order_id,)
+    if seller_id is not None:
+        query += " AND products.seller_id = %s"
+        params += (seller_id,)
+    cursor.execute(query, params)
+    order = cursor.fetchone()
+    if not order:
+        return False
+
+    cursor.execute("UPDATE orders SET status = %s WHERE id = %s AND status = %s",
+                   (new_status, order_id, order['status']))
+    if cursor.rowcount:
+        record_status_change(cursor, order['product_id'], order['price'], order['status'], new_status)
+        events.record_status(cursor, order_id, new_status, order['seller_id'], order['buyer_id'])
+    return order
+
+
+def change_orders_status(cursor, order_ids, new_status, seller_id):
+    """Move many of one seller's orders to ``new_status`` with a single UPDATE; the caller commits.
+
+    Orders that don't exist or belong to another seller are left alone.  The
+    seller's orders are locked while they are read, so the rollup deltas
+    match the statuses actually replaced.  Returns those orders with their
+    previous status.  Raises ValueError for a status outside ``ORDER_STATUSES``.
+    """
+    check_status(new_status)
+    if not order_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute(f"""
+        SELECT orders.id, orders.status, orders.product_id, orders.buyer_id, products.price
+        FROM orders
+        JOIN products ON orders.product_id = products.id
+        WHERE orders.id IN ({placeholders}) AND products.seller_id = %s
+        FOR UPDATE
+    """, (*order_ids, seller_id))
+    orders = cursor.fetchall()
+
+    changing = [o for o in orders if o['status'] != new_status]
+    if changing:
+        placeholders = ', '.join(['%s'] * len(changing))
+        cursor.execute(f"UPDATE orders SET status = %s WHERE id IN ({placeholders})",
+                       (new_status, *[o['id'] for o in changing]))
+        for o in changing:
+            record_status_change(cursor, o['product_id'], o['price'], o['status'], new_status)
+            events.record_status(cursor, o['id'], new_status, seller_id, o['buyer_id'])
+    return orders
+
+
+def forget_product(cursor, product_id):
+    cursor.execute("DELETE FROM product_sales_rollup WHERE product_id = %s", (product_id,))
+
+
+def rebuild(conn, batch_size=500, log=print):
+    """Recompute the whole rollup from live and archived orders, one batch of products per transaction."""
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    excluded = ', '.join(['%s'] * len(EXCLUDED_STATUSES))
+    last_id = 0
+    total = 0
+    while True:
+        cursor.execute("SELECT id FROM products WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+        ids = [row['id'] for row in cursor.fetchall()]
+        if not ids:
+            break
+        first_id, last_id = ids[0], ids[-1]
+
+        totals = {}
+        for table in ORDER_TABLES:
+            cursor.execute(f"""
+                SELECT products.id AS product_id,
+                       COUNT(orders.id) AS order_count,
+                       COALESCE(SUM(CASE WHEN orders.id IS NOT NULL THEN products.price END), 0) AS revenue,
+                       MAX(orders.created_at) AS last_order_at
+                FROM products
+                LEFT JOIN {table} AS orders ON orders.product_id = products.id
+                    AND (orders.status IS NULL OR orders.status NOT IN ({excluded}))
+                WHERE products.id BETWEEN %s AND %s
+                GROUP BY products.id
+            """, EXCLUDED_STATUSES + (first_id, last_id))
+            for r in cursor.fetchall():
+                product = totals.get(r['product_id'])
+                if product is None:
+                    totals[r['product_id']] = [r['order_count'], r['revenue'], r['last_order_at']]
+                    continue
+                product[0] += r['order_count']
+                product[1] += r['revenue']
+                if product[2] is None or (r['last_order_at'] is not None and r['last_order_at'] > product[2]):
+                    product[2] = r['last_order_at']
+        rows = [(product_id, *product) for product_id, product in totals.items()]
+
+        cursor.execute("DELETE FROM product_sales_rollup WHERE product_id BETWEEN %s AND %s", (first_id, last_id))
+        cursor.executemany("""
+            INSERT INTO product_sales_rollup (product_id, order_count, revenue, last_order_at)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        total += len(rows)
+        log(f"Rebuilt products {first_id}..{last_id} ({total} so far)")
+
+    # Rows for products deleted after the last batch
+    cursor.execute("DELETE FROM product_sales_rollup WHERE product_id > %s", (last_id,))
+    conn.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the product_sales_rollup table")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--sqlite', metavar='PATH', help="Run against a local SQLite database instead of MySQL")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+    else:
+        from app import pool
+
+    with pool.connection() as conn:
+        total = rebuild(conn, batch_size=args.batch_size)
+    print(f"✅ Rollup rebuilt for {total} products")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""In-process product search for buyers.
+
+An inverted index maps every token of a product's name and its seller's
+name to the products containing it.  Tokens are also kept in a sorted
+list, so a query term is matched as a prefix with two bisections instead
+of a table scan.  Results are ranked by how well each term matched
+(exact token beats prefix, product name beats seller name), then by
+shorter name.  Postings are kept in that rank order, so a one-word query
+reads just the first ``limit`` entries.  Longer queries intersect the id
+sets of their terms, then either score every product matching all of
+them or walk the rarest term best-first and stop once nothing later can
+make the top results, whichever is expected to read fewer entries.
+
+The index is built once from the database, updated when this process
+adds or deletes a product, and rebuilt every ``SEARCH_REFRESH_INTERVAL``
+seconds to pick up changes made elsewhere (other workers, the admin
+panel, bulk imports).  Queries take no lock: an update is applied to a
+copy of the index that shares every posting the change leaves alone, and
+the copy is swapped in, so a query always reads one consistent index.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+
+import repository
+
+logger = logging.getLogger(__name__)
+
+BUILD_BATCH_SIZE = 5000
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# A term shorter than this only matches whole tokens, so "a" cannot expand to half the vocabulary
+MIN_PREFIX = 2
+MAX_EXPANSIONS = 200
+# How much cheaper a step of the ranked walk must be expected to be before it is preferred
+# over scoring every match; the walk loses when the tie-break runs against the other terms
+WALK_BIAS = 4
+
+NAME_WEIGHT = 2
+SELLER_WEIGHT = 1
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or '').lower())
+
+
+class _Index:
+
+    def __init__(self):
+        self.docs = {}      # product id -> (name, price, seller_id, seller_name, ((token, weight), ...))
+        self.postings = {}  # token -> [(-weight, len(name), product id), ...] in rank order
+        self.weights = {}   # token -> {product id: weight}, for intersecting terms
+        self.order = {}     # product id -> len(name) and id packed in one int, the tie-break
+        self.tokens = []    # sorted vocabulary, for prefix lookups
+        self._shared = set()  # tokens whose posting and weights still belong to the index this was copied from
+
+    def copy(self):
+        """A copy to update while queries keep reading this one; postings are copied on first write."""
+        clone = _Index.__new__(_Index)
+        clone.docs = dict(self.docs)
+        clone.postings = dict(self.postings)
+        clone.weights = dict(self.weights)
+        clone.order = dict(self.order)
+        clone.tokens = list(self.tokens)
+        clone._shared = set(self.postings)
+        return clone
+
+    def _own(self, token):
+        if token in self._shared:
+            self._shared.discard(token)
+            self.postings[token] = list(self.postings[token])
+            self.weights[token] = dict(self.weights[token])
+
+    def add(self, product_id, name, price, seller_id, seller_name, sort=True):
+        if product_id in self.docs:
+            self.remove(product_id)
+        # Decimal from the database, float from a form: results carry one type either way
+        price = round(float(price), 2)
+        weights = {}
+        for token in tokenize(name):
+            weights[token] = NAME_WEIGHT
+        for token in tokenize(seller_name):
+            weights[token] = weights.get(token, 0) + SELLER_WEIGHT
+        for token, weight in weights.items():
+            self._own(token)
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = []
+                self.weights[token] = {}
+                if sort:
+                    bisect.insort(self.tokens, token)
+            self.weights[token][product_id] = weight
+            entry = (-weight, len(name), product_id)
+            if sort:
+                bisect.insort(posting, entry)
+            else:
+                posting.append(entry)
+        self.docs[product_id] = (name, price, seller_id, seller_name, tuple(weights.items()))
+        self.order[product_id] = len(name) << 40 | product_id
+
+    def finish(self):
+        # After a bulk load with sort=False
+        for posting in self.postings.values():
+            posting.sort()
+        self.tokens = sorted(self.postings)
+
+    def remove(self, product_id):
+        doc = self.docs.pop(product_id, None)
+        if doc is None:
+            return
+        del self.order[product_id]
+        for token, weight in doc[4]:
+            self._own(token)
+            posting = self.postings[token]
+            entry = (-weight, len(doc[0]), product_id)
+            i = bisect.bisect_left(posting, entry)
+            if i < len(posting) and posting[i] == entry:
+                del posting[i]
+            self.weights[token].pop(product_id, None)
+            if not posting:
+                del self.postings[token]
+                del self.weights[token]
+                i = bisect.bisect_left(self.tokens, token)
+                if i < len(self.tokens) and self.tokens[i] == token:
+                    del self.tokens[i]
+
+    def expand(self, term):
+        """Return ``[(token, boost)]`` for vocabulary tokens matching ``term``."""
+        matches = [(term, 2)] if term in self.postings else []
+        if len(term) >= MIN_PREFIX:
+            i = bisect.bisect_right(self.tokens, term)
+            end = bisect.bisect_left(self.tokens, term + '\uffff', i, min(len(self.tokens), i + MAX_EXPANSIONS))
+            matches.extend((token, 1) for token in self.tokens[i:end])
+        return matches
+
+    def _stream(self, token, boost):
+        # Negated weights keep the merge ascending: best score first
+        for weight, length, pid in self.postings[token]:
+            yield weight * boost, length, pid
+
+    def _ranked(self, expansions):
+        # Every product matching one term, best score first, each once
+        seen = set()
+        for score, length, pid in heapq.merge(*(self._stream(token, boost) for token, boost in expansions)):
+            if pid not in seen:
+                seen.add(pid)
+                yield -score, length, pid
+
+    def _matching(self, expansions):
+        if len(expansions) == 1:
+            return self.weights[expansions[0][0]].keys()
+        return set().union(*(self.weights[token].keys() for token, _ in expansions))
+
+    def _term_scores(self, matches, expansions):
+        if len(expansions) == 1:
+            token, boost = expansions[0]
+            weights = self.weights[token]
+            return {pid: weights[pid] * boost for pid in matches}
+        scores = {}
+        for token, boost in expansions:
+            weights = self.weights[token]
+            for pid in matches & weights.keys():
+                score = weights[pid] * boost
+                if score > scores.get(pid, 0):
+                    scores[pid] = score
+        return scores
+
+    def _rank_all(self, matches, expanded, limit):
+        totals = self._term_scores(matches, expanded[0])
+        for expansions in expanded[1:]:
+            scores = self._term_scores(matches, expansions)
+            totals = {pid: total + scores[pid] for pid, total in totals.items()}
+        if len(totals) > limit:
+            cutoff = sorted(totals.values(), reverse=True)[limit - 1]
+            totals = {pid: total for pid, total in totals.items() if total >= cutoff}
+        # Two stable sorts with C-level keys: tie-break first, then score
+        ranked = sorted(totals, key=self.order.__getitem__)
+        ranked.sort(key=totals.__getitem__, reverse=True)
+        return [self._result(pid, totals[pid]) for pid in ranked[:limit]]
+
+    def _score(self, pid, expansions):
+        return max(self.weights[token].get(pid, 0) * boost for token, boost in expansions)
+
+    def _result(self, pid, score):
+        name, price, seller_id, seller_name, _ = self.docs[pid]
+        return {'id': pid, 'name': name, 'price': price, 'seller_id': seller_id,
+                'seller_name': seller_name, 'score': score}
+
+    def search(self, terms, limit):
+        expanded = [self.expand(term) for term in terms]
+        if not all(expanded):
+            return []
+
+        if len(expanded) == 1:
+            # Postings are already in rank order, so the first ``limit`` products are the answer
+            return [self._result(pid, score) for score, _, pid in itertools.islice(self._ranked(expanded[0]), limit)]
+
+        # Several terms: intersect the matching id sets (in C), then either score every match or walk
+        # the rarest term in rank order until nothing later can make the top, whichever reads less
+        expanded.sort(key=lambda expansions: sum(len(self.postings[token]) for token, _ in expansions))
+        matches = self._matching(expanded[0])
+        for expansions in expanded[1:]:
+            # Probe with the survivors rather than building the union of a broad term
+            matches = set().union(*(matches & self.weights[token].keys() for token, _ in expansions))
+            if not matches:
+                return []
+        driver, others = expanded[0], expanded[1:]
+        # The walk reads about limit * driver / matches products, scoring all of them reads matches
+        driver_size = sum(len(self.postings[token]) for token, _ in driver)
+        if limit * driver_size * WALK_BIAS >= len(matches) ** 2:
+            return self._rank_all(matches, expanded, limit)
+        others_max = sum(max(-self.postings[token][0][0] * boost for token, boost in expansions)
+                         for expansions in others)
+
+        top = []  # min-heap of (score, -len, -pid): the worst of the current top ``limit`` first
+        budget = len(matches) // WALK_BIAS
+        for steps, (score, length, pid) in enumerate(self._ranked(driver)):
+            if steps > budget:
+                # The bound is not closing (the other terms can still lift anyone); score outright
+                return self._rank_all(matches, expanded, limit)
+            if len(top) == limit:
+                worst_score, worst_len, worst_pid = top[0]
+                bound = score + others_max
+                # Later products score no more than this one and rank after it on ties
+                if bound < worst_score or (bound == worst_score and (length, pid) > (-worst_len, -worst_pid)):
+                    break
+            if pid not in matches:
+                continue
+            item = (score + sum(self._score(pid, expansions) for expansions in others), -length, -pid)
+            if len(top) < limit:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+        return [self._result(-neg_pid, score) for score, _, neg_pid in sorted(top, reverse=True)]
+
+
+class SearchIndex:
+
+    def __init__(self, pool, refresh_interval=300.0):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._index = None
+        self._stale = False
+        # Serialises writers (updates and the swap after a rebuild); queries never take it
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # Changes made while a rebuild is reading the table, replayed onto the new index
+        self._pending = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.builds = 0
+        self.last_build_ms = 0.0
+        self.built_at = None
+        self.searches = 0
+
+    # ---------------- BUILD ----------------
+    def _load(self):
+        index = _Index()
+        after = 0
+        with self.pool.connection() as conn:
+            while True:
+                rows = repository.fetch_all(repository.PRODUCTS_AFTER, (after, BUILD_BATCH_SIZE), conn=conn)
+                for row in rows:
+                    index.add(row.id, row.name, row.price, row.seller_id, row.seller_name, sort=False)
+                if len(rows) < BUILD_BATCH_SIZE:
+                    break
+                after = rows[-1].id
+        index.finish()
+        return index
+
+    def rebuild(self, force=True):
+        """Reload the whole index from the database and swap it in."""
+        with self._build_lock:
+            if not force and self._index is not None and not self._stale:
+                return
+            started = time.perf_counter()
+            with self._lock:
+                self._pending = []
+            try:
+                index = self._load()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for change in self._pending:
+                    change(index)
+                self._pending = None
+                self._index = index
+                self._stale = False
+            self.builds += 1
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+            self.built_at = time.monotonic()
+            logger.info("Search index rebuilt: %d products in %.0f ms", len(index.docs), self.last_build_ms)
+
+    def _ensure_built(self):
+        if self._index is None or self._stale:
+            self.rebuild(force=False)
+
+    def _run(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception("Search index rebuild failed")
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Build in the background now and keep rebuilding every ``refresh_interval`` seconds."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+        self._thread.start()
+
+    def refresh_soon(self):
+        # For changes too large to apply one by one, such as a bulk import
+        if self._thread is not None and self._thread.is_alive():
+            self._wakeup.set()
+        else:
+            self._stale = True
+
+    # ---------------- INCREMENTAL UPDATES ----------------
+    def _apply(self, change):
+        with self._lock:
+            if self._index is not None:
+                index = self._index.copy()
+                change(index)
+                self._index = index
+            if self._pending is not None:
+                self._pending.append(change)
+
+    def add_product(self, product_id, name, price, seller_id, seller_name):
+        self._apply(lambda index: index.add(product_id, name, price, seller_id, seller_name))
+
+    def remove_product(self, product_id):
+        self._apply(lambda index: index.remove(product_id))
+
+    # ---------------- QUERY ----------------
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self._ensure_built()
+        limit = max(1, min(limit, MAX_LIMIT))
+        with self._metrics_lock:
+            self.searches += 1
+        return self._index.search(terms, limit)
+
+    def stats(self):
+        index = self._index
+        return {
+            'ready': index is not None,
+            'products': len(index.docs) if index else 0,
+            'tokens': len(index.tokens) if index else 0,
+            'builds': self.builds,
+            'last_build_ms': round(self.last_build_ms, 1),
+            'age_seconds': round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+            'searches': self.searches,
+        }
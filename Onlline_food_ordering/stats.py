@@ -0,0 +1,133 @@
+"""Platform-wide counters for the admin dashboard.
+
+By default the counters come from a single query that counts all four
+tables at once.  With ``STATS_MODE=counters`` they are read from the small
+``platform_counters`` table (created by ``migrations.py``) instead, which
+writers keep up to date through ``adjust()`` on register/order/delete.
+Writes that bypass ``adjust()`` (scripts, manual fixes) would make them
+drift, so every ``STATS_RECONCILE_SECONDS`` one refresh recounts the
+tables and resets the counters.  Seed or repair that table by hand with::
+
+    python stats.py rebuild-counters
+
+Either way, results are cached for a few seconds and refreshed by a single
+caller at a time, so any number of polling dashboards cost one query per
+TTL.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from db import get_cursor, get_db
+
+MODE = os.environ.get('STATS_MODE', 'query')
+
+COUNTER_NAMES = ('total_sellers', 'total_buyers', 'total_products', 'total_orders')
+
+COUNT_QUERY = """
+    SELECT (SELECT COUNT(*) FROM sellers) AS total_sellers,
+           (SELECT COUNT(*) FROM buyers) AS total_buyers,
+           (SELECT COUNT(*) FROM products) AS total_products,
+           (SELECT COUNT(*) FROM orders) + (SELECT COUNT(*) FROM orders_archive) AS total_orders
+"""
+
+
+def adjust(cursor, name, delta=1):
+    # Call inside the writer's transaction; a no-op unless counters mode is on
+    if MODE != 'counters' or not delta:
+        return
+    cursor.execute("UPDATE platform_counters SET value = value + %s WHERE name = %s", (delta, name))
+
+
+def count_all(cursor):
+    cursor.execute(COUNT_QUERY)
+    row = cursor.fetchone()
+    return {name: int(row[name]) for name in COUNTER_NAMES}
+
+
+def rebuild_counters(conn):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    values = count_all(cursor)
+    # Row by row rather than delete-and-insert: several processes may reconcile at once
+    for name, value in values.items():
+        cursor.execute("UPDATE platform_counters SET value = %s WHERE name = %s", (value, name))
+        if not cursor.rowcount:
+            cursor.execute("SELECT 1 FROM platform_counters WHERE name = %s", (name,))
+            if not cursor.fetchall():
+                cursor.execute("INSERT INTO platform_counters (name, value) VALUES (%s, %s)", (name, value))
+    conn.commit()
+    return values
+
+
+class StatsProvider:
+
+    def __init__(self, ttl=5.0, mode=None, reconcile_every=3600.0):
+        self.ttl = ttl
+        self.mode = mode or MODE
+        self.reconcile_every = reconcile_every
+        self._snapshot = None  # (loaded_at, as_of, values)
+        self._reconciled_at = None
+        self._refresh_lock = threading.Lock()
+        self.refreshes = 0
+        self.reconciles = 0
+
+    def _fresh(self, snapshot):
+        return snapshot is not None and time.monotonic() - snapshot[0] < self.ttl
+
+    def _reconcile_due(self):
+        return self._reconciled_at is None or time.monotonic() - self._reconciled_at >= self.reconcile_every
+
+    def _load(self):
+        if self.mode == 'counters' and self._reconcile_due():
+            values = rebuild_counters(get_db())
+            self._reconciled_at = time.monotonic()
+            self.reconciles += 1
+            return values
+        cursor = get_cursor(readonly=True)
+        if self.mode == 'counters':
+            cursor.execute("SELECT name, value FROM platform_counters")
+            values = {row['name']: int(row['value']) for row in cursor.fetchall()}
+            if all(name in values for name in COUNTER_NAMES):
+                return values
+        return count_all(cursor)
+
+    def get(self):
+        """Return the counters plus ``as_of`` and ``age_seconds`` describing their staleness."""
+        snapshot = self._snapshot
+        if not self._fresh(snapshot):
+            # Single flight: one caller refreshes, concurrent callers wait for its result
+            with self._refresh_lock:
+                snapshot = self._snapshot
+                if not self._fresh(snapshot):
+                    snapshot = (time.monotonic(), datetime.now(), self._load())
+                    self._snapshot = snapshot
+                    self.refreshes += 1
+
+        loaded_at, as_of, values = snapshot
+        result = dict(values)
+        result['as_of'] = as_of.strftime('%Y-%m-%d %H:%M:%S')
+        result['age_seconds'] = round(time.monotonic() - loaded_at, 3)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the platform_counters table")
+    parser.add_argument('command', choices=['rebuild-counters'])
+    parser.add_argument('--sqlite', metavar='PATH', help="Run against a local SQLite database instead of MySQL")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from db import ConnectionPool, sqlite_connect
+        pool = ConnectionPool(sqlite_connect(args.sqlite), size=1, dialect='sqlite')
+    else:
+        from admin_panel import pool
+
+    with pool.connection() as conn:
+        values = rebuild_counters(conn)
+    print(f"✅ Counters rebuilt: {values}")
+
+
+if __name__ == '__main__':
+    main()
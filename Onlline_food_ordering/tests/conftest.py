@@ -0,0 +1,70 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+import migrations
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """A migrated SQLite stand-in holding one seller, buyer, product and order."""
+    pool = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'shop.db')), size=2, dialect='sqlite')
+    with pool.connection() as conn:
+        migrations.upgrade(conn, 'sqlite', log=lambda message: None)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO sellers (name, username, password) VALUES ('Kitchen', 'k', 'p')")
+        cursor.execute("INSERT INTO buyers (name, username, password) VALUES ('Buyer', 'b', 'p')")
+        cursor.execute("INSERT INTO products (name, price, seller_id) VALUES ('Dosa', 50, 1)")
+        cursor.execute("""
+            INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (1, 1, 'Placed', 'Street 1', '555', 'COD')
+        """)
+        conn.commit()
+    return pool
+
+
+def _use_pool(monkeypatch, module, pool):
+    # Point an app module at the test database for this test only
+    import cache
+
+    monkeypatch.setattr(module, 'pool', pool)
+    monkeypatch.setitem(module.app.extensions, 'db_pool', pool)
+    monkeypatch.setattr(cache.versions, 'pool', pool)
+    monkeypatch.setattr(cache.versions, '_known', {})
+    module.app.config['TESTING'] = True
+
+
+@pytest.fixture
+def admin(pool, monkeypatch):
+    """The admin panel module on the test database, with fresh caches."""
+    import admin_panel
+    from events import OrderFeed
+    from stats import StatsProvider
+
+    _use_pool(monkeypatch, admin_panel, pool)
+    monkeypatch.setattr(admin_panel, 'platform_stats', StatsProvider(ttl=0))
+    monkeypatch.setattr(admin_panel, 'order_feed', OrderFeed(pool))
+    return admin_panel
+
+
+@pytest.fixture
+def main(pool, monkeypatch):
+    """The customer app module on the test database, with fresh caches and search index."""
+    import app as main_module
+    import httpcache
+    from catalog import CatalogService
+    from events import OrderFeed
+    from identity import IdentityCache
+    from search import SearchIndex
+
+    _use_pool(monkeypatch, main_module, pool)
+    monkeypatch.setattr(main_module, 'catalog', CatalogService())
+    monkeypatch.setattr(main_module, 'identities', IdentityCache())
+    monkeypatch.setattr(main_module, 'pages', httpcache.PageCache())
+    monkeypatch.setattr(main_module, 'search_index', SearchIndex(pool))
+    monkeypatch.setattr(main_module, 'order_feed', OrderFeed(pool))
+    return main_module
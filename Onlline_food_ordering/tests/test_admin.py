@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+
+
+def test_orders_page_pages_by_id(admin, pool):
+    with pool.connection() as conn:
+        conn.cursor().executemany("""
+            INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (1, 1, 'Placed', %s, '555', 'COD')
+        """, [(f'Street {i}',) for i in range(2, 6)])
+        conn.commit()
+    client = admin.app.test_client()
+
+    first = client.get('/orders?limit=3')
+    assert first.status_code == 200
+    html = first.get_data(as_text=True)
+    assert '#5' in html and '#3' in html and '#2' not in html
+    assert '/orders?before=3' in html
+
+    older = client.get('/orders?before=3&limit=3').get_data(as_text=True)
+    assert '#2' in older and '#1' in older and '#3' not in older
+
+
+def test_export_streams_csv_and_ndjson(admin, pool):
+    with pool.connection() as conn:
+        conn.cursor().execute("""
+            INSERT INTO orders_archive (id, buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (100, 1, 1, 'Delivered', 'Old street', '555', 'COD')
+        """)
+        conn.commit()
+    client = admin.app.test_client()
+
+    rows = list(csv.DictReader(io.StringIO(client.get('/orders/export?format=csv').get_data(as_text=True))))
+    assert [(row['id'], row['product_name'], row['seller_name']) for row in rows] == [('1', 'Dosa', 'Kitchen')]
+
+    lines = client.get('/orders/export?format=ndjson&include_archive=1').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 100]
+
+    assert client.get('/orders/export?format=xml').status_code == 400
+    assert client.get('/orders/export?since=yesterday').status_code == 400
+
+
+def test_routes_page_lists_routes_with_timings(admin, monkeypatch):
+    monkeypatch.setattr(admin, 'fetch_main_app_timings', lambda: {'/buyer/<buyer_id>': {
+        'count': 3, 'errors': 0, 'p50_ms': 1.5, 'p95_ms': 2.5, 'p99_ms': 9.0, 'avg_queries': 2, 'avg_db_ms': 0.4}})
+    client = admin.app.test_client()
+
+    response = client.get('/routes')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert '/delete-product/&lt;product_id&gt;' in html
+    assert '1.5 / 2.5 / 9.0 ms' in html
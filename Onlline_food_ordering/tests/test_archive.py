@@ -0,0 +1,33 @@
+import archive
+
+
+def test_old_orders_after_a_new_one_are_archived(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        # Order 1 is new; the ones after it were created long ago
+        for created_at in ('2020-01-01 00:00:00', '2020-02-01 00:00:00', '2020-03-01 00:00:00'):
+            cursor.execute("""
+                INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method, created_at)
+                VALUES (1, 1, 'Delivered', 'Street 1', '555', 'COD', %s)
+            """, (created_at,))
+        conn.commit()
+
+        assert archive.run(conn, retention_days=90, batch_size=2, log=lambda message: None) == 3
+        assert archive.status(conn) == {'live_orders': 1, 'archived_orders': 3, 'resume_after_id': None}
+
+
+def test_product_with_only_archived_orders_can_be_deleted(admin, pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("UPDATE orders SET status = 'Delivered', created_at = '2020-01-01 00:00:00'")
+        conn.commit()
+        assert archive.run(conn, retention_days=90, log=lambda message: None) == 1
+
+    assert admin.app.test_client().get('/delete-product/1').status_code == 302
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("SELECT COUNT(*) AS n FROM products")
+        assert cursor.fetchone()['n'] == 0
+        # The archived order stays as history
+        cursor.execute("SELECT product_id FROM orders_archive")
+        assert cursor.fetchone()['product_id'] == 1
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pytest
+
+import db
+import migrations
+from bench import seed
+
+
+def _seeded(path, **kwargs):
+    pool = db.ConnectionPool(db.sqlite_connect(str(path)), size=1, dialect='sqlite')
+    with pool.connection() as conn:
+        migrations.upgrade(conn, 'sqlite', log=lambda message: None)
+        seed.seed(conn, sellers=3, buyers=5, products=20, orders=50, days=30, seed=7,
+                  until=date(2024, 6, 30), log=lambda message: None, **kwargs)
+        cursor = conn.cursor()
+        tables = {}
+        for table in ('sellers', 'buyers', 'products', 'orders'):
+            cursor.execute(f"SELECT * FROM {table} ORDER BY id")
+            tables[table] = [tuple(row) for row in cursor.fetchall()]
+    return pool, tables
+
+
+def test_same_seed_writes_the_same_rows(tmp_path):
+    _, first = _seeded(tmp_path / 'a.db')
+    _, second = _seeded(tmp_path / 'b.db')
+    assert first == second
+
+
+def test_seeding_twice_with_one_seed_is_refused(tmp_path):
+    pool, _ = _seeded(tmp_path / 'a.db')
+    with pool.connection() as conn, pytest.raises(ValueError):
+        seed.seed(conn, sellers=3, buyers=5, products=20, orders=50, seed=7, log=lambda message: None)
+
+
+def test_use_pool_repoints_the_pool_metrics(admin, pool, tmp_path, monkeypatch):
+    from bench import run
+
+    other = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'other.db')), size=3, dialect='sqlite')
+    metrics = admin.app.extensions['metrics']
+    monkeypatch.setattr(metrics, 'collectors', list(metrics.collectors))
+    for name in run.POOL_USERS:
+        if getattr(admin, name, None) is not None:
+            monkeypatch.setattr(getattr(admin, name), 'pool', getattr(admin, name).pool)
+
+    run.use_pool(admin, other)
+    assert [collect for name, collect in metrics.collectors if name == 'db_pool'] == [other.stats]
@@ -0,0 +1,24 @@
+from cache import VersionStamps
+
+
+def test_version_stamps_are_shared_through_the_database(pool):
+    # Two hosts on one database; the second one rereads on every call
+    here, there = VersionStamps(pool), VersionStamps(pool, max_age=0)
+    assert here.current('catalog') == there.current('catalog') == 0
+
+    version = here.bump('catalog')
+    assert here.current('catalog') == there.current('catalog') == version
+
+    # A host whose clock is behind still moves the stamp forward
+    with pool.connection() as conn:
+        conn.cursor().execute("UPDATE cache_versions SET version = version + %s", (10**15,))
+        conn.commit()
+    ahead = there.current('catalog')
+    assert there.bump('catalog') == ahead + 1
+
+
+def test_version_stamps_without_a_database():
+    stamps = VersionStamps()
+    first = stamps.bump('catalog')
+    assert stamps.current('catalog') == first
+    assert stamps.bump('catalog') > first
@@ -0,0 +1,26 @@
+def _add_products(pool, count):
+    with pool.connection() as conn:
+        conn.cursor().executemany("INSERT INTO products (name, price, seller_id) VALUES (%s, 10, 1)",
+                                  [(f'Dish {i}',) for i in range(count)])
+        conn.commit()
+
+
+def test_pages_follow_product_ids(main, pool):
+    _add_products(pool, 4)
+    with main.app.test_request_context():
+        products, next_after = main.catalog.page(after=0, limit=2)
+        assert [p['id'] for p in products] == [1, 2] and next_after == 2
+        products, next_after = main.catalog.page(after=4, limit=2)
+        assert [p['id'] for p in products] == [5] and next_after is None
+        assert products[0]['seller_name'] == 'Kitchen'
+
+
+def test_pages_are_cached_until_the_catalog_changes(main, pool):
+    with main.app.test_request_context():
+        main.catalog.page()
+        _add_products(pool, 1)
+        assert len(main.catalog.page()[0]) == 1
+        assert main.catalog.stats()['hits'] == 1
+
+        main.catalog.invalidate()
+        assert len(main.catalog.page()[0]) == 2
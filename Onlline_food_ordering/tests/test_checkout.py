@@ -0,0 +1,66 @@
+import checkout
+
+
+def _login(client):
+    with client.session_transaction() as session:
+        session['buyer_id'], session['buyer_name'] = 1, 'Buyer'
+
+
+def _flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def test_adding_a_product_twice_says_it_is_already_in_the_cart(main):
+    client = main.app.test_client()
+    _login(client)
+
+    client.post('/buyer/1/cart/add/1')
+    assert _flashes(client) == ["🛒 Added to cart!"]
+    client.post('/buyer/1/cart/add/1')
+    assert _flashes(client) == ["🛒 Already in your cart"]
+    with client.session_transaction() as session:
+        assert session['cart'] == [1]
+
+
+def test_cart_is_capped():
+    session = {'cart': list(range(checkout.MAX_CART_ITEMS))}
+    assert checkout.add_to_cart(session, -1) == checkout.CART_FULL
+    assert checkout.add_to_cart(session, 0) == checkout.ALREADY_IN_CART
+
+
+def test_checkout_writes_one_header_and_a_row_per_item(main, pool):
+    with pool.connection() as conn:
+        conn.cursor().execute("INSERT INTO products (name, price, seller_id) VALUES ('Idli', 30.5, 1)")
+        conn.commit()
+    client = main.app.test_client()
+    _login(client)
+    client.post('/buyer/1/cart/add/1')
+    client.post('/buyer/1/cart/add/2')
+
+    response = client.post('/buyer/1/checkout', data={'address': 'Street 9', 'mobile': '555', 'payment_method': 'UPI'})
+    assert response.status_code == 302
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("SELECT id, item_count, total FROM checkouts")
+        header = cursor.fetchone()
+        assert (header['item_count'], float(header['total'])) == (2, 80.5)
+        cursor.execute("SELECT product_id FROM orders WHERE checkout_id = %s ORDER BY product_id", (header['id'],))
+        assert [row['product_id'] for row in cursor.fetchall()] == [1, 2]
+    with client.session_transaction() as session:
+        assert 'cart' not in session
+
+
+def test_deleted_products_are_dropped_before_checkout(main, pool):
+    client = main.app.test_client()
+    _login(client)
+    client.post('/buyer/1/cart/add/1')
+    client.post('/buyer/1/cart/add/99')
+
+    client.post('/buyer/1/checkout', data={'address': 'Street 9', 'mobile': '555', 'payment_method': 'UPI'})
+    with client.session_transaction() as session:
+        assert session['cart'] == [1]
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM checkouts")
+        assert cursor.fetchone()[0] == 0
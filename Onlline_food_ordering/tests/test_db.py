@@ -0,0 +1,67 @@
+import pytest
+
+import db
+
+
+class ReconnectingConnection(db.SQLiteConnection):
+    # Like mysql-connector: a reconnect shows as a new connection_id
+    connection_id = 1
+    reconnect_on_ping = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        super().ping()
+        if reconnect and self.reconnect_on_ping:
+            self.connection_id += 1
+
+
+def checked_out_statement(pool):
+    conn = pool.acquire()
+    conn.prepared('order by id')
+    cursor = conn.statements['order by id']
+    pool.release(conn)
+    return conn, cursor
+
+
+def test_ping_keeps_prepared_statements_of_a_live_session(tmp_path):
+    pool = db.ConnectionPool(lambda: ReconnectingConnection(str(tmp_path / 'shop.db')), size=1, ping_after=0)
+    conn, cursor = checked_out_statement(pool)
+
+    assert pool.acquire() is conn
+    assert conn.statements == {'order by id': cursor}
+
+
+def test_reconnect_closes_prepared_statements(tmp_path):
+    pool = db.ConnectionPool(lambda: ReconnectingConnection(str(tmp_path / 'shop.db')), size=1, ping_after=0)
+    conn, cursor = checked_out_statement(pool)
+    conn.raw.reconnect_on_ping = True
+
+    assert pool.acquire() is conn
+    assert conn.statements == {}
+    with pytest.raises(Exception, match='closed cursor'):
+        cursor.fetchall()
+
+
+def test_pool_is_bounded_and_times_out(tmp_path):
+    pool = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'shop.db')), size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(db.PoolTimeout):
+        pool.acquire()
+    pool.release(conn)
+
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert (stats['opened'], stats['in_use'], stats['checkouts'], stats['timeouts']) == (1, 1, 2, 1)
+
+
+def test_released_connections_roll_back_open_transactions(tmp_path):
+    pool = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'shop.db')), size=1)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE notes (body TEXT)")
+        conn.commit()
+        cursor.execute("INSERT INTO notes (body) VALUES ('never committed')")
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM notes")
+        assert cursor.fetchone()[0] == 0
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import events
+import rollup
+
+
+def test_status_changes_reach_every_feed(pool):
+    # Two workers' feeds on one database; the change is made by neither of them
+    feeds = [events.OrderFeed(pool), events.OrderFeed(pool)]
+    for feed in feeds:
+        feed.poll()
+
+    with pool.connection() as conn:
+        rollup.change_order_status(conn.cursor(dictionary=True, buffered=True), 1, 'Cooking')
+        conn.commit()
+
+    for feed in feeds:
+        feed.poll()
+        (_, kind, seller_id, payload), = feed._events
+        assert (kind, seller_id) == ('status', 1)
+        assert json.loads(payload) == {'id': 1, 'status': 'Cooking', 'seller_id': 1, 'buyer_id': 1}
+        assert feed.recent(1)[0]['status'] == 'Cooking'
+
+
+def test_open_streams_are_capped(pool):
+    feed = events.OrderFeed(pool, max_streams=1)
+    first = feed.stream(max_seconds=0)
+    with pytest.raises(events.StreamsFull):
+        feed.stream(max_seconds=0)
+    assert list(first) == [f'retry: {events.RETRY_MS}\n\n']
+    assert list(feed.stream(max_seconds=0))
+    assert feed.stats()['open_streams'] == 0
+    assert feed.stats()['rejected_streams'] == 1
+
+
+def _place_orders(pool, count):
+    with pool.connection() as conn:
+        conn.cursor().executemany("""
+            INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (1, 1, 'Placed', %s, '555', 'COD')
+        """, [(f'Street {i}',) for i in range(count)])
+        conn.commit()
+
+
+def _events(messages):
+    return [(m.split('\n')[0][4:], m.split('\n')[1][7:]) for m in messages if m.startswith('id: ')]
+
+
+def test_event_ids_are_the_same_in_every_feed(pool):
+    feeds = [events.OrderFeed(pool), events.OrderFeed(pool)]
+    for feed in feeds:
+        feed.poll()
+    _place_orders(pool, 1)
+    with pool.connection() as conn:
+        rollup.change_order_status(conn.cursor(dictionary=True, buffered=True), 2, 'Cooking')
+        conn.commit()
+
+    for feed in feeds:
+        feed.poll()
+    assert [event[:2] for event in feeds[0]._events] == [event[:2] for event in feeds[1]._events] == [
+        ((2, 0), 'order'), ((2, 1), 'status')]
+
+    # A client that saw the order on one worker gets just the status change from the other
+    assert _events(feeds[1].stream('2-0', max_seconds=0.05, heartbeat=0.01)) == [('2-1', 'status')]
+
+
+def test_resuming_before_the_buffer_reads_the_tables(pool):
+    feed = events.OrderFeed(pool, size=2)
+    feed.poll()
+    _place_orders(pool, 2)
+    with pool.connection() as conn:
+        rollup.change_order_status(conn.cursor(dictionary=True, buffered=True), 1, 'Cooking')
+        conn.commit()
+    feed.poll()
+    assert len(feed._events) == 2  # the first new order was pushed out
+
+    assert _events(feed.stream('1-0', max_seconds=0)) == [('2-0', 'order'), ('3-0', 'order'), ('3-1', 'status')]
+    # Too far behind to read back within the buffer size
+    _place_orders(pool, 3)
+    feed.poll()
+    assert _events(feed.stream('1-0', max_seconds=0)) == [('6-1', 'reset')]
+
+
+def test_busy_streams_answer_200_with_a_retry(admin, monkeypatch):
+    monkeypatch.setattr(admin.order_feed, 'max_streams', 0)
+    response = admin.app.test_client().get('/api/orders/stream')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == f'retry: {events.BUSY_RETRY_MS}\n\n'
@@ -0,0 +1,41 @@
+import config
+import db
+import factory
+
+
+def _broken():
+    raise ConnectionError("database is down")
+
+
+def test_healthz_reports_the_database_and_boot(admin):
+    response = admin.app.test_client().get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ok'
+
+
+def test_app_starts_and_warms_up_with_the_database_down(admin, monkeypatch):
+    broken = db.ConnectionPool(_broken, size=1, timeout=0.05)
+    monkeypatch.setitem(admin.app.extensions, 'db_pool', broken)
+    monkeypatch.setitem(admin.app.extensions, 'warm_up', [])
+    monkeypatch.setitem(admin.app.extensions, 'boot', dict(admin.app.extensions['boot']))
+
+    response = admin.app.test_client().get('/healthz')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'database is down'
+
+    factory._warm_up(admin.app, 1)
+    boot = admin.app.extensions['boot']
+    assert boot['warmed_up'] is False
+    assert boot['warm_up_errors'] == ['db_pool: database is down']
+
+
+def test_admin_settings_fall_back_to_the_shared_ones(monkeypatch):
+    monkeypatch.setenv('DB_HOST', 'primary')
+    monkeypatch.setenv('DB_NAME', 'shop')
+    monkeypatch.setenv('ADMIN_DB_NAME', 'shop_admin')
+    monkeypatch.delenv('DB_SSL', raising=False)
+    monkeypatch.delenv('DB_SSL_CA', raising=False)
+
+    settings = config.database('ADMIN_')
+    assert (settings['host'], settings['database']) == ('primary', 'shop_admin')
+    assert 'ssl_ca' not in settings
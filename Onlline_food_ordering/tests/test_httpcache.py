@@ -0,0 +1,32 @@
+import httpcache
+
+
+def test_home_page_revalidates_with_its_etag(main):
+    client = main.app.test_client()
+
+    first = client.get('/')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == f'public, max-age={main.STATIC_MAX_AGE}'
+    assert 'Register as Seller' in first.get_data(as_text=True)
+
+    again = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert main.pages.stats()['not_modified'] == 1
+
+
+def test_dashboard_etag_changes_when_the_catalog_is_touched(main):
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session['buyer_id'], session['buyer_name'] = 1, 'Buyer'
+
+    first = client.get('/buyer/1')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag = first.headers['ETag']
+    assert client.get('/buyer/1', headers={'If-None-Match': etag}).status_code == 304
+
+    with main.app.app_context():
+        httpcache.touch(httpcache.CATALOG)
+    changed = client.get('/buyer/1', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
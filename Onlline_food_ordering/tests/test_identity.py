@@ -0,0 +1,24 @@
+from identity import invalidate_identities
+
+
+def test_lookups_are_cached_under_id_and_username(main, pool):
+    identities = main.identities
+    with main.app.test_request_context():
+        assert identities.authenticate('buyer', 'b', 'p')['name'] == 'Buyer'
+        assert identities.buyer(1)['username'] == 'b'
+        assert identities.stats()['hits'] == 1
+        assert identities.authenticate('buyer', 'b', 'wrong') is None
+        assert identities.authenticate('seller', 'nobody', 'p') is None
+
+
+def test_invalidation_drops_cached_profiles(main, pool):
+    identities = main.identities
+    with main.app.test_request_context():
+        assert identities.seller(1)['name'] == 'Kitchen'
+        with pool.connection() as conn:
+            conn.cursor().execute("UPDATE sellers SET name = 'Kitchen 2' WHERE id = 1")
+            conn.commit()
+        assert identities.seller(1)['name'] == 'Kitchen'
+
+        invalidate_identities()
+        assert identities.seller(1)['name'] == 'Kitchen 2'
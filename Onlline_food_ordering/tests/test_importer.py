@@ -0,0 +1,67 @@
+import csv
+import io
+
+import importer
+
+
+def product_names(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM products ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def run_import(pool, data, fmt, batch_size=2):
+    with pool.connection() as conn:
+        return importer.import_products(conn, 1, importer.read_rows(io.BytesIO(data), fmt), batch_size=batch_size)
+
+
+def test_csv_rows_are_validated_and_batched(pool):
+    report = run_import(pool, b'name,price\nIdli,30\n,10\nVada,abc\nUpma,40\nPoha,25\n', 'csv')
+    assert (report['received'], report['inserted'], report['rejected'], report['batches']) == (5, 3, 2, 2)
+    assert [error['row'] for error in report['errors']] == [3, 4]
+    assert report['committed_through_row'] == 6
+    assert product_names(pool) == ['Dosa', 'Idli', 'Upma', 'Poha']
+
+
+def test_ndjson_is_read_line_by_line(pool):
+    report = run_import(pool, b'{"name": "Idli", "price": 30}\n\n{"name": "Vada", "price": "12.5"}\n', 'ndjson')
+    assert report['inserted'] == 2 and 'error' not in report
+
+
+def test_malformed_file_keeps_the_rows_before_it(pool):
+    report = run_import(pool, b'name,price\nIdli,30\nVada,20\nUpma,40\nPoha,\xff\n', 'csv')
+    assert report['stopped_at_row'] == 5 and 'UTF-8' in report['error']
+    assert report['inserted'] == 3 and report['committed_through_row'] == 4
+
+    report = run_import(pool, b'{"name": "Kesari", "price": 30}\n{"name": \n', 'ndjson')
+    assert (report['stopped_at_row'], report['inserted']) == (2, 1)
+    assert product_names(pool)[-1] == 'Kesari'
+
+
+def test_csv_errors_name_the_row(pool):
+    limit = csv.field_size_limit(10)
+    try:
+        report = run_import(pool, b'name,price\nIdli,30\nVada,20\n' + b'x' * 20 + b',40\n', 'csv')
+    finally:
+        csv.field_size_limit(limit)
+    assert (report['stopped_at_row'], report['inserted']) == (4, 2)
+    assert 'malformed CSV' in report['error']
+
+
+def test_large_json_documents_are_refused(pool, monkeypatch):
+    monkeypatch.setattr(importer, 'MAX_JSON_BYTES', 10)
+    report = run_import(pool, b'[{"name": "Idli", "price": 30}]', 'json')
+    assert 'NDJSON' in report['error'] and report['inserted'] == 0
+
+
+def test_import_route_answers_400_with_the_report(main):
+    client = main.app.test_client()
+    response = client.post('/seller/1/import', data={'file': (io.BytesIO(b'name,price\nIdli,30\nVada,\xff\n'), 'menu.csv')})
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == 1
+
+    response = client.post('/seller/1/import', data=b'{"name": "Upma", "price": 40}\n',
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.get_json()['inserted'] == 1
+    assert client.post('/seller/1/import', data={'file': (io.BytesIO(b''), 'menu.xml')}).status_code == 400
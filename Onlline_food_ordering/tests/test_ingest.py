@@ -0,0 +1,35 @@
+import ingest
+
+
+def test_rejected_order_is_dead_lettered(pool, tmp_path):
+    queue = ingest.OrderQueue(str(tmp_path / 'queue.db'), pool)
+    queue.submit(1, 99, 50, 'Street 1', '555', 'COD')  # no such product
+    queue.submit(1, 1, 50, 'Street 2', '555', 'COD')
+
+    queue.close()  # stops the worker submit() started and flushes what is left
+    assert queue.depth() == 0
+    stats = queue.stats()
+    assert stats['dead_lettered'] == stats['dead_letters'] == 1
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT product_id, address FROM orders ORDER BY id")
+        assert [tuple(row) for row in cursor.fetchall()] == [(1, 'Street 1'), (1, 'Street 2')]
+
+
+def test_redelivered_order_is_not_placed_twice(pool, tmp_path, monkeypatch):
+    queue = ingest.OrderQueue(str(tmp_path / 'queue.db'), pool)
+    monkeypatch.setattr(queue, 'start', lambda: None)
+    queue.submit(1, 1, 50, 'Street 2', '555', 'COD')
+
+    # The batch commits remotely, then the worker dies before taking it off the queue
+    queue._commit(queue._claim())
+    monkeypatch.setattr(ingest, 'CLAIM_TIMEOUT', -1)
+    assert queue.flush_once() == 1
+
+    assert queue.depth() == 0
+    assert queue.stats()['duplicates'] == 1
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM orders WHERE address = 'Street 2'")
+        assert cursor.fetchone()[0] == 1
+    queue.close()
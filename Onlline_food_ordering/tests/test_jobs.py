@@ -0,0 +1,54 @@
+import pytest
+
+import db
+import jobs
+
+
+@pytest.fixture
+def runner(pool, tmp_path):
+    return jobs.JobRunner(pool, db.sqlite_connect(str(tmp_path / 'shop.db')), max_running=1, max_pending=2)
+
+
+def test_reports_must_implement_add_and_rows():
+    with pytest.raises(TypeError):
+        jobs.Report()
+
+    class Partial(jobs.Report):
+        def add(self, row):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_identical_jobs_are_queued_once_and_pending_jobs_are_capped(runner):
+    assert runner.enqueue('seller_totals', {})[1] is True
+    assert runner.enqueue('seller_totals', {'days': ''}) == (1, False)
+    runner.enqueue('seller_totals', {'days': '7'})
+    with pytest.raises(jobs.JobsBusy):
+        runner.enqueue('daily_seller_revenue', {})
+    with pytest.raises(ValueError):
+        runner.enqueue('nonsense', {})
+
+
+def test_claims_stop_at_max_running(runner, pool):
+    runner.enqueue('seller_totals', {})
+    runner.enqueue('daily_seller_revenue', {})
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        job_id, token = runner._claim(cursor, max_running=1)
+        conn.commit()
+        assert job_id == 1 and token
+        assert runner._claim(cursor, max_running=1) == (None, None)
+        assert runner._claim(cursor)[0] == 2
+        conn.commit()
+
+
+def test_jobs_run_to_a_result(runner, pool, tmp_path):
+    job_id, _ = runner.enqueue('seller_totals', {})
+    assert jobs.run_pending(pool, runner.connect, log=lambda message: None) == 1
+
+    job = runner.get(job_id)
+    assert (job['status'], job['progress']) == (jobs.DONE, 1.0)
+    assert job['result']['columns'] == list(jobs.SellerTotals.columns)
+    assert [row[:3] for row in job['result']['rows']] == [[1, 'Kitchen', 1]]
@@ -0,0 +1,33 @@
+import db
+import migrations
+
+
+def test_readme_schema_gets_order_timestamps(tmp_path):
+    pool = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'readme.db')), size=1, dialect='sqlite')
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        # The orders table as the README creates it, with one order placed before migrating
+        cursor.execute("""
+            CREATE TABLE orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                buyer_id INT,
+                product_id INT,
+                status VARCHAR(50) DEFAULT 'Placed',
+                address TEXT NOT NULL,
+                mobile VARCHAR(20) NOT NULL,
+                payment_method VARCHAR(50) NOT NULL
+            )
+        """)
+        cursor.execute("INSERT INTO orders (address, mobile, payment_method) VALUES ('Street 1', '555', 'COD')")
+        conn.commit()
+
+        migrations.upgrade(conn, 'sqlite', log=lambda message: None)
+        cursor.execute("INSERT INTO orders (address, mobile, payment_method) VALUES ('Street 2', '555', 'COD')")
+        cursor.execute("SELECT created_at FROM orders ORDER BY id")
+        assert all(row['created_at'] for row in cursor.fetchall())
+
+
+def test_upgrade_is_idempotent(pool):
+    with pool.connection() as conn:
+        assert migrations.upgrade(conn, 'sqlite', log=lambda message: None) == []
+        assert migrations.check(conn, 'sqlite', log=lambda message: None) == 0
@@ -0,0 +1,29 @@
+import pytest
+
+import repository
+
+
+def test_records_convert_to_dicts(pool):
+    with pool.connection() as conn:
+        row = repository.fetch_one(repository.RECENT_ORDERS, (10,), conn=conn)
+
+    as_dict = dict(row.items())
+    assert as_dict['id'] == 1
+    assert as_dict['product_name'] == 'Dosa'
+    assert as_dict['seller_name'] == 'Kitchen'
+    assert list(row.keys()) == list(as_dict)
+    assert row['status'] == row.status == 'Placed'
+    assert row.get('missing', 'default') == 'default'
+
+
+def test_mapping_reads_see_columns_only():
+    row = repository.record_type(('id', 'COUNT(*)', 'count', 'id'))._make((1, 7, 3, 2))
+
+    assert row['COUNT(*)'] == 7
+    assert row['count'] == row.get('count') == 3
+    # The last duplicate wins, as in a dictionary cursor
+    assert row['id'] == row.get('id') == 2
+    assert row.get('index') is None
+    assert list(row.keys()) == ['id', 'COUNT(*)', 'count', 'id']
+    with pytest.raises(KeyError):
+        row['index']
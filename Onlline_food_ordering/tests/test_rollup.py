@@ -0,0 +1,41 @@
+import pytest
+
+import rollup
+
+
+def _sales(cursor):
+    cursor.execute("SELECT order_count, revenue FROM product_sales_rollup WHERE product_id = 1")
+    row = cursor.fetchone()
+    return row['order_count'], float(row['revenue'])
+
+
+def test_rebuild_and_status_changes_keep_the_rollup_in_step(pool):
+    with pool.connection() as conn:
+        rollup.rebuild(conn, log=lambda message: None)
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        assert _sales(cursor) == (1, 50.0)
+
+        assert rollup.change_order_status(cursor, 1, 'Cancelled')['status'] == 'Placed'
+        assert _sales(cursor) == (0, 0.0)
+        # Already cancelled: nothing changes, the delta is not applied twice
+        rollup.change_orders_status(cursor, [1], 'Cancelled', seller_id=1)
+        assert _sales(cursor) == (0, 0.0)
+        rollup.change_orders_status(cursor, [1], 'Delivered', seller_id=1)
+        assert _sales(cursor) == (1, 50.0)
+
+
+def test_unknown_statuses_are_refused(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        with pytest.raises(ValueError):
+            rollup.change_order_status(cursor, 1, 'Lost')
+        with pytest.raises(ValueError):
+            rollup.change_orders_status(cursor, [1], 'Lost', seller_id=1)
+        cursor.execute("SELECT status FROM orders WHERE id = 1")
+        assert cursor.fetchone()['status'] == 'Placed'
+
+
+def test_other_sellers_orders_are_not_found(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        assert rollup.change_order_status(cursor, 1, 'Cooking', seller_id=2) is False
@@ -0,0 +1,50 @@
+from flask import Flask, g, jsonify
+
+import db
+
+
+class BrokenPool:
+
+    def acquire(self):
+        raise db.PoolTimeout("replica down")
+
+
+def _app(tmp_path, replica):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    primary = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'primary.db')), size=2, dialect='sqlite')
+    db.init_app(app, primary, replicas=[replica], pin_seconds=60)
+
+    @app.route('/read')
+    def read():
+        conn = db.get_db(readonly=True)
+        return jsonify(on_replica=conn is not g.get('db_conn'))
+
+    @app.route('/write')
+    def write():
+        db.get_db().commit()
+        return ''
+
+    return app
+
+
+def test_reads_go_to_the_replica_until_this_session_writes(tmp_path):
+    replica = db.ConnectionPool(db.sqlite_connect(str(tmp_path / 'replica.db')), size=2, dialect='sqlite')
+    app = _app(tmp_path, replica)
+    client = app.test_client()
+
+    assert client.get('/read').get_json() == {'on_replica': True}
+    client.get('/write')
+    # Read-your-writes: this session is pinned to the primary for pin_seconds
+    assert client.get('/read').get_json() == {'on_replica': False}
+    assert app.test_client().get('/read').get_json() == {'on_replica': True}
+
+    stats = app.extensions['db_router'].stats()
+    assert (stats['replica_reads'], stats['pinned_reads']) == (2, 1)
+    assert replica.stats()['in_use'] == 0
+
+
+def test_unavailable_replica_falls_back_to_the_primary(tmp_path):
+    app = _app(tmp_path, BrokenPool())
+    assert app.test_client().get('/read').get_json() == {'on_replica': False}
+    assert app.extensions['db_router'].stats()['fallbacks'] == 1
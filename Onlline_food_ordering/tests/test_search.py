@@ -0,0 +1,30 @@
+from search import SearchIndex
+
+
+def test_prices_are_floats_from_the_database_and_from_updates(pool):
+    index = SearchIndex(pool)
+    index.rebuild()
+    index.add_product(2, 'Masala Dosa', '65.5', 1, 'Kitchen')
+    results = index.search('dosa')
+    assert [(r['name'], r['price']) for r in results] == [('Dosa', 50.0), ('Masala Dosa', 65.5)]
+    assert all(type(r['price']) is float for r in results)
+
+
+def test_updates_leave_the_index_a_query_holds_unchanged(pool):
+    index = SearchIndex(pool)
+    index.rebuild()
+    before = index._index
+
+    index.add_product(2, 'Dosa Special', 70, 1, 'Kitchen')
+    index.remove_product(1)
+
+    assert [r['id'] for r in before.search(['dosa'], 10)] == [1]
+    assert [r['id'] for r in index.search('dosa')] == [2]
+    assert index.search('kitchen')[0]['id'] == 2
+
+
+def test_multi_term_queries_rank_name_matches_first(pool):
+    index = SearchIndex(pool)
+    index.rebuild()
+    index.add_product(2, 'Kitchen Dosa', 60, 1, 'Kitchen')
+    assert [r['id'] for r in index.search('kitchen dosa')] == [2, 1]
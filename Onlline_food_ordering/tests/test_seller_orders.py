@@ -0,0 +1,35 @@
+def _add_orders(pool, statuses):
+    with pool.connection() as conn:
+        conn.cursor().executemany("""
+            INSERT INTO orders (buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (1, 1, %s, 'Street 1', '555', 'COD')
+        """, [(status,) for status in statuses])
+        conn.commit()
+
+
+def test_order_queue_filters_by_status_and_pages_by_id(main, pool):
+    _add_orders(pool, ['Cooking', 'Placed', 'Cooking'])
+    client = main.app.test_client()
+
+    html = client.get('/seller/1/orders?status=Cooking&limit=1').get_data(as_text=True)
+    assert '#4' in html and '#2' not in html
+    assert 'before=4' in html
+    html = client.get('/seller/1/orders?status=Cooking&before=4').get_data(as_text=True)
+    assert '#2' in html and '#4' not in html and '#3' not in html
+
+
+def test_bulk_update_moves_only_this_sellers_orders(main, pool):
+    _add_orders(pool, ['Placed'])
+    client = main.app.test_client()
+
+    client.post('/seller/1/orders/bulk-update', data={'status': 'Delivered', 'order_ids': ['1', '2', '99']})
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][1] == "✅ 2 order(s) moved to Delivered; 1 not found among your orders"
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status FROM orders ORDER BY id")
+        assert [row[0] for row in cursor.fetchall()] == ['Delivered', 'Delivered']
+
+    client.post('/seller/1/orders/bulk-update', data={'status': 'Lost', 'order_ids': ['1']})
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][1] == "Unknown status 'Lost'"
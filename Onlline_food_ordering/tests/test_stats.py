@@ -0,0 +1,42 @@
+from flask import Flask
+
+import db
+import stats
+
+
+def make_app(pool):
+    app = Flask(__name__)
+    db.init_app(app, pool)
+    return app
+
+
+def test_query_mode_counts_archived_orders(pool):
+    with pool.connection() as conn:
+        conn.cursor().execute("""
+            INSERT INTO orders_archive (id, buyer_id, product_id, status, address, mobile, payment_method)
+            VALUES (100, 1, 1, 'Delivered', 'Street 1', '555', 'COD')
+        """)
+        conn.commit()
+
+    with make_app(pool).app_context():
+        counters = stats.StatsProvider(mode='query').get()
+    assert (counters['total_sellers'], counters['total_buyers'], counters['total_products'],
+            counters['total_orders']) == (1, 1, 1, 2)
+
+
+def test_counters_mode_reconciles_drifted_counters(pool, monkeypatch):
+    monkeypatch.setattr(stats, 'MODE', 'counters')
+    provider = stats.StatsProvider(ttl=0, mode='counters', reconcile_every=3600)
+    with make_app(pool).app_context():
+        assert provider.get()['total_orders'] == 1
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            stats.adjust(cursor, 'total_orders', 2)
+            # A delete that bypasses adjust()
+            cursor.execute("DELETE FROM orders")
+            conn.commit()
+        assert provider.get()['total_orders'] == 3
+
+        provider.reconcile_every = 0
+        assert provider.get()['total_orders'] == 0
+    assert provider.reconciles == 2